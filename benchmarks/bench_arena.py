@@ -0,0 +1,75 @@
+'''
+Arena AST benchmark.
+
+Parses a large generated program into an object tree and into an arena.
+Checks that both give the same tree, the same checker types and the
+same intermediate code, then compares their memory use and the time of
+a whole-tree preorder traversal:
+
+    bash % python3 -m benchmarks.bench_arena [num_funcs]
+'''
+
+import time
+import tracemalloc
+
+from gone import arena
+from gone.ast import flatten
+from gone.checker import check_program
+from gone.ircode import GenerateCode
+from gone.parser import parse
+from .genprog import generate
+
+def tree_signature(nodes):
+    return [ (depth, repr(node), getattr(node, 'lineno', None),
+              str(getattr(node, 'type', None))) for depth, node in flatten(nodes) ]
+
+def ircode(program):
+    gen = GenerateCode()
+    gen.visit(program)
+    return [ (str(func), func.code) for func in gen.functions ]
+
+def traced(func, *args):
+    '''
+    Return the result of func(*args) and the memory it still holds
+    '''
+    tracemalloc.start()
+    result = func(*args)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+def best_time(func, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    import sys
+
+    num_funcs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    source = generate(num_funcs)
+
+    objects, object_size = traced(parse, source, 'rd')
+    tree, arena_size = traced(arena.parse, source)
+    views = tree.program()
+
+    check_program(objects)
+    check_program(views)
+    if tree_signature(objects) != tree_signature(views):
+        raise SystemExit('Arena tree differs from the object tree')
+    if ircode(objects) != ircode(views):
+        raise SystemExit('Arena intermediate code differs')
+    print(f'Identical trees, types and IR code ({len(tree):,} arena rows)')
+
+    print(f'Memory   objects {object_size / 2**20:6.1f} MiB   arena {arena_size / 2**20:6.1f} MiB')
+    walk_objects = best_time(lambda: sum(1 for _ in flatten(objects)))
+    walk_arena = best_time(lambda: sum(1 for _ in tree.walk()))
+    print(f'Preorder objects {walk_objects:8.3f}s   arena {walk_arena:8.3f}s   '
+          f'({walk_objects / walk_arena:.2f}x)')
+
+if __name__ == '__main__':
+    main()
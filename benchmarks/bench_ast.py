@@ -0,0 +1,48 @@
+'''
+AST memory and construction benchmark.
+
+Parses a large generated program with the recursive descent front end
+(which spends most of its time building nodes) with field validation
+on and off, and measures the memory held by the resulting AST:
+
+    bash % python3 -m benchmarks.bench_ast [num_funcs]
+'''
+
+import time
+import tracemalloc
+
+from gone.ast import flatten, set_field_validation
+from gone.parser import parse
+from .genprog import generate
+
+def measure(label, source, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(source, 'rd')
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f'{label:<14} {best:8.3f}s')
+    return best
+
+def main():
+    import sys
+
+    num_funcs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    source = generate(num_funcs)
+
+    tracemalloc.start()
+    ast = parse(source, 'rd')
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    nodes = len(flatten(ast))
+    print(f'AST: {nodes:,} nodes, {size / 2**20:.1f} MiB ({size / nodes:.0f} bytes per node)')
+
+    checked = measure('validated', source)
+    set_field_validation(False)
+    unchecked = measure('unvalidated', source)
+    set_field_validation(True)
+    print(f'Speedup: {checked / unchecked:.2f}x')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+'''
+Checker benchmark on large expressions.
+
+Generates a program made of long, well typed expressions over every
+type (arithmetic, comparisons, boolean and unary operators) and times
+the checker with the typesys lookup tables against the previous
+implementation, which called the per type rule methods and searched
+the Type subclasses by name:
+
+    bash % python3 -m benchmarks.bench_checker [statements]
+'''
+
+import random
+import time
+
+from gone.checker import CheckProgramVisitor
+from gone.errors import errors_reported
+from gone.parser import parse
+from gone.ast import BinOp, UnaryOp, flatten
+from gone.typesys import Type, BINOP_TYPES, UNARYOP_TYPES
+
+_DECLS = '''\
+var i int = 1;
+var f float = 1.5;
+var c char = 'x';
+var b bool = true;
+'''
+
+def int_expr(rnd, depth):
+    if depth == 0:
+        return rnd.choice(['i', '2', '(-i)'])
+    return f'{int_expr(rnd, depth - 1)} {rnd.choice("+-*/")} {int_expr(rnd, depth - 1)}'
+
+def float_expr(rnd, depth):
+    if depth == 0:
+        return rnd.choice(['f', '0.5', '(+f)'])
+    return f'{float_expr(rnd, depth - 1)} {rnd.choice("+-*/")} {float_expr(rnd, depth - 1)}'
+
+def bool_expr(rnd, depth):
+    if depth == 0:
+        return rnd.choice([
+            'b', '!b', "c < 'z'",
+            f'{int_expr(rnd, 2)} {rnd.choice(["<", "<=", "==", "!="])} i',
+            f'{float_expr(rnd, 2)} {rnd.choice([">", ">="])} f',
+        ])
+    op = rnd.choice(['&&', '||', '==', '!='])
+    return f'({bool_expr(rnd, depth - 1)}) {op} ({bool_expr(rnd, depth - 1)})'
+
+def generate(statements, seed=1):
+    rnd = random.Random(seed)
+    lines = [_DECLS]
+    for n in range(statements):
+        kind = n % 3
+        if kind == 0:
+            lines.append(f'i = {int_expr(rnd, 5)};\n')
+        elif kind == 1:
+            lines.append(f'f = {float_expr(rnd, 5)};\n')
+        else:
+            lines.append(f'b = {bool_expr(rnd, 3)};\n')
+    return ''.join(lines)
+
+class OldChecker(CheckProgramVisitor):
+    '''
+    The checker with the type lookups it used before the tables
+    '''
+    def __init__(self):
+        super().__init__()
+        self.keywords = {t.name for t in Type.__subclasses__()}
+
+    def visit_BinOp(self, node):
+        yield node.left
+        yield node.right
+
+        node.type = None
+        if node.left.type and node.right.type:
+            node.type = node.left.type.binop_type(node.op, node.right.type)
+
+    def visit_UnaryOp(self, node):
+        yield node.right
+
+        node.type = None
+        if node.right.type:
+            node.type = node.right.type.unaryop_type(node.op)
+
+    def visit_SimpleType(self, node):
+        for type_cls in Type.__subclasses__():
+            if type_cls.name == node.name:
+                node.type = type_cls
+                break
+        else:
+            node.type = None
+
+def best_time(checker_cls, ast, repeat=5):
+    best = None
+    for _ in range(repeat):
+        checker = checker_cls()
+        start = time.perf_counter()
+        checker.visit(ast)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def typing_time(ast, repeat=5):
+    '''
+    Time just the typing of every operation of the program, with the rule
+    methods and with the tables
+    '''
+    binops = [ (node.left.type, node.op, node.right.type)
+               for _, node in flatten(ast) if isinstance(node, BinOp) ]
+    unaryops = [ (node.op, node.right.type)
+                 for _, node in flatten(ast) if isinstance(node, UnaryOp) ]
+
+    def rules():
+        for left, op, right in binops:
+            left.binop_type(op, right)
+        for op, operand in unaryops:
+            operand.unaryop_type(op)
+
+    def tables():
+        get_binop = BINOP_TYPES.get
+        get_unaryop = UNARYOP_TYPES.get
+        for key in binops:
+            get_binop(key)
+        for key in unaryops:
+            get_unaryop(key)
+
+    times = []
+    for func in (rules, tables):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        times.append(best)
+    return len(binops) + len(unaryops), times
+
+def main():
+    import sys
+
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    ast = parse(generate(statements), 'rd')
+    CheckProgramVisitor().visit(ast)
+    if errors_reported():
+        raise SystemExit('Generated program has errors')
+
+    before = best_time(OldChecker, ast)
+    after = best_time(CheckProgramVisitor, ast)
+    operations, (rules, tables) = typing_time(ast)
+    print(f'{statements} statements, {operations:,} operations')
+    print('                  checker   typing only')
+    print(f'Rule methods   {before:8.3f}s   {rules:8.3f}s')
+    print(f'Lookup tables  {after:8.3f}s   {tables:8.3f}s')
+    print(f'Speedup        {before / after:8.2f}x   {rules / tables:8.2f}x')
+
+if __name__ == '__main__':
+    main()
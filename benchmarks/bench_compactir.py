@@ -0,0 +1,98 @@
+'''
+Compact IR benchmark.
+
+Generates the intermediate code of a large program, checks that the
+compact encoding converts back to the same code tuples, and compares the
+two forms: memory held, pickled size (what the compilation cache
+stores), pickle load time, and the time of a pass that collects the
+registers read by every instruction:
+
+    bash % python3 -m benchmarks.bench_compactir [num_funcs]
+'''
+
+import pickle
+import time
+import tracemalloc
+
+from gone.compactir import compact, expand, SIGNATURES, Op
+from gone.ircode import compile_ircode
+from .genprog import generate
+
+def traced(func, *args):
+    '''
+    Return the result of func(*args) and the memory it still holds
+    '''
+    tracemalloc.start()
+    result = func(*args)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+def best_time(func, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+_SIGNATURES_BY_NAME = { op.name: SIGNATURES[op] for op in Op }
+
+def tuple_uses(functions):
+    uses = 0
+    for func in functions:
+        for inst in func.code:
+            kinds = _SIGNATURES_BY_NAME[inst[0]]
+            if kinds[-1] == '*':
+                uses += len(inst) - len(kinds)
+            else:
+                uses += sum(1 for kind in kinds[:-1] if kind == 'r')
+    return uses
+
+def compact_uses(functions):
+    uses = 0
+    for func in functions:
+        for op, operands in func.instructions():
+            kinds = SIGNATURES[op]
+            if kinds[-1] == '*':
+                uses += len(operands) - len(kinds) + 1
+            else:
+                uses += sum(1 for kind in kinds[:-1] if kind == 'r')
+    return uses
+
+def main():
+    import sys
+
+    num_funcs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    functions = compile_ircode(generate(num_funcs))
+    encoded = compact(functions)
+    if [ func.code for func in expand(encoded) ] != [ func.code for func in functions ]:
+        raise SystemExit('The compact code differs')
+    instructions = sum(len(func.code) for func in functions)
+    print(f'{num_funcs} functions, {instructions:,} instructions, round trip ok')
+
+    tuple_data = pickle.dumps(functions, pickle.HIGHEST_PROTOCOL)
+    compact_data = pickle.dumps(encoded, pickle.HIGHEST_PROTOCOL)
+    _, tuple_size = traced(pickle.loads, tuple_data)
+    _, compact_size = traced(pickle.loads, compact_data)
+    print(f'Memory    tuples {tuple_size / 2**20:7.2f} MiB   compact {compact_size / 2**20:7.2f} MiB '
+          f'  ({tuple_size / compact_size:.1f}x)')
+    print(f'Pickled   tuples {len(tuple_data) / 2**20:7.2f} MiB   compact {len(compact_data) / 2**20:7.2f} MiB '
+          f'  ({len(tuple_data) / len(compact_data):.1f}x)')
+
+    tuple_load = best_time(pickle.loads, tuple_data)
+    compact_load = best_time(pickle.loads, compact_data)
+    print(f'Unpickle  tuples {tuple_load:8.3f}s    compact {compact_load:8.3f}s '
+          f'   ({tuple_load / compact_load:.1f}x)')
+
+    if tuple_uses(functions) != compact_uses(encoded):
+        raise SystemExit('The passes disagree')
+    tuple_pass = best_time(tuple_uses, functions)
+    compact_pass = best_time(compact_uses, encoded)
+    print(f'Use pass  tuples {tuple_pass:8.3f}s    compact {compact_pass:8.3f}s '
+          f'   ({tuple_pass / compact_pass:.2f}x)')
+    print(f'Encode {best_time(compact, functions):.3f}s, decode {best_time(expand, encoded):.3f}s')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+'''
+Deeply nested programs.
+
+Builds a program with one very long expression (a + a + ... + a, which
+is a left-leaning chain of BinOp nodes as deep as the number of terms)
+and runs the checker, flatten() and GenerateCode on it with the default
+recursion limit:
+
+    bash % python3 -m benchmarks.bench_deep [terms]
+'''
+
+import sys
+import time
+
+from gone.ast import flatten
+from gone.checker import check_program
+from gone.errors import errors_reported
+from gone.ircode import GenerateCode
+from gone.parser import parse
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    print(f'{label:<14} {time.perf_counter() - start:8.3f}s')
+    return result
+
+def generate_code(ast):
+    gen = GenerateCode()
+    gen.visit(ast)
+    return gen.functions
+
+def main():
+    terms = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    source = 'var a int = 1;\nprint a' + ' + a' * terms + ';\n'
+    print(f'{terms:,} terms, recursion limit {sys.getrecursionlimit()}')
+
+    ast = timed('parse (rd)', parse, source, 'rd')
+    timed('check', check_program, ast)
+    if errors_reported():
+        raise SystemExit('Unexpected errors')
+    nodes = timed('flatten', flatten, ast)
+    functions = timed('GenerateCode', generate_code, ast)
+    print(f'{len(nodes):,} nodes, {len(functions[0].code):,} instructions')
+
+if __name__ == '__main__':
+    main()
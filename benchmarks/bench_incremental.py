@@ -0,0 +1,95 @@
+'''
+Incremental front end benchmark.
+
+Simulates an editing session on a large generated program: each step
+changes a constant in the body of one function, or inserts a blank line
+(which moves every function below it).  After every edit the result of
+IncrementalFrontend.update() is compared with a full parse and check,
+and the time of both is reported:
+
+    bash % python3 -m benchmarks.bench_incremental [num_funcs] [edits]
+'''
+
+import contextlib
+import io
+import random
+import re
+import time
+
+from gone.ast import flatten
+from gone.checker import check_program
+from gone.errors import errors_reported, clear_errors
+from gone.incremental import IncrementalFrontend
+from gone.parser import parse
+from .bench_parser import ast_signature
+from .genprog import generate
+
+def type_signature(ast):
+    '''
+    ast_signature() plus the types assigned by the checker
+    '''
+    return [(type(node).__name__, getattr(node, 'lineno', None),
+             str(getattr(node, 'type', None))) for _, node in flatten(ast)]
+
+def quietly(func, *args):
+    clear_errors()
+    with contextlib.redirect_stderr(io.StringIO()) as out:
+        start = time.perf_counter()
+        ast = func(*args)
+        elapsed = time.perf_counter() - start
+    assert errors_reported() == 0, out.getvalue()
+    return ast, elapsed
+
+def full(source):
+    ast = parse(source)
+    check_program(ast)
+    return ast
+
+def edit(rnd, source):
+    '''
+    Make a random edit that keeps the program valid
+    '''
+    if rnd.random() < 0.3:
+        lines = source.split('\n')
+        lines.insert(rnd.randrange(len(lines)), '')
+        return '\n'.join(lines)
+
+    # Change one of the float constants in a kernel body
+    matches = list(re.finditer(r'\d+\.\d{3}\b', source))
+    m = rnd.choice(matches)
+    return f'{source[:m.start()]}{rnd.uniform(0.5, 2.0):.3f}{source[m.end():]}'
+
+def main():
+    import sys
+
+    num_funcs = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    edits = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    rnd = random.Random(1)
+    source = generate(num_funcs)
+    frontend = IncrementalFrontend()
+    _, first = quietly(frontend.update, source)
+    print(f'Source: {len(source):,} bytes, {frontend.stats["chunks"]} chunks')
+    print(f'Initial update: {first * 1000:8.1f} ms')
+
+    total_full = total_inc = 0.0
+    parsed = checked = 0
+    for _ in range(edits):
+        source = edit(rnd, source)
+        expected, full_time = quietly(full, source)
+        got, inc_time = quietly(frontend.update, source)
+        if (ast_signature(got) != ast_signature(expected) or
+            type_signature(got) != type_signature(expected)):
+            raise SystemExit('Incremental result differs from a full parse and check')
+        total_full += full_time
+        total_inc += inc_time
+        parsed += frontend.stats['parsed']
+        checked += frontend.stats['checked']
+
+    print(f'{edits} edits, {parsed} chunks parsed, {checked} checked')
+    print(f'Full parse+check:  {total_full / edits * 1000:8.1f} ms per edit')
+    print(f'Incremental:       {total_inc / edits * 1000:8.1f} ms per edit')
+    print(f'Speedup: {total_full / total_inc:.1f}x')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+'''
+Lexer throughput benchmark.
+
+Compares GoneLexer.tokenize() with the single-regex scanner in
+gone/scanner.py on a large generated program:
+
+    bash % python3 -m benchmarks.bench_lexer [num_funcs]
+'''
+
+import time
+
+from gone.tokenizer import GoneLexer
+from gone import scanner
+from .genprog import generate
+
+def measure(label, tokenize, text, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = sum(1 for _ in tokenize(text))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    print(f'{label:<28} {count:>9} tokens  {best:8.3f}s  {count / best:>12,.0f} tokens/s')
+    return best
+
+def main():
+    import sys
+
+    num_funcs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    text = generate(num_funcs)
+    print(f'Source: {len(text):,} bytes')
+
+    base = measure('GoneLexer.tokenize', GoneLexer().tokenize, text)
+    fast = measure('scanner.tokenize', scanner.tokenize, text)
+    tuples = measure('scanner.scan', scanner.scan, text)
+    print(f'Speedup: {base / fast:.2f}x (Token objects), {base / tuples:.2f}x (tuples)')
+
+if __name__ == '__main__':
+    main()
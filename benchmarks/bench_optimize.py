@@ -0,0 +1,53 @@
+'''
+Optimizer benchmark.
+
+Compiles programs to intermediate code, runs the optimization passes
+one after the other and shows the number of instructions left after
+each pass, and the time the passes took:
+
+    bash % python3 -m benchmarks.bench_optimize [file.g ...]
+
+Without arguments, the examples and a generated program are used.
+'''
+
+import glob
+import os
+import time
+
+from gone.context import CompilationContext
+from gone.ircode import compile_ircode
+from gone.optimize import PASSES, optimize
+from .genprog import generate
+
+def instructions(functions):
+    return sum(len(func.code) for func in functions)
+
+def measure(name, source):
+    functions = compile_ircode(source, CompilationContext(echo=False))
+    counts = [ instructions(functions) ]
+    start = time.perf_counter()
+    for pass_name in PASSES:
+        optimize(functions, [pass_name], CompilationContext(echo=False))
+        counts.append(instructions(functions))
+    elapsed = time.perf_counter() - start
+    cells = ''.join(f'{count:>10,}' for count in counts)
+    print(f'{name:<18}{cells}  {(counts[0] - counts[-1]) / counts[0]:6.1%}  {elapsed:7.3f}s')
+
+def main():
+    import sys
+
+    if len(sys.argv) > 1:
+        programs = [ (os.path.basename(path), open(path).read()) for path in sys.argv[1:] ]
+    else:
+        examples = os.path.join(os.path.dirname(__file__), '..', 'examples', '*.g')
+        programs = [ (os.path.basename(path), open(path).read())
+                     for path in sorted(glob.glob(examples)) ]
+        programs.append(('genprog 200', generate(200)))
+
+    header = ''.join(f'{name:>10}' for name in [ 'before' ] + list(PASSES))
+    print(f'{"program":<18}{header}  {"saved":>6}  {"time":>7}')
+    for name, source in programs:
+        measure(name, source)
+
+if __name__ == '__main__':
+    main()
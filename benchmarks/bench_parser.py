@@ -0,0 +1,98 @@
+'''
+Parser benchmark and cross-check.
+
+First checks that the recursive descent parser builds exactly the same
+AST as the SLY parser (node classes, field values and line numbers) on
+a corpus made of the example programs, generated programs and random
+expressions.  Then compares parse times on a large generated program:
+
+    bash % python3 -m benchmarks.bench_parser [num_funcs]
+'''
+
+import contextlib
+import glob
+import io
+import os
+import random
+import time
+
+from gone.ast import AST
+from gone.errors import errors_reported, clear_errors
+from gone.parser import parse
+from .genprog import generate
+
+_EXAMPLES = os.path.join(os.path.dirname(__file__), '..', 'examples', '*.g')
+
+def ast_signature(node):
+    '''
+    Turn an AST into nested tuples with everything that must match
+    '''
+    if isinstance(node, list):
+        return [ast_signature(item) for item in node]
+    elif isinstance(node, AST):
+        return (type(node).__name__, getattr(node, 'lineno', None),
+                [ast_signature(getattr(node, name)) for name in node._fields])
+    return node
+
+def random_expression(rnd, depth=0):
+    if depth > 4 or rnd.random() < 0.3:
+        return rnd.choice(['a', 'b', '1', '2.5', "'x'", 'true', 'f(a, 2)', 'g()'])
+    if rnd.random() < 0.15:
+        return rnd.choice(['-', '+', '!']) + random_expression(rnd, depth + 1)
+    if rnd.random() < 0.15:
+        return f'({random_expression(rnd, depth + 1)})'
+    op = rnd.choice(['+', '-', '*', '/', '<', '<=', '>', '>=', '==', '!=', '&&', '||'])
+    sep = rnd.choice([' ', '\n'])
+    return f'{random_expression(rnd, depth + 1)}{sep}{op} {random_expression(rnd, depth + 1)}'
+
+def corpus():
+    for filename in sorted(glob.glob(_EXAMPLES)):
+        yield open(filename).read()
+    for seed in range(5):
+        yield generate(10, seed=seed)
+    rnd = random.Random(0)
+    for _ in range(2000):
+        yield f'print {random_expression(rnd)};\nx = {random_expression(rnd)};\n'
+
+def parse_quietly(source, frontend):
+    clear_errors()
+    with contextlib.redirect_stderr(io.StringIO()):
+        ast = parse(source, frontend)
+    failed = errors_reported() > 0
+    clear_errors()
+    return (None if failed else ast_signature(ast)), failed
+
+def check_corpus():
+    count = 0
+    for source in corpus():
+        expected = parse_quietly(source, 'lalr')
+        got = parse_quietly(source, 'rd')
+        if expected != got:
+            raise SystemExit(f'AST mismatch for:\n{source}')
+        count += 1
+    print(f'Identical ASTs on {count} corpus programs')
+
+def measure(label, frontend, source, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(source, frontend)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f'{label:<10} {best:8.3f}s')
+    return best
+
+def main():
+    import sys
+
+    num_funcs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    check_corpus()
+
+    source = generate(num_funcs)
+    print(f'Source: {len(source):,} bytes')
+    lalr = measure('lalr', 'lalr', source)
+    rd = measure('rd', 'rd', source)
+    print(f'Speedup: {lalr / rd:.2f}x')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+'''
+Import time of gone.parser with and without cached parse tables.
+
+Each measurement runs a fresh interpreter with -X importtime.  The cold
+runs use an empty table cache directory, so SLY has to build the LALR
+tables; the warm runs load them from the cache:
+
+    bash % python3 -m benchmarks.bench_parser_import [runs]
+'''
+
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+def import_time(cache_dir):
+    '''
+    Return the self and cumulative import times (in ms) of gone.parser
+    '''
+    env = dict(os.environ, GONE_PARSETAB_DIR=cache_dir)
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import gone.parser'],
+                         env=env, stderr=subprocess.PIPE, universal_newlines=True).stderr
+    m = re.search(r'import time:\s+(\d+) \|\s+(\d+) \| gone\.parser$', out, re.M)
+    return int(m.group(1)) / 1000, int(m.group(2)) / 1000
+
+def report(label, times):
+    own = min(t[0] for t in times)
+    total = min(t[1] for t in times)
+    print(f'{label:<6} gone.parser self {own:7.1f} ms   cumulative {total:7.1f} ms')
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    cold = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cold.append(import_time(cache_dir))
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        import_time(cache_dir)
+        warm = [import_time(cache_dir) for _ in range(runs)]
+
+    report('cold', cold)
+    report('warm', warm)
+
+if __name__ == '__main__':
+    main()
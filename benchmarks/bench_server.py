@@ -0,0 +1,80 @@
+'''
+Compile server latency.
+
+Starts a compile server on a private socket and compares the time to
+run a small program with "python3 -m gone.run", with the thin client
+("python3 -m gone.client run"), and with a bare request sent from this
+process (the latency of the server itself, without starting Python):
+
+    bash % python3 -m benchmarks.bench_server [file.g] [repeat]
+'''
+
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from gone.client import request, send_message, receive_message
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def command(args, env):
+    def func():
+        subprocess.run(args, env=env, check=True, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL)
+    return func
+
+def bare_request(path, message, devnull):
+    def func():
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+            send_message(sock, message, [devnull, devnull])
+            reply, _ = receive_message(sock)
+        assert reply['status'] == 0
+    return func
+
+def main():
+    filename = sys.argv[1] if len(sys.argv) > 1 else 'examples/fact.g'
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    with open(filename) as f:
+        source = f.read()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'gone.sock')
+        env = dict(os.environ, GONE_SOCKET=path)
+        server = subprocess.Popen([sys.executable, '-m', 'gone.server'], env=env,
+                                  stderr=subprocess.DEVNULL)
+        try:
+            for _ in range(300):
+                try:
+                    request({ 'command': 'ping' }, path)
+                    break
+                except OSError:
+                    time.sleep(0.1)
+
+            message = { 'command': 'run', 'source': source, 'filename': filename }
+            with open(os.devnull, 'w') as devnull:
+                times = [
+                    ('python3 -m gone.run', command([sys.executable, '-m', 'gone.run', filename], env)),
+                    ('python3 -m gone.client', command([sys.executable, '-m', 'gone.client', 'run', filename], env)),
+                    ('python3 -S -m gone.client', command([sys.executable, '-S', '-m', 'gone.client', 'run', filename], env)),
+                    ('request to the server', bare_request(path, message, devnull.fileno())),
+                ]
+                print(f'Running {filename}, best of {repeat}')
+                for label, func in times:
+                    print(f'{label:<28} {best_time(func, repeat) * 1000:8.1f} ms')
+        finally:
+            request({ 'command': 'stop' }, path)
+            server.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+'''
+Memory benchmark for the compact token buffer.
+
+Compares the peak memory and allocation count of lexing a large
+generated program into a list of SLY tokens, against lexing the same
+file into a memory-mapped TokenBuffer.  Also compares parse() against
+parse_file():
+
+    bash % python3 -m benchmarks.bench_tokenbuf [num_funcs]
+'''
+
+import os
+import tempfile
+import time
+import tracemalloc
+
+from gone.tokenizer import GoneLexer
+from gone.scanner import TokenBuffer
+from gone.parser import parse, parse_file
+from .genprog import generate
+
+def measure(label, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{label:<36} peak {peak / 2**20:8.1f} MiB  {elapsed:8.3f}s')
+    return result
+
+def main():
+    import sys
+
+    num_funcs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.NamedTemporaryFile('w', suffix='.g', delete=False) as f:
+        f.write(generate(num_funcs))
+    try:
+        print(f'Source: {os.path.getsize(f.name):,} bytes')
+
+        def lex_string():
+            text = open(f.name).read()
+            return list(GoneLexer().tokenize(text))
+
+        def lex_buffer():
+            return TokenBuffer.from_file(f.name)
+
+        tokens = measure('read() + list(GoneLexer.tokenize)', lex_string)
+        buf = measure('TokenBuffer.from_file', lex_buffer)
+        assert len(tokens) == len(buf)
+        del tokens
+        buf.close()
+
+        measure('parse(read())', lambda: parse(open(f.name).read()))
+        measure('parse_file()', lambda: parse_file(f.name))
+    finally:
+        os.unlink(f.name)
+
+if __name__ == '__main__':
+    main()
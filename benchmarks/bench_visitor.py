@@ -0,0 +1,87 @@
+'''
+NodeVisitor dispatch benchmark.
+
+Measures the visitor overhead on a tree of about 100k nodes, comparing
+the table-driven NodeVisitor.visit() with the original implementation
+(copied below), which looked methods up by name on every node:
+
+    bash % python3 -m benchmarks.bench_visitor [num_funcs]
+
+Two visitors are timed: a traversal that only counts nodes (all dispatch
+overhead) and the full program checker.
+'''
+
+import time
+
+from gone.ast import AST, NodeVisitor
+from gone.checker import CheckProgramVisitor
+from gone.parser import parse
+from .genprog import generate
+
+class OldDispatch(object):
+    '''
+    NodeVisitor.visit() and generic_visit() as they were before dispatch
+    tables.  Mixed in front of a visitor class to restore the old behavior.
+    Visit methods that are generators have their children visited
+    recursively.
+    '''
+    def visit(self, node):
+        if isinstance(node, list):
+            for item in node:
+                self.visit(item)
+        elif isinstance(node, AST):
+            method = 'visit_' + node.__class__.__name__
+            visitor = getattr(self, method, self.generic_visit)
+            children = visitor(node)
+            if children is not None:
+                for child in children:
+                    self.visit(child)
+
+    def generic_visit(self, node):
+        for field in getattr(node, '_fields'):
+            value = getattr(node, field, None)
+            self.visit(value)
+
+class Counter(NodeVisitor):
+    def __init__(self):
+        self.count = 0
+
+    def generic_visit(self, node):
+        self.count += 1
+        yield from NodeVisitor.generic_visit(self, node)
+
+class OldCounter(OldDispatch, Counter):
+    def generic_visit(self, node):
+        self.count += 1
+        OldDispatch.generic_visit(self, node)
+
+class OldChecker(OldDispatch, CheckProgramVisitor):
+    pass
+
+def best_time(make_visitor, tree, repeat=5):
+    best = None
+    for _ in range(repeat):
+        visitor = make_visitor()
+        start = time.perf_counter()
+        visitor.visit(tree)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    import sys
+
+    num_funcs = int(sys.argv[1]) if len(sys.argv) > 1 else 1200
+    tree = parse(generate(num_funcs), 'rd')
+    counter = Counter()
+    counter.visit(tree)
+    print(f'Tree: {counter.count:,} nodes')
+
+    for label, old, new in [('traversal', OldCounter, Counter),
+                            ('checker', OldChecker, CheckProgramVisitor)]:
+        before = best_time(old, tree)
+        after = best_time(new, tree)
+        print(f'{label:<10} before {before:7.3f}s   after {after:7.3f}s   ({before / after:.2f}x)')
+
+if __name__ == '__main__':
+    main()
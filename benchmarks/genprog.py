@@ -0,0 +1,92 @@
+'''
+Generator of large, valid Gone programs used by the benchmarks.
+
+    bash % python3 -m benchmarks.genprog 500 > big.g
+
+generates a program with 500 functions.  The output is deterministic
+for a given number of functions.
+'''
+
+import random
+
+_FUNC = '''\
+/* Function {n}: a generated numeric kernel */
+func kernel{n}(a int, b float, n int) float {{
+    var i int = {i0};
+    var acc float = {f0};
+    var c char = '{ch}';
+    var flag bool = {bval};
+    while i < n {{
+        acc = acc + b * {f1} - (acc / {f2});   // accumulate
+        if i * {i1} > a {{
+            if flag {{
+                acc = acc - {f3};
+            }}
+        }} else {{
+            i = i + {i2};
+        }}
+        i = i + 1;
+    }}
+    print c;
+    print acc;
+    return acc + kernel_base(i);
+}}
+
+'''
+
+_HEADER = '''\
+/* Generated Gone program */
+
+const scale = 2.5;
+const limit = 100;
+var counter int = 0;
+
+func kernel_base(x int) float {
+    return scale;
+}
+
+'''
+
+_MAIN = '''\
+func main() int {{
+    var total float = 0.0;
+{calls}    print total;
+    return 0;
+}}
+'''
+
+def generate(num_funcs, seed=1):
+    '''
+    Return the source of a program with num_funcs generated functions
+    '''
+    rnd = random.Random(seed)
+    parts = [_HEADER]
+    for n in range(num_funcs):
+        parts.append(_FUNC.format(
+            n=n,
+            i0=rnd.randint(0, 9),
+            i1=rnd.randint(1, 9),
+            i2=rnd.randint(1, 3),
+            f0=rnd.choice(['0.0', '1.5', '.25', '3.']),
+            f1=f'{rnd.uniform(0.5, 2.0):.3f}',
+            f2=f'{rnd.uniform(1.0, 9.0):.2f}',
+            f3=f'{rnd.uniform(0.0, 1.0):.4f}',
+            ch=rnd.choice('abcxyz*.'),
+            bval=rnd.choice(['true', 'false'])))
+
+    calls = ''.join(f'    total = total + kernel{n}(limit, scale, {n % 7});\n'
+                    for n in range(min(num_funcs, 50)))
+    parts.append(_MAIN.format(calls=calls))
+    return ''.join(parts)
+
+def main():
+    import sys
+
+    if len(sys.argv) != 2:
+        sys.stderr.write("Usage: python3 -m benchmarks.genprog num_funcs\n")
+        raise SystemExit(1)
+
+    sys.stdout.write(generate(int(sys.argv[1])))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,358 @@
+'''
+Arena AST
+=========
+An alternative storage for the AST of large programs.  Instead of one
+Python object per node, the whole tree lives in a few parallel arrays
+(one row per node):
+
+    kinds[n]          Node kind, an index into KINDS
+    first_child[n]    First child of the node, or -1
+    next_sibling[n]   Next child of the node's parent, or -1
+    linenos[n]        Line number, or 0 if the node has none
+    type_ids[n]       Type set by the checker (an index into the arena
+                      types list), or -1
+    value_index[n]    Scalar field of the node (the name of a declaration,
+                      the operator of a BinOp, the value of a literal...),
+                      an index into the arena values list, or -1
+
+Node fields that hold other nodes are stored as the children of the
+node, in field order.  Fields holding a list of nodes get a LIST pseudo
+node whose children are the items, and an optional field holding None
+gets a NONE pseudo node.  Every node class has at most one scalar field.
+
+The rest of the compiler works on objects, so nodes are handed out as
+light views (see Arena.node()).  A view is an instance of a subclass of
+the real node class, with the same name and fields, so NodeVisitor,
+flatten(), the checker and GenerateCode walk an arena exactly like an
+object tree.  Attributes set by the passes (type, register, lineno) are
+written back to the arena.  The structure of the tree itself is read
+only.
+
+To build an arena, the recursive descent parser is given an ArenaBuilder
+as its node factory:
+
+    arena = parse(source)
+    program = arena.program()         # List of statement views
+    check_program(program)
+
+For whole-tree traversals that don't need node objects, walk() does a
+preorder walk over the arrays themselves.
+'''
+
+from array import array
+
+from . import ast
+from .scanner import scan
+from .rdparser import RDParser
+
+# Node kinds.  LIST and NONE are the pseudo nodes described above
+LIST = 0
+NONE = 1
+KINDS = [ 'LIST', 'NONE' ] + [ name for name, cls in ast.AST._nodes.items()
+                               if '_fields' in vars(cls) ]
+KIND_CODES = { name: code for code, name in enumerate(KINDS) }
+
+def _field_layout(cls):
+    '''
+    Split the fields of a node class into the scalar field (or None) and
+    the node fields.  Returns (scalar, [(name, kind)]) where kind is
+    'node', 'list' or 'optional'.
+    '''
+    scalar = None
+    children = []
+    for name, ty in cls.__annotations__.items():
+        if isinstance(ty, list):
+            children.append((name, 'list'))
+        elif isinstance(ty, tuple):
+            children.append((name, 'optional'))
+        elif isinstance(ty, type) and issubclass(ty, ast.AST):
+            children.append((name, 'node'))
+        else:
+            assert scalar is None, f'{cls.__name__} has more than one scalar field'
+            scalar = name
+    return scalar, children
+
+class Arena(object):
+    '''
+    Array storage for an AST.  Use ArenaBuilder (or parse()) to create one.
+    '''
+    def __init__(self):
+        self.kinds = array('B')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        self.linenos = array('i')
+        self.type_ids = array('b')
+        self.value_index = array('i')
+
+        self.values = []            # Scalar field values
+        self._value_ids = { }
+        self.types = []             # Types assigned by the checker
+        self._type_ids = { }
+        self.registers = { }        # Node -> register set by GenerateCode
+        self.root = -1              # LIST node with the top level statements
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def add(self, kind, children, lineno=0, value=-1):
+        '''
+        Add a node with the given children (node numbers).  Returns its number.
+        '''
+        n = len(self.kinds)
+        self.kinds.append(kind)
+        self.first_child.append(children[0] if children else -1)
+        self.next_sibling.append(-1)
+        self.linenos.append(lineno)
+        self.type_ids.append(-1)
+        self.value_index.append(value)
+        next_sibling = self.next_sibling
+        for prev, child in zip(children, children[1:]):
+            next_sibling[prev] = child
+        return n
+
+    def value_id(self, value):
+        '''
+        Intern a scalar value.  The type is part of the key so that, for
+        instance, 1 and 1.0 are kept apart.
+        '''
+        key = (value.__class__, value)
+        vid = self._value_ids.get(key)
+        if vid is None:
+            vid = self._value_ids[key] = len(self.values)
+            self.values.append(value)
+        return vid
+
+    def type_id(self, ty):
+        tid = self._type_ids.get(ty)
+        if tid is None:
+            tid = self._type_ids[ty] = len(self.types)
+            self.types.append(ty)
+        return tid
+
+    def children(self, n):
+        '''
+        Return the list of children of node n
+        '''
+        children = []
+        child = self.first_child[n]
+        while child >= 0:
+            children.append(child)
+            child = self.next_sibling[child]
+        return children
+
+    def node(self, n):
+        '''
+        Return a view of node n: a list of views for a LIST node, None for
+        a NONE node.
+        '''
+        kind = self.kinds[n]
+        if kind == LIST:
+            return [ self.node(child) for child in self.children(n) ]
+        elif kind == NONE:
+            return None
+        return _views[kind](self, n)
+
+    def program(self):
+        '''
+        Return the top level statements, as views
+        '''
+        return self.node(self.root)
+
+    def walk(self, top=None):
+        '''
+        Preorder walk of the tree below top (by default, the whole program).
+        Generates (depth, node number) for the real nodes, in the same
+        order and with the same depths as ast.flatten().
+        '''
+        kinds = self.kinds
+        first_child = self.first_child
+        next_sibling = self.next_sibling
+        pseudo = (LIST, NONE)
+        stack = [ (self.root if top is None else top, 0) ]
+        pop = stack.pop
+        push = stack.append
+        while stack:
+            n, depth = pop()
+            if kinds[n] not in pseudo:
+                yield depth, n
+                child_depth = depth + 1
+            else:
+                child_depth = depth
+
+            # Push the children in reverse, so that the first one is on top
+            children = []
+            child = first_child[n]
+            while child >= 0:
+                children.append(child)
+                child = next_sibling[child]
+            for child in reversed(children):
+                push((child, child_depth))
+
+# ----------------------------------------------------------------------
+# Node views
+
+class _NodeView(object):
+    '''
+    Mixin for the views.  A view is just a reference to a row of an arena.
+    '''
+    __slots__ = ()
+
+    def __eq__(self, other):
+        return (isinstance(other, _NodeView) and self._arena is other._arena
+                and self._n == other._n)
+
+    def __hash__(self):
+        return hash((id(self._arena), self._n))
+
+    @property
+    def lineno(self):
+        lineno = self._arena.linenos[self._n]
+        if not lineno:
+            raise AttributeError('lineno')
+        return lineno
+
+    @lineno.setter
+    def lineno(self, value):
+        self._arena.linenos[self._n] = value
+
+    @property
+    def type(self):
+        tid = self._arena.type_ids[self._n]
+        if tid < 0:
+            raise AttributeError('type')
+        return self._arena.types[tid]
+
+    @type.setter
+    def type(self, value):
+        arena = self._arena
+        arena.type_ids[self._n] = arena.type_id(value)
+
+    @property
+    def register(self):
+        try:
+            return self._arena.registers[self._n]
+        except KeyError:
+            raise AttributeError('register') from None
+
+    @register.setter
+    def register(self, value):
+        self._arena.registers[self._n] = value
+
+def _scalar_property(name):
+    def get(self):
+        arena = self._arena
+        return arena.values[arena.value_index[self._n]]
+    return property(get, doc=name)
+
+def _child_property(name, position):
+    def get(self):
+        arena = self._arena
+        child = arena.first_child[self._n]
+        for _ in range(position):
+            child = arena.next_sibling[child]
+        return arena.node(child)
+    return property(get, doc=name)
+
+def _make_view(cls):
+    '''
+    Make the view class of a node class
+    '''
+    scalar, children = _field_layout(cls)
+
+    def __init__(self, arena, n):
+        self._arena = arena
+        self._n = n
+
+    namespace = {
+        '__slots__': ('_arena', '_n'),
+        '__init__': __init__,
+        '__module__': __name__,
+        '__qualname__': f'view.{cls.__name__}',
+    }
+    if scalar:
+        namespace[scalar] = _scalar_property(scalar)
+    for position, (name, _) in enumerate(children):
+        namespace[name] = _child_property(name, position)
+
+    # Views are not real node classes, so they are kept out of AST._nodes
+    return type(cls)(cls.__name__, (_NodeView, cls), namespace, view=True)
+
+_views = [ None, None ] + [ _make_view(ast.AST._nodes[name]) for name in KINDS[2:] ]
+
+# ----------------------------------------------------------------------
+# Building
+
+def _make_constructor(kind, cls):
+    '''
+    Make the ArenaBuilder method that adds a node of class cls.  It takes
+    the same arguments as the class itself, with node numbers (or lists
+    of node numbers) in place of nodes.
+    '''
+    scalar, children = _field_layout(cls)
+    fields = list(cls.__annotations__)
+    scalar_pos = fields.index(scalar) if scalar else -1
+    child_fields = [ (fields.index(name), how) for name, how in children ]
+
+    def constructor(self, *args, lineno=0):
+        arena = self.arena
+        value = arena.value_id(args[scalar_pos]) if scalar_pos >= 0 else -1
+        nodes = []
+        for pos, how in child_fields:
+            arg = args[pos]
+            if how == 'list':
+                arg = arena.add(LIST, arg)
+            elif arg is None:
+                arg = arena.add(NONE, ())
+            nodes.append(arg)
+        return arena.add(kind, nodes, lineno, value)
+    constructor.__name__ = cls.__name__
+    return constructor
+
+class ArenaBuilder(object):
+    '''
+    Node factory that adds nodes to an arena.  It has a method named after
+    every node class (IntegerLiteral(value, lineno=n), BinOp(op, left,
+    right, lineno=n), ...) which returns the number of the new node, so it
+    can be passed to RDParser in place of the ast module.
+    '''
+    def __init__(self):
+        self.arena = Arena()
+
+    def finish(self, program):
+        '''
+        Add the list of top level statements and return the arena
+        '''
+        self.arena.root = self.arena.add(LIST, program or [])
+        return self.arena
+
+for _kind, _name in enumerate(KINDS[2:], start=2):
+    setattr(ArenaBuilder, _name, _make_constructor(_kind, ast.AST._nodes[_name]))
+
+def parse(source):
+    '''
+    Parse source code into an arena.  Returns None on syntax errors.
+    '''
+    builder = ArenaBuilder()
+    program = RDParser(builder).parse(scan(source))
+    if program is None:
+        return None
+    return builder.finish(program)
+
+def main():
+    '''
+    Main program.  Prints the tree, like python3 -m gone.parser
+    '''
+    import sys
+
+    if len(sys.argv) != 2:
+        sys.stderr.write('Usage: python3 -m gone.arena filename\n')
+        raise SystemExit(1)
+
+    arena = parse(open(sys.argv[1]).read())
+    if arena is None:
+        raise SystemExit(1)
+    for depth, n in arena.walk():
+        print('%s: %s%s' % (arena.linenos[n] or None, ' '*(4*depth), arena.node(n)))
+
+if __name__ == '__main__':
+    main()
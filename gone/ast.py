@@ -7,38 +7,103 @@ Syntax Tree.  During parsing, you will create these nodes and connect
 them together.  In general, you will have a different AST node for
 each kind of grammar rule.  A few sample AST nodes can be found at the
 top of this file.  You will need to add more on your own.
+
+Node classes use __slots__ generated from their annotations, so nodes
+can only hold their fields and the attributes set by the compiler
+passes (see PASS_ATTRIBUTES).
 '''
 
-# DO NOT MODIFY
-class AST(object):
+import os
+from types import GeneratorType
+
+# Attributes that the compiler passes attach to nodes.  Every node has a
+# slot for them, although they are only set when needed.
+PASS_ATTRIBUTES = ('lineno', 'type', 'register')
+
+# Field validation.  Node constructors check the type of every field,
+# which catches parser bugs early but costs time on large programs.
+# Production builds can turn it off with set_field_validation(False) or
+# by setting GONE_AST_VALIDATION=0 in the environment.
+_validate_fields = os.environ.get('GONE_AST_VALIDATION', '1') != '0'
+
+class ASTMeta(type):
+    '''
+    Metaclass of the AST nodes.  Gives every node class __slots__ for the
+    fields declared in its annotations, so that nodes don't carry an
+    instance __dict__.  Slots for PASS_ATTRIBUTES are declared once, in
+    the AST base class.
+    '''
+    def __new__(meta, name, bases, namespace, **kwargs):
+        if '__slots__' not in namespace:
+            fields = namespace.get('__annotations__', { })
+            namespace['__slots__'] = tuple(fields) if bases else PASS_ATTRIBUTES
+        return super().__new__(meta, name, bases, namespace, **kwargs)
+
+def _make_checked_init(fields):
+    '''
+    Make an __init__ that validates the type of every field
+    '''
+    def __init__(self, *args, **kwargs):
+        if len(args) != len(fields):
+            raise TypeError(f'Expected {len(fields)} arguments')
+        for (name, ty), arg in zip(fields, args):
+            if isinstance(ty, list):
+                if not isinstance(arg, list):
+                    raise TypeError(f'{name} must be list')
+                if not all(isinstance(item, ty[0]) for item in arg):
+                    raise TypeError(f'All items of {name} must be {ty[0]}')
+            elif not isinstance(arg, ty):
+                raise TypeError(f'{name} must be {ty}')
+            setattr(self, name, arg)
+
+        for name, val in kwargs.items():
+            setattr(self, name, val)
+    return __init__
+
+def _make_unchecked_init(fields):
+    '''
+    Make an __init__ that stores the fields without any checks.  The code
+    is generated so that each field is a plain attribute store.
+    '''
+    names = [name for name, _ in fields]
+    lines = [f'def __init__(self, {"".join(n + ", " for n in names)}**kwargs):']
+    lines.extend(f'    self.{n} = {n}' for n in names)
+    lines.append('    if kwargs:')
+    lines.append('        for name, val in kwargs.items():')
+    lines.append('            setattr(self, name, val)')
+    namespace = { }
+    exec('\n'.join(lines), namespace)
+    return namespace['__init__']
+
+def set_field_validation(enabled):
+    '''
+    Turn the validation of node fields on or off for all node classes
+    '''
+    global _validate_fields
+    _validate_fields = bool(enabled)
+    for cls in AST._nodes.values():
+        if '_checked_init' in vars(cls):
+            cls.__init__ = cls._checked_init if _validate_fields else cls._unchecked_init
+
+class AST(metaclass=ASTMeta):
     _nodes = { }
 
     @classmethod
-    def __init_subclass__(cls):
+    def __init_subclass__(cls, view=False):
+        # Views of other node storages (see arena.py) subclass the node
+        # classes, but they are not node classes themselves
+        if view:
+            return
+
         AST._nodes[cls.__name__] = cls
 
-        if not hasattr(cls, '__annotations__'):
+        if '__annotations__' not in vars(cls):
             return
 
         fields = list(cls.__annotations__.items())
-
-        def __init__(self, *args, **kwargs):
-            if len(args) != len(fields):
-                raise TypeError(f'Expected {len(fields)} arguments')
-            for (name, ty), arg in zip(fields, args):
-                if isinstance(ty, list):
-                    if not isinstance(arg, list):
-                        raise TypeError(f'{name} must be list')
-                    if not all(isinstance(item, ty[0]) for item in arg):
-                        raise TypeError(f'All items of {name} must be {ty[0]}')
-                elif not isinstance(arg, ty):
-                    raise TypeError(f'{name} must be {ty}')
-                setattr(self, name, arg)
-
-            for name, val in kwargs.items():
-                setattr(self, name, val)
-
-        cls.__init__ = __init__
+        cls._checked_init = _make_checked_init(fields)
+        cls._unchecked_init = _make_unchecked_init(fields)
+        cls.__init__ = cls._checked_init if _validate_fields else cls._unchecked_init
         cls._fields = [name for name,_ in fields]
 
     def __repr__(self):
@@ -210,39 +275,117 @@ class NodeVisitor(object):
 
         tree = parse(txt)
         VisitOps().visit(tree)
+
+    Visit methods can also be generators that yield the children (nodes
+    or lists of nodes) to visit.  Each yielded child is visited before
+    the method resumes, so code before a yield runs in pre-order and code
+    after it in post-order:
+
+        class VisitOps(NodeVisitor):
+            def visit_BinOp(self, node):
+                yield node.left
+                yield node.right
+                print('Binary operator', node.op, 'after its operands')
+
+    Generators are driven from an explicit stack instead of recursive
+    calls, so a visitor written this way handles trees of any depth (such
+    as a chain of a hundred thousand additions) without hitting the
+    recursion limit.  generic_visit() is itself a generator.
     '''
+    # Visit method of each node class, shared by all the instances of a
+    # visitor class.  Every subclass gets its own table (see
+    # __init_subclass__).  Values that are not nodes map to None.
+    _dispatch = { }
+
     def visit(self, node):
         '''
         Execute a method of the form visit_NodeName(node) where
         NodeName is the name of the class of a particular node.
         '''
-        if isinstance(node, list):
-            for item in node:
-                self.visit(item)
-        elif isinstance(node, AST):
-            method = 'visit_' + node.__class__.__name__
-            visitor = getattr(self, method, self.generic_visit)
-            visitor(node)
+        dispatch = self._dispatch
+        stack = []              # Suspended parents of the current node
+        push = stack.append
+        pop = stack.pop
+        current = None          # Iterator over the children being visited
+        while True:
+            cls = node.__class__
+            if cls is list:
+                if current is not None:
+                    push(current)
+                current = iter(node)
+            else:
+                try:
+                    method = dispatch[cls]
+                except KeyError:
+                    method = self._dispatch_miss(cls)
+                if method is not None:
+                    children = method(self, node)
+                    if children.__class__ is GeneratorType:
+                        if current is not None:
+                            push(current)
+                        current = children
+
+            if current is None:
+                return
+
+            # Next child to visit, resuming the parents that are done
+            node = next(current, _done)
+            while node is _done:
+                if not stack:
+                    return
+                current = pop()
+                node = next(current, _done)
 
     def generic_visit(self,node):
         '''
         Method executed if no applicable visit_ method can be found.
         This examines the node to see if it has _fields, is a list,
-        or can be further traversed.
+        or can be further traversed.  It is a generator: subclasses that
+        extend it must use 'yield from NodeVisitor.generic_visit(self, node)'.
         '''
-        for field in getattr(node, '_fields'):
-            value = getattr(node, field, None)
-            self.visit(value)
+        for field in node._fields:
+            yield getattr(node, field, None)
+
+    @classmethod
+    def _lookup(cls, node_cls):
+        '''
+        Find the method that visits instances of node_cls
+        '''
+        if issubclass(node_cls, list):
+            return _visit_list
+        elif issubclass(node_cls, AST):
+            return getattr(cls, 'visit_' + node_cls.__name__, cls.generic_visit)
+        return None
+
+    @classmethod
+    def _dispatch_miss(cls, node_cls):
+        '''
+        Add a class missing from the dispatch table.  This happens for values
+        that are not nodes and for node classes created after the visitor
+        (such as the views of arena.py, which are found by name).
+        '''
+        method = cls._dispatch[node_cls] = cls._lookup(node_cls)
+        return method
 
     @classmethod
     def __init_subclass__(cls):
         '''
-        Sanity check. Make sure that visitor classes use the right names
+        Sanity check. Make sure that visitor classes use the right names.
+        Then build the dispatch table of the class.
         '''
         for key in vars(cls):
             if key.startswith('visit_'):
                 assert key[6:] in globals(), f"{key} doesn't match any AST node"
 
+        cls._dispatch = { node_cls: cls._lookup(node_cls)
+                          for node_cls in AST._nodes.values() }
+
+def _visit_list(visitor, node):
+    yield from node
+
+# Marks the end of the children of a node
+_done = object()
+
 # DO NOT MODIFY
 def flatten(top):
     '''
@@ -258,7 +401,7 @@ def flatten(top):
         def generic_visit(self, node):
             self.nodes.append((self.depth, node))
             self.depth += 1
-            NodeVisitor.generic_visit(self, node)
+            yield from NodeVisitor.generic_visit(self, node)
             self.depth -= 1
 
     d = Flattener()
@@ -0,0 +1,246 @@
+'''
+Compilation cache
+=================
+An on-disk, content-addressed cache of compilation results.  Compiling
+an unchanged program again (with the same compiler and options) loads
+the result of the last compilation instead of lexing, parsing, checking
+and generating code again.
+
+Entries are keyed by a hash of:
+
+    - the source code,
+    - the compiler fingerprint: the sources of the compiler itself (all
+      the modules of the gone package and the runtime library) and the
+      versions of Python, SLY and llvmlite,
+    - the compilation options (see CompilationContext.options).
+
+Several artifacts can be stored under a key, one file per kind:
+
+    ir      The list of IR Function objects (pickled)
+    ll      LLVM code, as text
+    bc      LLVM bitcode, for the JIT
+    o       Native object file, for linking executables
+
+Only programs without errors are cached.  The cache is bounded in size:
+when it grows past max_size bytes, the least recently used files are
+removed.  A file is "used" when it is stored or loaded (its modification
+time is updated).  Files are written atomically, so several processes
+can share a cache directory.
+
+Caching is enabled by passing a CompilationCache as the 'cache' option
+of a CompilationContext.  The cache directory defaults to the
+GONE_CACHE_DIR environment variable, or ~/.cache/gone.  To show or clear
+the cache, run:
+
+    bash % python3 -m gone.cache [--clear]
+'''
+
+import hashlib
+import os
+import pickle
+import sys
+
+_FORMAT_VERSION = 1
+
+DEFAULT_DIR = os.environ.get('GONE_CACHE_DIR',
+                             os.path.join(os.path.expanduser('~'), '.cache', 'gone'))
+DEFAULT_MAX_SIZE = int(os.environ.get('GONE_CACHE_SIZE', 256 * 2**20))
+
+# Options that don't change the result of a compilation
+_IGNORED_OPTIONS = { 'cache', 'frontend' }
+
+_fingerprint = None
+
+def compiler_fingerprint():
+    '''
+    Return a hash identifying this version of the compiler
+    '''
+    global _fingerprint
+    if _fingerprint is None:
+        import sly
+        import llvmlite
+
+        h = hashlib.sha256()
+        h.update(f'{_FORMAT_VERSION} {sys.version} {getattr(sly, "__version__", "")} '
+                 f'{llvmlite.__version__}\n'.encode())
+        package = os.path.dirname(__file__)
+        for name in sorted(os.listdir(package)):
+            if name.endswith(('.py', '.c')):
+                h.update(name.encode() + b'\0')
+                with open(os.path.join(package, name), 'rb') as f:
+                    h.update(f.read())
+        _fingerprint = h.hexdigest()
+    return _fingerprint
+
+class CompilationCache(object):
+    '''
+    Size bounded, content-addressed artifact cache in directory.  stats
+    counts the hits, misses, stores and evictions of this instance.  The
+    methods that take a context also count them in the statistics of the
+    context ('cache_hits', 'cache_misses', ...).
+    '''
+    def __init__(self, directory=None, max_size=None):
+        self.directory = directory or DEFAULT_DIR
+        self.max_size = DEFAULT_MAX_SIZE if max_size is None else max_size
+        self.stats = dict.fromkeys(['hits', 'misses', 'stores', 'evictions'], 0)
+        self._size = None           # Total size, computed on the first store
+
+    def __repr__(self):
+        return f'CompilationCache({self.directory!r}, max_size={self.max_size})'
+
+    def __getstate__(self):
+        # Instances are sent to the worker processes of batch compilations.
+        # Each process keeps its own statistics.
+        state = dict(self.__dict__)
+        state['stats'] = dict.fromkeys(self.stats, 0)
+        state['_size'] = None
+        return state
+
+    def key(self, source, options=None):
+        '''
+        Return the key of a compilation of source with the given options
+        '''
+        h = hashlib.sha256()
+        h.update(compiler_fingerprint().encode())
+        for name, value in sorted((options or { }).items()):
+            if name not in _IGNORED_OPTIONS and value is not None and value is not False:
+                h.update(f'\0{name}={value!r}'.encode())
+        h.update(b'\0\0')
+        h.update(source.encode('utf-8'))
+        return h.hexdigest()
+
+    def path(self, key, kind):
+        return os.path.join(self.directory, key[:2], f'{key}.{kind}')
+
+    def _count(self, stat, context, amount=1):
+        self.stats[stat] += amount
+        if context is not None:
+            context.count(f'cache_{stat}', amount)
+
+    def load(self, key, kind, context=None):
+        '''
+        Return the bytes of an artifact, or None if it isn't in the cache
+        '''
+        path = self.path(key, kind)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            self._count('misses', context)
+            return None
+        self._count('hits', context)
+        return data
+
+    def store(self, key, kind, data, context=None):
+        '''
+        Store the bytes of an artifact.  Failures are silently ignored.
+        '''
+        path = self.path(key, kind)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return
+
+        self._count('stores', context)
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self.entries())
+        else:
+            self._size += len(data)
+        if self._size > self.max_size:
+            self.evict(context=context)
+
+    def load_object(self, key, kind, context=None):
+        '''
+        Load a pickled artifact
+        '''
+        data = self.load(key, kind, context)
+        return None if data is None else pickle.loads(data)
+
+    def store_object(self, key, kind, obj, context=None):
+        self.store(key, kind, pickle.dumps(obj, pickle.HIGHEST_PROTOCOL), context)
+
+    def entries(self):
+        '''
+        Generate (mtime, size, path) for all the files in the cache
+        '''
+        try:
+            subdirs = os.listdir(self.directory)
+        except OSError:
+            return
+        for subdir in subdirs:
+            subdir = os.path.join(self.directory, subdir)
+            if not os.path.isdir(subdir):
+                continue
+            for name in os.listdir(subdir):
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(subdir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield st.st_mtime, st.st_size, path
+
+    def evict(self, max_size=None, context=None):
+        '''
+        Remove the least recently used files until the cache is no bigger
+        than max_size (by default, self.max_size)
+        '''
+        if max_size is None:
+            max_size = self.max_size
+        entries = sorted(self.entries())
+        size = sum(entry[1] for entry in entries)
+        for _, file_size, path in entries:
+            if size <= max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            size -= file_size
+            self._count('evictions', context)
+        self._size = size
+
+    def clear(self):
+        self.evict(0)
+
+def main():
+    '''
+    Main program.  Shows the contents of the cache, or clears it.
+    '''
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python3 -m gone.cache',
+                                     description='Show or clear the Gone compilation cache.')
+    parser.add_argument('--dir', default=None, help=f'cache directory (default: {DEFAULT_DIR})')
+    parser.add_argument('--clear', action='store_true', help='remove all the cached files')
+    args = parser.parse_args()
+
+    cache = CompilationCache(args.dir)
+    if args.clear:
+        cache.clear()
+
+    entries = list(cache.entries())
+    kinds = { }
+    for _, size, path in entries:
+        kind = path.rsplit('.', 1)[-1]
+        files, total = kinds.get(kind, (0, 0))
+        kinds[kind] = (files + 1, total + size)
+
+    size = sum(entry[1] for entry in entries)
+    print(f'{cache.directory}: {len(entries)} files, {size / 2**20:.1f} MiB '
+          f'of {cache.max_size / 2**20:.1f} MiB')
+    for kind, (files, total) in sorted(kinds.items()):
+        print(f'    {kind:<4} {files:6} files {total / 2**20:8.1f} MiB')
+
+if __name__ == '__main__':
+    main()
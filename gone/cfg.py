@@ -0,0 +1,560 @@
+'''
+Control flow graphs
+===================
+The code of an IR Function (see ircode.py) is a flat list of
+instructions where LABEL, BRANCH and CBRANCH are ordinary tuples.  The
+optimization passes need its block structure.  A ControlFlowGraph
+splits the code into basic blocks:
+
+    - A block starts at a LABEL, or after a BRANCH, CBRANCH or RET.
+    - A block ends with one of those (its terminator), or falls through
+      into the next block.  The last block may fall through to the end
+      of the function, which returns.
+
+Blocks keep their label (None for the entry block and for code that
+follows a terminator without a label, which can't be reached) and their
+instructions without the LABEL.  Predecessors and successors are
+computed from the terminators and the fall throughs.
+
+A PHI instruction at the start of a block (see mem2reg.py) picks its
+value by the label of the predecessor the block was entered from:
+
+    ('PHII', 'R4', 'L1', 'R9', 'L3', 'R10')
+
+When edges are removed, update() drops the values of the predecessors
+that are gone.
+
+On top of the blocks, the graph computes the immediate dominators (the
+Cooper, Harvey & Kennedy iterative algorithm over the reverse
+postorder), the natural loops and their preheaders.  After changing
+the blocks, call update() to recompute the edges, then linearize() to
+get a list of instructions back:
+
+    cfg = ControlFlowGraph(func)
+    for block in cfg.blocks:
+        ...
+    cfg.update()
+    func.code = cfg.linearize()
+
+To show the graph of every function of a program, run:
+
+    bash % python3 -m gone.cfg someprogram.g
+'''
+
+from .compactir import Op, SIGNATURES, operand_kinds
+
+# Opcodes that end a block
+TERMINATORS = { 'BRANCH', 'CBRANCH', 'RET' }
+
+# Operand signature of every opcode, by name (see compactir.py)
+OPERAND_KINDS = { op.name: SIGNATURES[op] for op in Op }
+
+# Opcode families whose last register operand is read, not defined
+_NO_DEFINITION = { 'STORE', 'PRINT', 'CBRANCH', 'RET' }
+
+def defined_register(inst):
+    '''
+    Return the register an instruction defines, or None
+    '''
+    op_code = inst[0]
+    if OPERAND_KINDS[op_code][-1] in 'r*%' and op_code not in _NO_DEFINITION \
+       and op_code[:-1] not in _NO_DEFINITION:
+        return inst[-1]
+    return None
+
+def used_registers(inst):
+    '''
+    Return the registers an instruction reads
+    '''
+    kinds = operand_kinds(OPERAND_KINDS[inst[0]], len(inst) - 1)
+    registers = [ operand for kind, operand in zip(kinds, inst[1:]) if kind == 'r' ]
+    if registers and defined_register(inst) is not None:
+        registers.pop()
+    return registers
+
+def rename_registers(inst, mapping):
+    '''
+    Return an instruction with the registers it reads replaced as given by
+    mapping (a dictionary).  The register it defines is left alone.
+    '''
+    kinds = operand_kinds(OPERAND_KINDS[inst[0]], len(inst) - 1)
+    last = len(inst) - 1 if defined_register(inst) is not None else len(inst)
+    renamed = list(inst)
+    for n in range(1, last):
+        if kinds[n - 1] == 'r':
+            renamed[n] = mapping.get(inst[n], inst[n])
+    return tuple(renamed)
+
+def is_phi(inst):
+    return inst[0] in ('PHII', 'PHIF', 'PHIB')
+
+def phi_incoming(inst):
+    '''
+    Return the (register, label) pairs of a PHI instruction
+    '''
+    return list(zip(inst[1:-1:2], inst[2:-1:2]))
+
+def make_phi(op_code, incoming, target):
+    '''
+    Make a PHI instruction from its (register, label) pairs
+    '''
+    return (op_code,) + tuple(operand for pair in incoming for operand in pair) + (target,)
+
+def branch_targets(inst):
+    '''
+    Return the labels an instruction can jump to
+    '''
+    if inst[0] == 'BRANCH':
+        return (inst[1],)
+    elif inst[0] == 'CBRANCH':
+        return (inst[2], inst[3])
+    return ()
+
+def retarget(inst, old, new):
+    '''
+    Return a branch instruction with the label old replaced by new.  A
+    CBRANCH whose two targets become the same is turned into a BRANCH.
+    '''
+    if inst[0] == 'BRANCH':
+        return ('BRANCH', new)
+    _, test, true_label, false_label = inst
+    true_label = new if true_label == old else true_label
+    false_label = new if false_label == old else false_label
+    if true_label == false_label:
+        return ('BRANCH', true_label)
+    return ('CBRANCH', test, true_label, false_label)
+
+def single_definitions(code):
+    '''
+    Tell whether every register is defined only once in a list of
+    instructions
+    '''
+    defined = set()
+    for inst in code:
+        target = defined_register(inst)
+        if target is not None:
+            if target in defined:
+                return False
+            defined.add(target)
+    return True
+
+class BasicBlock(object):
+    '''
+    A basic block: an optional label and a list of instructions (without
+    the LABEL).  preds and succs are lists of blocks, in order.
+    '''
+    def __init__(self, label=None, code=None):
+        self.label = label
+        self.code = code if code is not None else []
+        self.preds = []
+        self.succs = []
+
+    def __repr__(self):
+        return f'BasicBlock({self.label or "<entry>"}, {len(self.code)} instructions)'
+
+    @property
+    def terminator(self):
+        '''
+        The instruction that ends the block, or None if it falls through
+        '''
+        if self.code and self.code[-1][0] in TERMINATORS:
+            return self.code[-1]
+        return None
+
+class Loop(object):
+    '''
+    A natural loop.  header is the block that dominates the whole loop,
+    latches are the blocks with a back edge to the header, and blocks is
+    the set of blocks of the loop (including the header).  parent is the
+    innermost loop that contains this one, or None.
+    '''
+    def __init__(self, header):
+        self.header = header
+        self.latches = []
+        self.blocks = { header }
+        self.parent = None
+
+    def __repr__(self):
+        return f'Loop({self.header.label}, {len(self.blocks)} blocks, depth {self.depth})'
+
+    @property
+    def depth(self):
+        depth = 1
+        loop = self.parent
+        while loop:
+            depth += 1
+            loop = loop.parent
+        return depth
+
+    def exits(self):
+        '''
+        Return the (block, successor) edges that leave the loop
+        '''
+        return [ (block, succ) for block in self.blocks for succ in block.succs
+                 if succ not in self.blocks ]
+
+class ControlFlowGraph(object):
+    '''
+    The control flow graph of an IR Function.  blocks is the list of
+    blocks in program order, entry is blocks[0].
+    '''
+    def __init__(self, function):
+        self.function = function
+        self.blocks = []
+        block = BasicBlock()
+        for inst in function.code:
+            if inst[0] == 'LABEL':
+                # An empty block without a label is dropped, unless it is
+                # the entry (then it falls through into the label, so that
+                # the entry is never the target of a branch)
+                if block.code or block.label or not self.blocks:
+                    self.blocks.append(block)
+                block = BasicBlock(inst[1])
+            else:
+                block.code.append(inst)
+                if inst[0] in TERMINATORS:
+                    self.blocks.append(block)
+                    block = BasicBlock()
+        if block.code or block.label or not self.blocks:
+            self.blocks.append(block)
+        self.update()
+
+    def __repr__(self):
+        return f'ControlFlowGraph({self.function.name}, {len(self.blocks)} blocks)'
+
+    def __iter__(self):
+        return iter(self.blocks)
+
+    @property
+    def entry(self):
+        return self.blocks[0]
+
+    def block(self, label):
+        return self.labels[label]
+
+    def update(self):
+        '''
+        Recompute the edges (and forget the dominators) after the blocks
+        or their terminators were changed
+        '''
+        self.labels = { block.label: block for block in self.blocks if block.label }
+        for block in self.blocks:
+            block.preds = []
+            block.succs = []
+        for n, block in enumerate(self.blocks):
+            terminator = block.terminator
+            if terminator is None:
+                succs = [ self.blocks[n + 1] ] if n + 1 < len(self.blocks) else []
+            else:
+                succs = []
+                for label in branch_targets(terminator):
+                    succ = self.labels.get(label)
+                    if succ is None:
+                        raise ValueError(f'{self.function.name}: undefined label {label}')
+                    if succ not in succs:
+                        succs.append(succ)
+            block.succs = succs
+            for succ in succs:
+                succ.preds.append(block)
+        self._idom = None
+        self.prune_phis()
+
+    def prune_phis(self):
+        '''
+        Remove the incoming values of the PHI instructions that come from
+        blocks that are no longer predecessors
+        '''
+        for block in self.blocks:
+            labels = None
+            for n, inst in enumerate(block.code):
+                if not is_phi(inst):
+                    break
+                if labels is None:
+                    labels = { pred.label for pred in block.preds }
+                incoming = [ pair for pair in phi_incoming(inst) if pair[1] in labels ]
+                if len(incoming) != (len(inst) - 2) // 2:
+                    block.code[n] = make_phi(inst[0], incoming, inst[-1])
+
+    # Orders and reachability
+
+    def postorder(self):
+        '''
+        Return the blocks reachable from the entry, in postorder
+        '''
+        order = []
+        seen = { self.entry }
+        stack = [ (self.entry, iter(self.entry.succs)) ]
+        while stack:
+            block, succs = stack[-1]
+            for succ in succs:
+                if succ not in seen:
+                    seen.add(succ)
+                    stack.append((succ, iter(succ.succs)))
+                    break
+            else:
+                stack.pop()
+                order.append(block)
+        return order
+
+    def reverse_postorder(self):
+        return self.postorder()[::-1]
+
+    def reachable(self):
+        return set(self.postorder())
+
+    def remove_unreachable(self):
+        '''
+        Remove the blocks that can't be reached from the entry.  Returns
+        the number of instructions removed.
+        '''
+        reachable = self.reachable()
+        removed = sum(len(block.code) + bool(block.label)
+                      for block in self.blocks if block not in reachable)
+        if removed or len(reachable) != len(self.blocks):
+            self.blocks = [ block for block in self.blocks if block in reachable ]
+            self.update()
+        return removed
+
+    # Dominators
+
+    def idom(self):
+        '''
+        Return a dictionary mapping every reachable block to its immediate
+        dominator.  The entry is mapped to None.
+        '''
+        if self._idom is None:
+            order = self.reverse_postorder()
+            index = { block: n for n, block in enumerate(order) }
+            idom = { self.entry: self.entry }
+
+            def intersect(a, b):
+                while a is not b:
+                    while index[a] > index[b]:
+                        a = idom[a]
+                    while index[b] > index[a]:
+                        b = idom[b]
+                return a
+
+            changed = True
+            while changed:
+                changed = False
+                for block in order[1:]:
+                    new_idom = None
+                    for pred in block.preds:
+                        if pred in idom:
+                            new_idom = pred if new_idom is None else intersect(pred, new_idom)
+                    if idom.get(block) is not new_idom:
+                        idom[block] = new_idom
+                        changed = True
+            idom[self.entry] = None
+            self._idom = idom
+        return self._idom
+
+    def dominates(self, a, b):
+        '''
+        Tell whether block a dominates block b (every block dominates itself)
+        '''
+        idom = self.idom()
+        while b is not None:
+            if b is a:
+                return True
+            b = idom.get(b)
+        return False
+
+    def dominator_tree(self):
+        '''
+        Return a dictionary mapping every reachable block to the list of
+        blocks it immediately dominates, in reverse postorder
+        '''
+        idom = self.idom()
+        children = { block: [] for block in idom }
+        for block in self.reverse_postorder():
+            if idom[block] is not None:
+                children[idom[block]].append(block)
+        return children
+
+    def dominance_frontiers(self):
+        '''
+        Return a dictionary mapping every reachable block to its dominance
+        frontier (a set of blocks)
+        '''
+        idom = self.idom()
+        frontiers = { block: set() for block in idom }
+        for block in idom:
+            preds = [ pred for pred in block.preds if pred in idom ]
+            if len(preds) >= 2:
+                for pred in preds:
+                    runner = pred
+                    while runner is not idom[block]:
+                        frontiers[runner].add(block)
+                        runner = idom[runner]
+        return frontiers
+
+    # Loops
+
+    def loops(self):
+        '''
+        Return the natural loops, outermost first.  Loops with the same
+        header are merged.
+        '''
+        idom = self.idom()
+        loops = { }
+        for block in self.reverse_postorder():
+            for succ in block.succs:
+                if self.dominates(succ, block):
+                    # block -> succ is a back edge
+                    loop = loops.get(succ)
+                    if loop is None:
+                        loop = loops[succ] = Loop(succ)
+                    loop.latches.append(block)
+                    stack = [ block ]
+                    while stack:
+                        member = stack.pop()
+                        if member not in loop.blocks:
+                            loop.blocks.add(member)
+                            stack.extend(pred for pred in member.preds if pred in idom)
+
+        # Nest the loops: the parent of a loop is the smallest other loop
+        # that contains its header
+        result = sorted(loops.values(), key=lambda loop: -len(loop.blocks))
+        for n, loop in enumerate(result):
+            for outer in reversed(result[:n]):
+                if loop.header in outer.blocks:
+                    loop.parent = outer
+                    break
+        return result
+
+    def preheader(self, loop):
+        '''
+        Return the preheader of a loop, adding one if needed.  Returns None
+        if the loop is entered in a way that doesn't allow one.
+        '''
+        header = loop.header
+        outside = [ pred for pred in header.preds if pred not in loop.blocks ]
+        if not outside or header.label is None:
+            return None
+        if len(outside) == 1 and outside[0].succs == [ header ]:
+            return outside[0]
+
+        # A block falling through into the header must come from outside,
+        # and then falls through into the new block instead
+        position = self.blocks.index(header)
+        if any(pred.terminator is None and pred in loop.blocks for pred in header.preds):
+            return None
+
+        label = self.new_label()
+        preheader = BasicBlock(label)
+        labels = { }
+        for pred in outside:
+            if pred.label is None:
+                pred.label = self.new_label()
+                self.labels[pred.label] = pred
+            labels[pred.label] = pred
+
+        # The PHIs of the header take the values of the blocks outside the
+        # loop from the preheader
+        for n, inst in enumerate(header.code):
+            if not is_phi(inst):
+                break
+            inside = [ pair for pair in phi_incoming(inst) if pair[1] not in labels ]
+            entering = [ pair for pair in phi_incoming(inst) if pair[1] in labels ]
+            if len(entering) == 1:
+                register = entering[0][0]
+            else:
+                register = self.new_register()
+                preheader.code.append(make_phi(inst[0], entering, register))
+            header.code[n] = make_phi(inst[0], inside + [ (register, label) ], inst[-1])
+
+        preheader.code.append(('BRANCH', header.label))
+        for pred in outside:
+            if pred.terminator is not None:
+                pred.code[-1] = retarget(pred.terminator, header.label, label)
+        self.blocks.insert(position, preheader)
+        self.update()
+
+        # The new block is part of the loops around this one
+        outer = loop.parent
+        while outer:
+            outer.blocks.add(preheader)
+            outer = outer.parent
+        return preheader
+
+    # Back to instructions
+
+    def new_label(self):
+        '''
+        Return a label that isn't used in the function
+        '''
+        numbers = [ int(label[1:]) for label in self.labels
+                    if label[:1] == 'L' and label[1:].isdigit() ]
+        self._last_label = max(numbers + [ getattr(self, '_last_label', 0) ]) + 1
+        return f'L{self._last_label}'
+
+    def new_register(self):
+        '''
+        Return a register that isn't used in the function
+        '''
+        if getattr(self, '_last_register', None) is None:
+            numbers = [ 0 ]
+            for block in self.blocks:
+                for inst in block.code:
+                    target = defined_register(inst)
+                    if target is not None and target[1:].isdigit():
+                        numbers.append(int(target[1:]))
+            self._last_register = max(numbers)
+        self._last_register += 1
+        return f'R{self._last_register}'
+
+    def linearize(self, order=None):
+        '''
+        Return the code of the blocks as a list of instructions, with the
+        blocks in the given order (by default, self.blocks).  A BRANCH is
+        added where a block falls through into a block that doesn't follow
+        it any more.
+        '''
+        order = self.blocks if order is None else order
+        code = []
+        for n, block in enumerate(order):
+            if block.label:
+                code.append(('LABEL', block.label))
+            code.extend(block.code)
+            if block.terminator is None and block.succs:
+                succ = block.succs[0]
+                if n + 1 >= len(order) or order[n + 1] is not succ:
+                    if not succ.label:
+                        succ.label = self.new_label()
+                        self.labels[succ.label] = succ
+                    code.append(('BRANCH', succ.label))
+            elif block.terminator is None and n + 1 < len(order):
+                raise ValueError(f'{self.function.name}: the block that ends the function '
+                                 'must be the last one')
+        return code
+
+def main():
+    import sys
+    from .ircode import compile_ircode
+
+    if len(sys.argv) != 2:
+        sys.stderr.write("Usage: python3 -m gone.cfg filename\n")
+        raise SystemExit(1)
+
+    source = open(sys.argv[1]).read()
+    for func in compile_ircode(source):
+        cfg = ControlFlowGraph(func)
+        idom = cfg.idom()
+        names = { block: block.label or f'<{n}>' for n, block in enumerate(cfg.blocks) }
+        print(f'{"::"*5} {func} {"::"*5}')
+        for block in cfg.blocks:
+            dom = names[idom[block]] if idom.get(block) else '-'
+            print(f'{names[block]}:  preds {[names[b] for b in block.preds]}  '
+                  f'succs {[names[b] for b in block.succs]}  idom {dom}'
+                  f'{"" if block in idom else "  (unreachable)"}')
+            for inst in block.code:
+                print('    ', inst)
+        for loop in cfg.loops():
+            print(f'loop {names[loop.header]}: depth {loop.depth}, '
+                  f'blocks {sorted(names[b] for b in loop.blocks)}, '
+                  f'latches {[names[b] for b in loop.latches]}')
+
+if __name__ == '__main__':
+    main()
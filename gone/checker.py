@@ -107,8 +107,10 @@ fumble around a bit at first.
 
 from collections import ChainMap
 from .errors import error
+from .context import use_context
 from .ast import *
-from .typesys import Type, FloatType, IntType, CharType, BoolType
+from .typesys import (FloatType, IntType, CharType, BoolType, TYPES_BY_NAME,
+                      BINOP_TYPES, UNARYOP_TYPES)
 
 class CheckProgramVisitor(NodeVisitor):
     '''
@@ -138,7 +140,7 @@ class CheckProgramVisitor(NodeVisitor):
 
         # Put the builtin type names in the symbol table
         # self.symbols.update(builtin_types)
-        self.keywords = {t.name for t in Type.__subclasses__()}
+        self.keywords = set(TYPES_BY_NAME)
 
     def visit_VarDeclaration(self, node):
         # Here we must update the symbols table with the new symbol
@@ -152,14 +154,14 @@ class CheckProgramVisitor(NodeVisitor):
 
         if node.name not in self.symbols:
             # First check that the datatype node is correct
-            self.visit(node.datatype)
+            yield node.datatype
 
             if node.datatype.type:
                 # Before finishing, this var declaration may have an expression
                 # to initialize it. If so, we must visit the node, and check
                 # type errors
                 if node.value:
-                    self.visit(node.value)
+                    yield node.value
 
                     if node.value.type: # If value has no type, then there was a previous error
                         if node.value.type == node.datatype.type:
@@ -186,7 +188,7 @@ class CheckProgramVisitor(NodeVisitor):
         # You'll put the declaration into the symbol table so that it can be looked up later
         if node.name not in self.symbols:
             # First visit value node to extract its type
-            self.visit(node.value)
+            yield node.value
             node.type = node.value.type
             self.symbols[node.name] = node
         else:
@@ -208,39 +210,39 @@ class CheckProgramVisitor(NodeVisitor):
         node.type = BoolType
 
     def visit_PrintStatement(self, node):
-        self.visit(node.value)
+        yield node.value
 
     def visit_IfStatement(self, node):
-        self.visit(node.condition)
+        yield node.condition
 
         cond_type = node.condition.type
         if cond_type:
             if issubclass(node.condition.type, BoolType):
-                self.visit(node.true_block)
-                self.visit(node.false_block)
+                yield node.true_block
+                yield node.false_block
             else:
                 error(node.lineno, f"'Condition must be of type 'bool' but got type '{cond_type.name}'")
 
     def visit_WhileStatement(self, node):
-        self.visit(node.condition)
+        yield node.condition
 
         cond_type = node.condition.type
         if cond_type:
             if issubclass(node.condition.type, BoolType):
-                self.visit(node.body)
+                yield node.body
             else:
                 error(node.lineno, f"'Condition must be of type 'bool' but got type '{cond_type.name}'")
 
     def visit_BinOp(self, node):
         # For operators, you need to visit each operand separately.  You'll
         # then need to make sure the types and operator are all compatible.
-        self.visit(node.left)
-        self.visit(node.right)
+        yield node.left
+        yield node.right
 
         node.type = None
         # Perform various checks here
         if node.left.type and node.right.type:
-            op_type = node.left.type.binop_type(node.op, node.right.type)
+            op_type = BINOP_TYPES.get((node.left.type, node.op, node.right.type))
             if not op_type:
                 left_tname = node.left.type.name
                 right_tname = node.right.type.name
@@ -250,11 +252,11 @@ class CheckProgramVisitor(NodeVisitor):
 
     def visit_UnaryOp(self, node):
         # Check and propagate the type of the only operand
-        self.visit(node.right)
+        yield node.right
 
         node.type = None
         if node.right.type:
-            op_type = node.right.type.unaryop_type(node.op)
+            op_type = UNARYOP_TYPES.get((node.op, node.right.type))
             if not op_type:
                 right_tname = node.right.type.name
                 error(node.lineno, f"Unary operation '{node.op} {right_tname}' not supported")
@@ -264,9 +266,9 @@ class CheckProgramVisitor(NodeVisitor):
     def visit_WriteLocation(self, node):
         # First visit the location definition to check that it is a valid
         # location
-        self.visit(node.location)
+        yield node.location
         # Visit the value, to also get type information
-        self.visit(node.value)
+        yield node.value
 
         node.type = None
         if node.location.type and node.value.type:
@@ -289,7 +291,7 @@ class CheckProgramVisitor(NodeVisitor):
 
     def visit_ReadLocation(self, node):
         # Associate a type name such as "int" with a Type object
-        self.visit(node.location)
+        yield node.location
         node.type = node.location.type
 
     def visit_SimpleLocation(self, node):
@@ -301,16 +303,16 @@ class CheckProgramVisitor(NodeVisitor):
 
     def visit_SimpleType(self, node):
         # Associate a type name such as "int" with a Type object
-        node.type = Type.get_by_name(node.name)
+        node.type = TYPES_BY_NAME.get(node.name)
         if node.type is None:
             error(node.lineno, f"Invalid type '{node.name}'")
 
     def visit_FuncParameter(self, node):
-        self.visit(node.datatype)
+        yield node.datatype
         node.type = node.datatype.type
 
     def visit_ReturnStatement(self, node):
-        self.visit(node.value)
+        yield node.value
         # Propagate return value type as a special property ret_type, only
         # to be checked at function declaration checking
         if self.expected_ret_type:
@@ -325,7 +327,7 @@ class CheckProgramVisitor(NodeVisitor):
             prev_def = self.functions[node.name].lineno
             error(node.lineno, f"Function '{node.name}' already defined at line {prev_def}")
 
-        self.visit(node.params)
+        yield node.params
 
         param_types_ok = all((param.type is not None for param in node.params))
         param_names = [param.name for param in node.params]
@@ -333,7 +335,7 @@ class CheckProgramVisitor(NodeVisitor):
         if not param_names_ok:
             error(node.lineno, "Duplicate parameter names at function definition")
 
-        self.visit(node.datatype)
+        yield node.datatype
         ret_type_ok = node.datatype.type is not None
 
         # Before visiting the function, body, we must change the symbol table
@@ -353,7 +355,7 @@ class CheckProgramVisitor(NodeVisitor):
             # Set the expected return value to observe
             self.expected_ret_type = node.datatype.type
 
-            self.visit(node.body)
+            yield node.body
 
             if not self.current_ret_type:
                 error(node.lineno, f"Function '{node.name}' has no return statement")
@@ -373,7 +375,7 @@ class CheckProgramVisitor(NodeVisitor):
         else:
             # We must check that the argument list matches the function
             # parameters definition
-            self.visit(node.arguments)
+            yield node.arguments
 
             arg_types = tuple([arg.type.name for arg in node.arguments])
             func = self.functions[node.name]
@@ -388,25 +390,27 @@ class CheckProgramVisitor(NodeVisitor):
 #                       DO NOT MODIFY ANYTHING BELOW
 # ----------------------------------------------------------------------
 
-def check_program(ast):
+def check_program(ast, context=None):
     '''
-    Check the supplied program (in the form of an AST)
+    Check the supplied program (in the form of an AST).  Errors are
+    reported to context (by default, the current context).
     '''
-    checker = CheckProgramVisitor()
-    checker.visit(ast)
+    with use_context(context) as context, context.timer('check'):
+        checker = CheckProgramVisitor()
+        checker.visit(ast)
 
 def main():
     '''
     Main program. Used for testing
     '''
     import sys
-    from .parser import parse
+    from .parser import parse_file
 
     if len(sys.argv) < 2:
         sys.stderr.write('Usage: python3 -m gone.checker filename\n')
         raise SystemExit(1)
 
-    ast = parse(open(sys.argv[1]).read())
+    ast = parse_file(sys.argv[1])
     check_program(ast)
     if '--show-types' in sys.argv:
         for depth, node in flatten(ast):
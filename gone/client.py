@@ -0,0 +1,156 @@
+'''
+Compile server client
+=====================
+A thin client for the compile server (see server.py).  It sends a Gone
+program to a running server, together with its own standard output and
+error, so the output of the program and the error messages show up
+exactly as if the compiler ran in this process:
+
+    bash % python3 -m gone.server &
+    bash % python3 -m gone.client run examples/mandel.g
+    bash % python3 -m gone.client compile examples/fib.g > fib.ll
+    bash % python3 -m gone.client check examples/fact.g
+    bash % python3 -m gone.client stop
+
+This module only imports marshal, os, socket and sys (not even argparse
+or json, which take longer to import than the server takes to run a
+small program), so that starting it is about as cheap as starting
+Python.
+
+If no server is running, the program is compiled in this process
+instead, which is slow but works.
+
+The protocol runs over a Unix domain socket.  Every message is a
+dictionary serialized with marshal and preceded by its length (4
+bytes, big endian).  The request carries the client's stdout and stderr
+file descriptors as SCM_RIGHTS ancillary data.  The reply gives the
+exit status:
+
+    request:  { 'command': 'run', 'source': '...', 'filename': '...',
+                'options': {...} }
+    reply:    { 'status': 0, 'errors': 0, 'stats': {...} }
+'''
+
+import marshal
+import os
+import socket
+import sys
+
+COMMANDS = ('run', 'compile', 'check')
+
+def socket_path():
+    '''
+    Return the path of the server socket: $GONE_SOCKET, or a per-user
+    socket in $XDG_RUNTIME_DIR (or /tmp)
+    '''
+    path = os.environ.get('GONE_SOCKET')
+    if not path:
+        directory = os.environ.get('XDG_RUNTIME_DIR') or '/tmp'
+        path = os.path.join(directory, f'gone-{os.getuid()}.sock')
+    return path
+
+def send_message(sock, message, fds=()):
+    data = marshal.dumps(message)
+    data = len(data).to_bytes(4, 'big') + data
+    if fds:
+        sent = socket.send_fds(sock, [data], list(fds))
+        data = data[sent:]
+    sock.sendall(data)
+
+def receive_message(sock, maxfds=0):
+    '''
+    Receive a message and the file descriptors sent with it.  Returns
+    (message, fds), or (None, fds) if the connection was closed.
+    '''
+    data = b''
+    fds = []
+    size = None
+    while size is None or len(data) < size + 4:
+        if maxfds > len(fds):
+            chunk, new_fds, _, _ = socket.recv_fds(sock, 65536, maxfds - len(fds))
+            fds.extend(new_fds)
+        else:
+            chunk = sock.recv(65536)
+        if not chunk:
+            return None, fds
+        data += chunk
+        if size is None and len(data) >= 4:
+            size = int.from_bytes(data[:4], 'big')
+    return marshal.loads(data[4:]), fds
+
+def request(message, path=None):
+    '''
+    Send a request to the server and return its reply.  Raises OSError if
+    there is no server.
+    '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path or socket_path())
+        sys.stdout.flush()
+        sys.stderr.flush()
+        send_message(sock, message, [sys.stdout.fileno(), sys.stderr.fileno()])
+        reply, _ = receive_message(sock)
+    if reply is None:
+        raise ConnectionError('The server closed the connection')
+    return reply
+
+def compile_locally(message):
+    '''
+    Do what the server would do with a request, in this process
+    '''
+    from .server import serve_request
+    return serve_request(message)
+
+_USAGE = '''\
+usage: python3 -m gone.client [-v] [-O] [--frontend lalr|rd] [--socket PATH] command [filename]
+
+commands: run, compile, check (these need a filename), ping, stop
+'''
+
+def main():
+    args = sys.argv[1:]
+    verbose = False
+    path = None
+    options = { }
+    try:
+        while args and args[0].startswith('-'):
+            flag = args.pop(0)
+            if flag in ('-v', '--verbose'):
+                verbose = True
+            elif flag == '--socket':
+                path = args.pop(0)
+            elif flag in ('-O', '--optimize'):
+                options['optimize'] = True
+            elif flag == '--frontend':
+                options['frontend'] = args.pop(0)
+            else:
+                raise ValueError(flag)
+        command = args.pop(0)
+        filename = args.pop(0) if command in COMMANDS else None
+        if args or command not in COMMANDS + ('ping', 'stop'):
+            raise ValueError(command)
+    except (IndexError, ValueError):
+        sys.stderr.write(_USAGE)
+        raise SystemExit(2)
+
+    message = { 'command': command }
+    if filename:
+        with open(filename) as f:
+            message['source'] = f.read()
+        message['filename'] = filename
+        message['options'] = options
+
+    try:
+        reply = request(message, path)
+    except OSError as e:
+        if command not in COMMANDS:
+            sys.stderr.write(f'No server: {e}\n')
+            raise SystemExit(1)
+        reply = compile_locally(message)
+
+    if verbose:
+        for name, value in sorted(reply.get('stats', { }).items()):
+            print(f'{name:<16} {value:.6g}', file=sys.stderr)
+    raise SystemExit(reply.get('status', 0))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+'''
+Compact IR
+==========
+A compact encoding of the intermediate code of ircode.py.  The tuple
+form, such as
+
+    ('ADDI', 'R12', 'R13', 'R14')
+
+is convenient to print and to write code generators for, but every
+instruction is a tuple of strings.  In the compact form, the code of a
+function is a single array of integers:
+
+    - Opcodes are members of the Op enumeration (small integers).
+    - Registers R<n> are stored as the number n, and labels L<n> as n.
+    - Literal values (MOV operands, CMP operators) and names (variables,
+      called functions) are indexes into two side tables of the function,
+      constants and names, where each value is stored once.
+
+Each instruction takes a header word, (opcode << 8) | number of operands,
+followed by its operands.  Which operands are registers, labels,
+constants or names is given by the signature of the opcode (see
+SIGNATURES), so the encoding is lossless:
+
+    compact = CompactFunction.from_function(func)
+    func = compact.to_function()        # Same code tuples as before
+
+The compact form is for holding and storing code: it takes about a
+third of the memory of the tuples and unpickles an order of magnitude
+faster (see benchmarks/bench_compactir.py).  Reading it is slower than
+reading the tuples, so the passes work on the tuple form.
+CompactFunction.instructions() generates (opcode, operands) pairs
+without building any strings.  To show the compact code of a program,
+run:
+
+    bash % python3 -m gone.compactir someprogram.g
+'''
+
+import re
+from array import array
+from enum import IntEnum
+
+from .ircode import Function, OP_CODE_TABLE
+
+# Operand kinds of the signatures:
+#
+#     r   register
+#     l   label
+#     c   constant
+#     n   name
+#     *   any number of registers (the rest of the operands)
+#     %   any number of register and label pairs, then a register
+#
+# The signature of an opcode is the one of its family, the opcode
+# without its type suffix (ADDI -> ADD).
+_FAMILY_SIGNATURES = {
+    'MOV': 'cr',
+    'VAR': 'n',
+    'ALLOC': 'n',
+    'LOAD': 'nr',
+    'STORE': 'rn',
+    'ADD': 'rrr',
+    'SUB': 'rrr',
+    'MUL': 'rrr',
+    'DIV': 'rrr',
+    'AND': 'rrr',
+    'OR': 'rrr',
+    'XOR': 'rrr',
+    'SHL': 'rrr',
+    'SHR': 'rrr',
+    'PRINT': 'r',
+    'CMP': 'crrr',
+    'ITOF': 'rr',
+    'FTOI': 'rr',
+    'BTOI': 'rr',
+    'ITOB': 'rr',
+    'LABEL': 'l',
+    'BRANCH': 'l',
+    'CBRANCH': 'rll',
+    'CALL': 'n*',
+    'RET': 'r',
+    'PHI': '%',
+}
+
+# Every opcode: the ones GenerateCode can emit, then the rest of the
+# instruction set
+_OP_NAMES = list(dict.fromkeys(list(OP_CODE_TABLE.values()) +
+                               ['XOR', 'ITOF', 'FTOI', 'BTOI', 'ITOB',
+                                'PHII', 'PHIF', 'PHIB', 'SHLI', 'SHRI']))
+
+Op = IntEnum('Op', _OP_NAMES, start=0)
+Op.__doc__ = 'Opcodes of the compact IR'
+
+def _family(name):
+    if name in _FAMILY_SIGNATURES:
+        return name
+    return name[:-1]
+
+# Operand signature of every opcode, indexed by opcode
+SIGNATURES = [ _FAMILY_SIGNATURES[_family(op.name)] for op in Op ]
+
+def operand_kinds(signature, count):
+    '''
+    Return the kinds of the operands of an instruction with the given
+    signature and number of operands, or None if the number is wrong
+    '''
+    if signature[-1] == '*':
+        kinds = signature[:-1] + 'r' * (count - len(signature) + 1)
+    elif signature == '%':
+        kinds = 'rl' * (count // 2) + 'r'
+    else:
+        kinds = signature
+    return kinds if len(kinds) == count else None
+
+_OPS = list(Op)
+_OPS_BY_NAME = Op.__members__
+_NUMBERED = re.compile(r'[RL]([1-9][0-9]*|0)$')
+
+class CompactFunction(object):
+    '''
+    The code of a Function in compact form.  code is the array of
+    instruction words, constants and names are the side tables.
+    '''
+    __slots__ = ('name', 'parameters', 'return_type', 'code', 'constants', 'names')
+
+    def __init__(self, name, parameters, return_type):
+        self.name = name
+        self.parameters = parameters
+        self.return_type = return_type
+        self.code = array('i')
+        self.constants = []
+        self.names = []
+
+    def __repr__(self):
+        return (f'CompactFunction({self.name!r}, {len(self.code)} words, '
+                f'{len(self.constants)} constants, {len(self.names)} names)')
+
+    @classmethod
+    def from_function(cls, func):
+        '''
+        Encode the code of a Function.  Raises ValueError for instructions
+        that can't be encoded (unknown opcodes, registers not named R<n>,
+        labels not named L<n>, ...).
+        '''
+        compact = cls(func.name, func.parameters, func.return_type)
+        code = compact.code
+        constants = { }
+        names = { }
+        for inst in func.code:
+            op = _OPS_BY_NAME.get(inst[0])
+            if op is None:
+                raise ValueError(f'Unknown opcode in {inst!r}')
+            operands = inst[1:]
+            kinds = operand_kinds(SIGNATURES[op], len(operands))
+            if kinds is None or len(operands) > 255:
+                raise ValueError(f'Wrong number of operands in {inst!r}')
+
+            code.append(op << 8 | len(operands))
+            for kind, operand in zip(kinds, operands):
+                if kind == 'c':
+                    # The type is part of the key, so that 1, 1.0 and True
+                    # stay distinct.  So are 0.0 and -0.0.
+                    key = (type(operand), operand.hex() if type(operand) is float else operand)
+                    index = constants.get(key)
+                    if index is None:
+                        index = constants[key] = len(compact.constants)
+                        compact.constants.append(operand)
+                    code.append(index)
+                elif kind == 'n':
+                    index = names.get(operand)
+                    if index is None:
+                        index = names[operand] = len(compact.names)
+                        compact.names.append(operand)
+                    code.append(index)
+                else:
+                    if (not isinstance(operand, str) or operand[:1] != ('R' if kind == 'r' else 'L')
+                        or not _NUMBERED.match(operand)):
+                        raise ValueError(f'Bad operand {operand!r} in {inst!r}')
+                    code.append(int(operand[1:]))
+        return compact
+
+    def instructions(self):
+        '''
+        Generate the instructions as (opcode, operands) pairs.  Operands
+        is a list of the integers of the encoding (register and label
+        numbers, indexes of constants and names).
+        '''
+        # Reading a list is faster than reading the array
+        code = self.code.tolist()
+        ops = _OPS
+        n = 0
+        end = len(code)
+        while n < end:
+            header = code[n]
+            count = header & 0xff
+            n += 1
+            yield ops[header >> 8], code[n:n + count]
+            n += count
+
+    def __iter__(self):
+        return self.instructions()
+
+    def to_function(self):
+        '''
+        Decode back to a Function with code tuples
+        '''
+        func = Function(self.name, self.parameters, self.return_type)
+        code = self.code
+        constants = self.constants
+        names = self.names
+        op_names = _OP_NAMES
+        signatures = SIGNATURES
+        # Register and label names are shared by all the instructions
+        registers = { }
+        labels = { }
+
+        n = 0
+        end = len(code)
+        append = func.code.append
+        while n < end:
+            header = code[n]
+            op = header >> 8
+            count = header & 0xff
+            kinds = operand_kinds(signatures[op], count)
+            inst = [ op_names[op] ]
+            for kind, operand in zip(kinds, code[n + 1:n + 1 + count]):
+                if kind == 'r':
+                    value = registers.get(operand)
+                    if value is None:
+                        value = registers[operand] = f'R{operand}'
+                elif kind == 'l':
+                    value = labels.get(operand)
+                    if value is None:
+                        value = labels[operand] = f'L{operand}'
+                elif kind == 'c':
+                    value = constants[operand]
+                else:
+                    value = names[operand]
+                inst.append(value)
+            append(tuple(inst))
+            n += 1 + count
+        return func
+
+def compact(functions):
+    '''
+    Encode a list of Functions
+    '''
+    return [ CompactFunction.from_function(func) for func in functions ]
+
+def expand(functions):
+    '''
+    Decode a list of CompactFunctions
+    '''
+    return [ func.to_function() for func in functions ]
+
+def main():
+    import sys
+    from .ircode import compile_ircode
+
+    if len(sys.argv) != 2:
+        sys.stderr.write("Usage: python3 -m gone.compactir filename\n")
+        raise SystemExit(1)
+
+    source = open(sys.argv[1]).read()
+    for func in compact(compile_ircode(source)):
+        print(f'{"::"*5} {func!r} {"::"*5}')
+        for op, operands in func.instructions():
+            print(f'    {op.name:<8} {", ".join(map(str, operands))}')
+        print('    constants:', func.constants)
+        print('    names:    ', func.names)
+
+if __name__ == '__main__':
+    main()
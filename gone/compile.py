@@ -8,14 +8,35 @@
 # to make this work.
 #
 # Note: A minor change is required in Project 8.  See note in the code below.
+#
+# Batch mode:
+# -----------
+# Any number of files and directories (searched recursively for .g
+# files) can be given.  Every file is compiled to an executable of its
+# own, named after the source file without the .g suffix.  The files
+# are compiled in parallel by a pool of worker processes, one per core
+# by default, and every worker links its own executables, so the clang
+# runs are concurrent too.  The runtime library is compiled only once.
+#
+#     bash % python3 -m gone.compile -j 8 -o build examples/ tests/foo.g
+#
+# A single file given without options is compiled to a.out, as before.
+# Use --help for all the options.
+#
+# With --cache, the LLVM code and the object file of every program are
+# kept in a compilation cache (see cache.py), and building a program
+# that hasn't changed since the last build only links it again.
 
+import argparse
+import os
+import os.path
 import subprocess
 import sys
-import os.path
 import tempfile
+import time
 
 from .llvmgen import compile_llvm
-from .errors import errors_reported
+from .context import CompilationContext
 
 # Name of the runtime library
 _rtlib = os.path.join(os.path.dirname(__file__), 'gonert.c')
@@ -23,22 +44,216 @@ _rtlib = os.path.join(os.path.dirname(__file__), 'gonert.c')
 # clang installation
 CLANG = 'clang'
 
-def main():
-    if len(sys.argv) != 2:
-        sys.stderr.write("Usage: python3 -m gone.compile filename\n")
+def compile_runtime(clang, directory):
+    '''
+    Compile the runtime library to an object file in directory, so that it
+    can be linked into every program without compiling it again
+    '''
+    obj = os.path.join(directory, 'gonert.o')
+    # Use this for Projects 5-7
+    # subprocess.check_output([clang, '-c', _rtlib, '-o', obj])
+
+    # Use this version when you get to Project 8
+    subprocess.check_output([clang, '-DNEED_MAIN', '-c', _rtlib, '-o', obj])
+    return obj
+
+def _run_clang(context, command):
+    proc = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                          universal_newlines=True)
+    if proc.returncode:
+        context.error('link', proc.stdout.strip() or f'{command[0]} failed')
+    return not proc.returncode
+
+def compile_file(filename, output, options, runtime=None, clang=CLANG):
+    '''
+    Compile one source file to the executable output, linking it with the
+    runtime object file.  If runtime is None, the LLVM code is written to
+    output + '.ll' instead.  Returns (diagnostics, stats), where stats
+    includes the time spent in every phase.
+
+    If options has a 'cache', the object file of the program is cached
+    too, and a program found in the cache is only linked.
+    '''
+    context = CompilationContext(filename=filename, options=options, echo=False)
+    start = time.perf_counter()
+    with open(filename) as f:
+        source = f.read()
+    context.count('lines', source.count('\n'))
+
+    cache = context.get_option('cache')
+    if cache is not None and runtime is not None:
+        key = cache.key(source, dict(context.options, clang=clang))
+        obj = cache.load(key, 'o', context)
+        if obj is not None:
+            with context.timer('link'), tempfile.NamedTemporaryFile(suffix='.o') as f:
+                f.write(obj)
+                f.flush()
+                _run_clang(context, [clang, f.name, runtime, '-o', output])
+            context.stats['total'] = time.perf_counter() - start
+            return context.diagnostics, context.stats
+
+    llvm_code = compile_llvm(source, context)
+    if not context.errors_reported():
+        if runtime is None:
+            with open(output + '.ll', 'w') as f:
+                f.write(llvm_code)
+        else:
+            with context.timer('link'), tempfile.NamedTemporaryFile(suffix='.ll') as f:
+                f.write(llvm_code.encode('utf-8'))
+                f.flush()
+                if cache is None:
+                    _run_clang(context, [clang, f.name, runtime, '-o', output])
+                elif _run_clang(context, [clang, '-c', f.name, '-o', output + '.o']):
+                    # Compile to an object file first, to cache it
+                    with open(output + '.o', 'rb') as obj:
+                        cache.store(key, 'o', obj.read(), context)
+                    _run_clang(context, [clang, output + '.o', runtime, '-o', output])
+                    os.unlink(output + '.o')
+
+    context.stats['total'] = time.perf_counter() - start
+    return context.diagnostics, context.stats
+
+def find_sources(paths):
+    '''
+    Expand the command line paths into a list of (source, name) pairs, where
+    name is the output name relative to the output directory
+    '''
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if filename.endswith('.g'):
+                        source = os.path.join(dirpath, filename)
+                        sources.append((source, os.path.relpath(source, path)))
+        else:
+            sources.append((path, os.path.basename(path)))
+    return [ (source, name[:-2] if name.endswith('.g') else name + '.out')
+             for source, name in sources ]
+
+def _phase_times(stats):
+    phases = [ f'{phase} {stats[phase]:.3f}s'
+               for phase in ('parse', 'check', 'ircode', 'optimize', 'llvm', 'link')
+               if phase in stats ]
+    return ', '.join(phases)
+
+def batch_main(args):
+    '''
+    Compile all the files given in args (see main() for the options)
+    '''
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    sources = find_sources(args.paths)
+    if not sources:
+        sys.stderr.write('No source files found\n')
+        raise SystemExit(1)
+
+    if args.output:
+        outputs = [ os.path.join(args.output, name) for _, name in sources ]
+    else:
+        outputs = [ os.path.join(os.path.dirname(source), os.path.basename(name))
+                    for source, name in sources ]
+    if len(set(outputs)) != len(outputs):
+        sys.stderr.write('Several source files have the same output name\n')
+        raise SystemExit(1)
+    for output in outputs:
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+
+    options = { 'frontend': args.frontend }
+    if args.optimize:
+        options['optimize'] = True
+    if args.cache:
+        options['cache'] = args.cache
+    jobs = args.jobs or os.cpu_count() or 1
+    start = time.perf_counter()
+    failed = 0
+    lines = hits = misses = 0
+    with tempfile.TemporaryDirectory() as tmpdir:
+        runtime = None if args.emit_llvm else compile_runtime(args.clang, tmpdir)
+
+        # Start with the biggest files, so that a long compilation doesn't
+        # end up running alone at the end
+        jobs_list = sorted(zip(sources, outputs), key=lambda job: -os.path.getsize(job[0][0]))
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = { pool.submit(compile_file, source, output, options, runtime, args.clang):
+                        (source, output) for (source, _), output in jobs_list }
+            for future in as_completed(futures):
+                source, output = futures[future]
+                diagnostics, stats = future.result()
+                lines += stats.get('lines', 0)
+                hits += stats.get('cache_hits', 0)
+                misses += stats.get('cache_misses', 0)
+                for lineno, message, filename in diagnostics:
+                    print(f'{filename}:{lineno}: {message}', file=sys.stderr)
+                if diagnostics:
+                    failed += 1
+                    status = 'FAILED'
+                else:
+                    status = 'cached' if stats.get('cache_hits') else 'ok'
+                    if runtime is None:
+                        output += '.ll'
+                print(f'{status:<6} {source} -> {output}  {stats["total"]:.3f}s '
+                      f'({_phase_times(stats)})')
+
+    elapsed = time.perf_counter() - start
+    print(f'{len(sources)} files, {failed} failed, {jobs} jobs, {elapsed:.2f}s: '
+          f'{len(sources) / elapsed:.1f} files/s, {lines / elapsed:,.0f} lines/s')
+    if args.cache:
+        print(f'cache: {hits} hits, {misses} misses ({args.cache.directory})')
+    if failed:
         raise SystemExit(1)
 
-    source = open(sys.argv[1]).read()
-    llvm_code = compile_llvm(source)
-    if not errors_reported():
+def main():
+    parser = argparse.ArgumentParser(prog='python3 -m gone.compile',
+                                     description='Compile Gone programs to executables.')
+    parser.add_argument('paths', nargs='+', metavar='path',
+                        help='source file, or directory searched for .g files')
+    parser.add_argument('-o', '--output', metavar='DIR',
+                        help='directory for the executables (default: next to each source)')
+    parser.add_argument('-j', '--jobs', type=int, default=0,
+                        help='number of worker processes (default: one per core)')
+    parser.add_argument('-O', '--optimize', action='store_true',
+                        help='optimize the intermediate code (see gone/optimize.py)')
+    parser.add_argument('--frontend', choices=['lalr', 'rd'], default='lalr',
+                        help='parser front end (default: lalr)')
+    parser.add_argument('--emit-llvm', action='store_true',
+                        help='write the LLVM code of each program instead of linking it')
+    parser.add_argument('--clang', default=CLANG, help='clang command')
+    parser.add_argument('--cache', action='store_true',
+                        help='reuse the results of earlier compilations (see gone/cache.py)')
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help='cache directory (implies --cache, default: $GONE_CACHE_DIR '
+                        'or ~/.cache/gone)')
+    parser.add_argument('--cache-size', type=int, metavar='MB',
+                        help='maximum size of the cache (default: 256)')
+    args = parser.parse_args()
+
+    if args.cache or args.cache_dir:
+        from .cache import CompilationCache
+        args.cache = CompilationCache(args.cache_dir,
+                                      None if args.cache_size is None else args.cache_size * 2**20)
+    else:
+        args.cache = None
+
+    batch = (len(args.paths) > 1 or os.path.isdir(args.paths[0]) or args.output
+             or args.jobs or args.emit_llvm or args.frontend != 'lalr')
+    if batch:
+        batch_main(args)
+        return
+
+    source = open(args.paths[0]).read()
+    context = CompilationContext(options={ 'cache': args.cache, 'optimize': args.optimize })
+    llvm_code = compile_llvm(source, context)
+    if not context.errors_reported():
         with tempfile.NamedTemporaryFile(suffix='.ll') as f:
             f.write(llvm_code.encode('utf-8'))
             f.flush()
             # Use this for Projects 5-7
-            # subprocess.check_output([CLANG,  f.name, _rtlib])
+            # subprocess.check_output([args.clang,  f.name, _rtlib])
 
             # Use this version when you get to Project 8
-            subprocess.check_output([CLANG, '-DNEED_MAIN', f.name, _rtlib])
+            subprocess.check_output([args.clang, '-DNEED_MAIN', f.name, _rtlib])
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,426 @@
+'''
+Constant propagation
+====================
+An optimization pass that finds the registers and variables holding
+values known at compile time, and rewrites the code to use them:
+
+    - Instructions whose result is a known constant (arithmetic on
+      constants, comparisons, loads of variables holding a constant)
+      become MOV instructions.  The instructions that computed their
+      operands are then usually dead (see dce.py).
+    - Conditional branches on a known condition become unconditional,
+      and the blocks that can no longer be reached are removed.
+
+The analysis runs over the control flow graph of each function (see
+cfg.py).  It is optimistic about the edges: a block is only analyzed
+once a branch that can be taken leads to it, so variables and branches
+that are constant on every path actually taken are found, as in
+sparse conditional constant propagation.
+
+The values of PHI instructions (see mem2reg.py) only take into account
+the edges that can be taken.  A PHI with a constant value becomes a MOV
+placed after the other PHIs of its block, which must stay first.
+
+Variables are tracked by name.  Following the LLVM code generator, a
+name refers to a local variable from its ALLOC (or parameter) onwards,
+and to a global before that.  A name used as both in one function is
+left alone.  Calls can change any global variable, so the values known
+for globals are forgotten after a CALL.
+
+Across functions, a global is a constant if __gone_init stores a known
+value in it before calling any function, and no other instruction of
+the program stores to it.  That covers const declarations (which the
+code generator turns into VAR and STORE like any variable).  Loads of
+such globals become MOVs in every function.
+
+Folding follows the semantics of the generated LLVM code: integers are
+32 bit and wrap around, integer division truncates towards zero, and
+comparisons of floats are ordered (false when a NaN is involved).
+Operations whose result is undefined or target specific (division by
+zero, overflowing division) are left to run time.
+'''
+
+import math
+
+from .cfg import ControlFlowGraph, is_phi, phi_incoming
+
+# Families of the operations folded on integers and floats
+_ARITHMETIC = { 'ADD', 'SUB', 'MUL', 'DIV', 'SHL', 'SHR' }
+_LOGICAL = { 'AND', 'OR', 'XOR', 'ANDI', 'ORI' }
+
+# Families of the instructions that define a register
+_DEFINES = { 'MOV', 'LOAD', 'CMP', 'CALL', 'PHI' } | _ARITHMETIC | _LOGICAL
+
+# Value of a PHI none of whose incoming values is known yet
+_UNSET = object()
+
+def _wrap(value):
+    '''
+    Wrap an integer to 32 bits, two's complement
+    '''
+    return (value + 2**31) % 2**32 - 2**31
+
+def _same(a, b):
+    '''
+    Tell whether two constants are the same value (of the same type).
+    Unlike ==, 0.0 and -0.0 differ and NaN is itself.
+    '''
+    if type(a) is not type(b):
+        return False
+    if type(a) is float:
+        return a.hex() == b.hex()
+    return a == b
+
+def fold_arithmetic(family, suffix, left, right):
+    '''
+    Return the result of an arithmetic operation on constants, or None if
+    it can't be folded
+    '''
+    if suffix == 'I':
+        if family == 'ADD':
+            return _wrap(left + right)
+        elif family == 'SUB':
+            return _wrap(left - right)
+        elif family == 'MUL':
+            return _wrap(left * right)
+        elif family in ('SHL', 'SHR'):
+            if not 0 <= right < 32:
+                return None
+            return _wrap(left << right) if family == 'SHL' else left >> right
+        elif right == 0 or (left == -2**31 and right == -1):
+            return None
+        quotient = abs(left) // abs(right)
+        return quotient if (left < 0) == (right < 0) else -quotient
+    elif suffix == 'F':
+        if family == 'ADD':
+            return left + right
+        elif family == 'SUB':
+            return left - right
+        elif family == 'MUL':
+            return left * right
+        elif right == 0.0:
+            return None
+        return left / right
+    return None
+
+def fold_compare(suffix, operator, left, right):
+    '''
+    Return the result (1 or 0) of a comparison of constants
+    '''
+    if suffix == 'F' and (math.isnan(left) or math.isnan(right)):
+        return 0
+    if suffix == 'B':
+        # Bytes are compared as signed 8 bit integers
+        left = (left + 128) % 256 - 128
+        right = (right + 128) % 256 - 128
+    if operator == '<':
+        result = left < right
+    elif operator == '<=':
+        result = left <= right
+    elif operator == '>':
+        result = left > right
+    elif operator == '>=':
+        result = left >= right
+    elif operator == '==':
+        result = left == right
+    else:
+        result = left != right
+    return int(result)
+
+def fold_logical(family, left, right):
+    if family in ('AND', 'ANDI'):
+        return left & right
+    elif family in ('OR', 'ORI'):
+        return left | right
+    return left ^ right
+
+def _family(op_code):
+    '''
+    Split an opcode into its family and type suffix (ADDI -> ADD, I)
+    '''
+    if op_code in _LOGICAL or op_code[-1] not in 'IFB':
+        return op_code, ''
+    return op_code[:-1], op_code[-1]
+
+def variable_scopes(func):
+    '''
+    Return (local_names, mixed_names) for a function: the names of its
+    parameters and local variables, and the names it also uses to refer
+    to a global (before their ALLOC)
+    '''
+    local_names = { name for name, _ in func.parameters }
+    mixed = set()
+    seen = set()
+    for inst in func.code:
+        op_code = inst[0]
+        if op_code.startswith('ALLOC'):
+            if inst[1] in seen and inst[1] not in local_names:
+                mixed.add(inst[1])
+            local_names.add(inst[1])
+        elif op_code.startswith(('LOAD', 'STORE')):
+            seen.add(inst[1] if op_code.startswith('LOAD') else inst[2])
+    return local_names, mixed
+
+class ConstantPropagation(object):
+    '''
+    Constant propagation for one function.  constants maps the names of
+    the constant globals to their values.
+    '''
+    def __init__(self, func, constants=None):
+        self.func = func
+        self.constants = constants or { }
+        self.local_names, self.mixed = variable_scopes(func)
+        self.cfg = ControlFlowGraph(func)
+
+        self.registers = { }            # Register -> constant, or None if
+                                        # it isn't one
+        self.out_states = { }           # Block -> { variable: constant }
+        self.edges = set()              # Edges that can be taken
+        self.executable = { self.cfg.entry }
+
+    def is_global(self, name):
+        return name not in self.local_names
+
+    def analyze(self):
+        '''
+        Run the analysis until nothing changes
+        '''
+        order = self.cfg.reverse_postorder()
+        changed = True
+        while changed:
+            changed = False
+            for block in order:
+                if block not in self.executable:
+                    continue
+                if block is self.cfg.entry:
+                    state = { }
+                else:
+                    state = self.meet([ self.out_states[pred] for pred in block.preds
+                                        if (pred, block) in self.edges
+                                        and pred in self.out_states ])
+                changed |= self.evaluate(block, state)
+                old_state = self.out_states.get(block)
+                if old_state is None or not self.same_state(old_state, state):
+                    self.out_states[block] = state
+                    changed = True
+
+    @staticmethod
+    def meet(states):
+        if not states:
+            return { }
+        result = dict(states[0])
+        for state in states[1:]:
+            for name, value in list(result.items()):
+                if name not in state or not _same(state[name], value):
+                    del result[name]
+        return result
+
+    @staticmethod
+    def same_state(a, b):
+        return a.keys() == b.keys() and all(_same(a[name], b[name]) for name in a)
+
+    def set_register(self, register, value):
+        '''
+        Set the value of a register (None if it isn't a constant), and tell
+        whether it changed.  A register that got two different values
+        isn't a constant.
+        '''
+        registers = self.registers
+        if register not in registers:
+            registers[register] = value
+            return True
+        old = registers[register]
+        if old is None:
+            return False
+        if value is None or not _same(old, value):
+            registers[register] = None
+            return True
+        return False
+
+    def evaluate(self, block, state):
+        '''
+        Evaluate the instructions of a block, updating state (the values of
+        the variables) in place.  Marks the edges that can be taken.  Returns
+        True if any register or edge changed.
+        '''
+        changed = False
+        registers = self.registers
+        for inst in block.code:
+            op_code = inst[0]
+            family, suffix = _family(op_code)
+            if family == 'MOV':
+                changed |= self.set_register(inst[2], inst[1])
+            elif family == 'VAR':
+                if inst[1] not in self.mixed:
+                    state[inst[1]] = 0.0 if suffix == 'F' else 0
+            elif family == 'ALLOC':
+                state.pop(inst[1], None)
+            elif family == 'LOAD':
+                name = inst[1]
+                value = None
+                if name not in self.mixed:
+                    value = state.get(name)
+                    if value is None and self.is_global(name):
+                        value = self.constants.get(name)
+                changed |= self.set_register(inst[2], value)
+            elif family == 'STORE':
+                name = inst[2]
+                if name not in self.mixed:
+                    value = registers.get(inst[1])
+                    if value is None:
+                        state.pop(name, None)
+                    else:
+                        state[name] = value
+            elif family in _ARITHMETIC:
+                left = registers.get(inst[1])
+                right = registers.get(inst[2])
+                value = None
+                if left is not None and right is not None:
+                    value = fold_arithmetic(family, suffix, left, right)
+                changed |= self.set_register(inst[3], value)
+            elif family == 'CMP':
+                left = registers.get(inst[2])
+                right = registers.get(inst[3])
+                value = None
+                if left is not None and right is not None:
+                    value = fold_compare(suffix, inst[1], left, right)
+                changed |= self.set_register(inst[4], value)
+            elif family in _LOGICAL:
+                left = registers.get(inst[1])
+                right = registers.get(inst[2])
+                value = None
+                if type(left) is int and type(right) is int:
+                    value = fold_logical(family, left, right)
+                changed |= self.set_register(inst[3], value)
+            elif family == 'PHI':
+                # Only the values coming through edges that can be taken
+                # count, and the ones not computed yet are left out
+                value = _UNSET
+                for register, label in phi_incoming(inst):
+                    if (self.cfg.block(label), block) not in self.edges or register not in registers:
+                        continue
+                    incoming = registers[register]
+                    if incoming is None or (value is not _UNSET and not _same(value, incoming)):
+                        value = None
+                        break
+                    value = incoming
+                if value is not _UNSET:
+                    changed |= self.set_register(inst[-1], value)
+            elif family == 'CALL':
+                changed |= self.set_register(inst[-1], None)
+                for name in list(state):
+                    if self.is_global(name):
+                        del state[name]
+            elif family in ('PRINT', 'LABEL', 'BRANCH', 'CBRANCH', 'RET'):
+                pass
+            elif len(inst) > 1 and isinstance(inst[-1], str) and inst[-1][:1] == 'R':
+                # Anything else that defines a register gives an unknown value
+                changed |= self.set_register(inst[-1], None)
+
+        for succ in self.successors(block):
+            if (block, succ) not in self.edges:
+                self.edges.add((block, succ))
+                self.executable.add(succ)
+                changed = True
+        return changed
+
+    def successors(self, block):
+        '''
+        Return the successors of a block that can be reached, given the
+        value of the condition of its CBRANCH
+        '''
+        terminator = block.terminator
+        if terminator and terminator[0] == 'CBRANCH':
+            test = self.registers.get(terminator[1])
+            if test is not None:
+                return [ self.cfg.block(terminator[2] if test else terminator[3]) ]
+        return block.succs
+
+    def rewrite(self):
+        '''
+        Rewrite the code of the function.  Returns the number of changed or
+        removed instructions.
+        '''
+        changes = 0
+        registers = self.registers
+        for block in self.cfg.blocks:
+            if block not in self.executable:
+                continue
+            code = block.code
+            phis_replaced = False
+            for n, inst in enumerate(code):
+                family, suffix = _family(inst[0])
+                if family == 'CBRANCH':
+                    test = registers.get(inst[1])
+                    if test is not None:
+                        code[n] = ('BRANCH', inst[2] if test else inst[3])
+                        changes += 1
+                elif family in _DEFINES and family not in ('MOV', 'CALL'):
+                    value = registers.get(inst[-1])
+                    if value is not None:
+                        if family == 'CMP' or family in _LOGICAL:
+                            suffix = 'I'
+                        code[n] = (f'MOV{suffix}', value, inst[-1])
+                        phis_replaced = phis_replaced or family == 'PHI'
+                        changes += 1
+            if phis_replaced:
+                # The MOVs replacing PHIs go after the remaining PHIs
+                block.code = ([ inst for inst in code if is_phi(inst) ] +
+                              [ inst for inst in code if not is_phi(inst) ])
+
+        # The folded branches changed the edges
+        self.cfg.update()
+        changes += self.cfg.remove_unreachable()
+        if changes:
+            self.func.code = self.cfg.linearize()
+        return changes
+
+def constant_globals(init_func, analysis, functions):
+    '''
+    Find the globals that hold the same constant during the whole program
+    (except for the start of __gone_init).  analysis is the constant
+    propagation of __gone_init.
+    '''
+    candidates = { }
+    for inst in analysis.cfg.entry.code:
+        if inst[0] == 'CALL':
+            break
+        if inst[0].startswith('STORE'):
+            value = analysis.registers.get(inst[1])
+            if value is not None and inst[2] not in candidates:
+                candidates[inst[2]] = (inst, value)
+            else:
+                candidates[inst[2]] = None
+
+    # Any other store disqualifies a global
+    for func in functions:
+        local_names, mixed = variable_scopes(func)
+        for inst in func.code:
+            if inst[0].startswith('STORE'):
+                name = inst[2]
+                if func is init_func:
+                    if name in candidates and (candidates[name] is None
+                                               or candidates[name][0] is not inst):
+                        candidates[name] = None
+                elif name not in local_names or name in mixed:
+                    candidates[name] = None
+    return { name: candidate[1] for name, candidate in candidates.items() if candidate }
+
+def propagate_constants(functions):
+    '''
+    Run constant propagation on a list of IR Functions (a whole program).
+    Returns the number of changed or removed instructions.
+    '''
+    constants = { }
+    init_func = next((func for func in functions if func.name == '__gone_init'), None)
+    if init_func is not None:
+        analysis = ConstantPropagation(init_func)
+        analysis.analyze()
+        constants = constant_globals(init_func, analysis, functions)
+
+    changes = 0
+    for func in functions:
+        analysis = ConstantPropagation(func, constants)
+        analysis.analyze()
+        changes += analysis.rewrite()
+    return changes
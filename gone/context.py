@@ -0,0 +1,137 @@
+'''
+Compilation context
+===================
+A CompilationContext holds everything that belongs to one compilation:
+the diagnostics reported, the compiler options and statistics such as
+the time spent in each phase.  Keeping this state out of module globals
+lets one process compile many programs, one after the other or at the
+same time in several threads, without one compilation seeing the errors
+of another.
+
+The context of the compilation in progress is kept in a context
+variable.  errors.error() and the other functions of errors.py act on
+the current context, so the lexer, the parsers and the checker report
+errors exactly as before.  The entry points of the compiler (parse(),
+check_program(), compile_ircode(), compile_llvm(), ...) take an optional
+context argument and make it current while they run:
+
+    context = CompilationContext(filename='foo.g')
+    llvm_code = compile_llvm(source, context=context)
+    if context.errors_reported():
+        for lineno, message, filename in context.diagnostics:
+            ...
+
+Without a context argument they use the current context.  Code that
+never creates one shares a default context, which behaves like the
+original module level error counter.
+
+Each thread starts with the default context, so threads that compile
+concurrently must pass their own contexts.
+'''
+
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+class CompilationContext(object):
+    '''
+    State of one compilation.
+
+    filename is used in the error messages that don't give one.  options
+    is a dictionary of compiler options (see get_option()).  If echo is
+    true, errors are printed to stream (by default, the sys.stderr of the
+    moment) as they are reported, like the compiler always did.
+    '''
+    def __init__(self, filename=None, options=None, echo=True, stream=None):
+        self.filename = filename
+        self.options = dict(options or { })
+        self.echo = echo
+        self.stream = stream
+        self.diagnostics = []           # [(lineno, message, filename)]
+        self.stats = { }                # Statistic name -> value
+        self.subscribers = []
+
+    def __repr__(self):
+        return f'CompilationContext(filename={self.filename!r}, errors={len(self.diagnostics)})'
+
+    def get_option(self, name, default=None):
+        return self.options.get(name, default)
+
+    # Diagnostics.  These are the implementation of the errors.py functions
+
+    def error(self, lineno, message, filename=None):
+        filename = filename or self.filename
+        self.diagnostics.append((lineno, message, filename))
+        if self.echo:
+            if not filename:
+                errmsg = "{}: {}".format(lineno, message)
+            else:
+                errmsg = "{}:{}: {}".format(filename, lineno, message)
+            print(errmsg, file=self.stream or sys.stderr)
+
+        for subscriber in self.subscribers:
+            subscriber(lineno, message, filename)
+
+    def errors_reported(self):
+        return len(self.diagnostics)
+
+    def clear_errors(self):
+        self.diagnostics = []
+
+    def subscribe(self, func):
+        self.subscribers.append(func)
+
+    def unsubscribe(self, func):
+        self.subscribers.remove(func)
+
+    # Statistics
+
+    def count(self, name, amount=1):
+        '''
+        Add amount to a counter statistic
+        '''
+        self.stats[name] = self.stats.get(name, 0) + amount
+
+    @contextmanager
+    def timer(self, name):
+        '''
+        Add the time spent in a with block to the statistic name (seconds)
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.count(name, time.perf_counter() - start)
+
+    @contextmanager
+    def activate(self):
+        '''
+        Make this the current context for the duration of a with block
+        '''
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+_default = CompilationContext()
+_current = ContextVar('gone_compilation_context', default=_default)
+
+def current_context():
+    '''
+    Return the context of the compilation in progress
+    '''
+    return _current.get()
+
+@contextmanager
+def use_context(context=None):
+    '''
+    Make context current for the duration of a with block, and return the
+    context in use.  If context is None, the current context is kept.
+    '''
+    if context is None:
+        yield _current.get()
+    else:
+        with context.activate():
+            yield context
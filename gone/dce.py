@@ -0,0 +1,276 @@
+'''
+Dead code elimination
+=====================
+An optimization pass that removes the code that has no effect on the
+output of a program:
+
+    - Blocks that can't be reached from the entry of their function
+      (such as the code that follows a return inside an if statement).
+    - Empty blocks: a block made only of a BRANCH is bypassed, its
+      predecessors branching directly to its target.  The empty false
+      blocks of if statements without an else go away this way.  A
+      block ending with a terminator, whose only predecessor branches
+      to it, is merged into that predecessor.
+    - Definitions of registers that are never read (instructions other
+      than CALL, which may have effects, whose target isn't used).
+    - Dead stores: stores to a local variable that no load can read
+      afterwards, found by a liveness analysis of the variables over the
+      control flow graph.  A global is only dead if no function of the
+      program ever loads it.
+    - Allocations of local variables that are no longer used at all.
+
+Removing an instruction can make the ones computing its operands dead,
+so the register and store removals are repeated until nothing changes.
+Like the code generators, the pass expects every block that is followed
+by a label to end with a BRANCH, CBRANCH or RET; the blocks it rewrites
+keep that property (see ControlFlowGraph.linearize).
+'''
+
+from .cfg import (ControlFlowGraph, defined_register, is_phi, make_phi, phi_incoming,
+                  retarget, used_registers)
+from .constprop import variable_scopes
+
+def live_variables(cfg, is_tracked):
+    '''
+    Return two dictionaries mapping every block of a control flow graph
+    to the set of the variables live at its start and at its end.  Only
+    the names for which is_tracked(name) is true are considered.  An
+    ALLOC kills a variable, like a STORE.
+    '''
+    gen = { }
+    kill = { }
+    for block in cfg.blocks:
+        block_gen = set()
+        block_kill = set()
+        for inst in reversed(block.code):
+            op_code = inst[0]
+            if op_code.startswith('LOAD'):
+                if is_tracked(inst[1]):
+                    block_gen.add(inst[1])
+                    block_kill.discard(inst[1])
+            elif op_code.startswith(('STORE', 'ALLOC')):
+                name = inst[2] if op_code.startswith('STORE') else inst[1]
+                if is_tracked(name):
+                    block_kill.add(name)
+                    block_gen.discard(name)
+        gen[block] = block_gen
+        kill[block] = block_kill
+
+    live_in = { block: set() for block in cfg.blocks }
+    live_out = { block: set() for block in cfg.blocks }
+    order = cfg.postorder()
+    changed = True
+    while changed:
+        changed = False
+        for block in order:
+            out = set()
+            for succ in block.succs:
+                out |= live_in[succ]
+            live_out[block] = out
+            new_in = gen[block] | (out - kill[block])
+            if new_in != live_in[block]:
+                live_in[block] = new_in
+                changed = True
+    return live_in, live_out
+
+class DeadCodeElimination(object):
+    '''
+    Dead code elimination for one function.  read_globals is the set of
+    the names loaded anywhere in the program.
+    '''
+    def __init__(self, func, read_globals):
+        self.func = func
+        self.read_globals = read_globals
+        self.local_names, self.mixed = variable_scopes(func)
+        self.cfg = ControlFlowGraph(func)
+
+    def is_local(self, name):
+        return name in self.local_names and name not in self.mixed
+
+    def run(self):
+        '''
+        Remove the dead code.  Returns the number of removed instructions.
+        '''
+        before = len(self.func.code)
+        changed = self.simplify_cfg()
+        while self.remove_dead_registers() | self.remove_dead_stores():
+            changed = True
+        changed |= self.remove_unused_allocs()
+        if changed:
+            self.func.code = self.cfg.linearize()
+        return before - len(self.func.code)
+
+    # Control flow
+
+    def simplify_cfg(self):
+        '''
+        Remove the unreachable and empty blocks, and merge the blocks with
+        a single predecessor into it.  Returns True if the graph changed.
+        '''
+        cfg = self.cfg
+        changed = cfg.remove_unreachable() > 0
+        progress = True
+        while progress:
+            progress = False
+            for block in cfg.blocks[1:]:
+                if self.bypass(block) or self.merge(block):
+                    cfg.update()
+                    progress = changed = True
+                    break
+        return changed
+
+    def bypass(self, block):
+        '''
+        Make the predecessors of a block made of a single BRANCH branch to
+        its target instead, and remove the block
+        '''
+        if len(block.code) != 1 or block.code[0][0] != 'BRANCH':
+            return False
+        target = block.code[0][1]
+        if target == block.label or any(pred.terminator is None for pred in block.preds):
+            return False
+        succ = self.cfg.block(target)
+        phis = [ n for n, inst in enumerate(succ.code) if is_phi(inst) ]
+        if phis:
+            # The PHIs of the target get the value of the block for each of
+            # its predecessors, which can't already branch to the target
+            if any(pred.label is None or pred in succ.preds for pred in block.preds):
+                return False
+            for n in phis:
+                inst = succ.code[n]
+                incoming = []
+                for register, label in phi_incoming(inst):
+                    if label == block.label:
+                        incoming.extend((register, pred.label) for pred in block.preds)
+                    else:
+                        incoming.append((register, label))
+                succ.code[n] = make_phi(inst[0], incoming, inst[-1])
+        for pred in block.preds:
+            pred.code[-1] = retarget(pred.terminator, block.label, target)
+        self.cfg.blocks.remove(block)
+        return True
+
+    def merge(self, block):
+        '''
+        Merge a block into its predecessor, if it is the only one and ends
+        with a BRANCH to it
+        '''
+        if len(block.preds) != 1:
+            return False
+        pred = block.preds[0]
+        terminator = pred.terminator
+        if pred is block or terminator is None or terminator != ('BRANCH', block.label):
+            return False
+        if block.terminator is None:
+            # A block that falls through has to stay where it is
+            return False
+        if any(is_phi(inst) for inst in block.code):
+            return False
+        # The PHIs of the successors that name the block now name the
+        # predecessor instead, which needs a label for it
+        phi_blocks = [ succ for succ in block.succs
+                       if any(label == block.label for inst in succ.code if is_phi(inst)
+                              for _, label in phi_incoming(inst)) ]
+        if phi_blocks and pred.label is None:
+            return False
+        for succ in phi_blocks:
+            for n, inst in enumerate(succ.code):
+                if is_phi(inst):
+                    incoming = [ (register, pred.label if label == block.label else label)
+                                 for register, label in phi_incoming(inst) ]
+                    succ.code[n] = make_phi(inst[0], incoming, inst[-1])
+        pred.code[-1:] = block.code
+        self.cfg.blocks.remove(block)
+        return True
+
+    # Registers
+
+    def remove_dead_registers(self):
+        '''
+        Remove the instructions (except calls) defining registers that are
+        never read.  Returns True if any was removed.
+        '''
+        uses = { }
+        for block in self.cfg.blocks:
+            for inst in block.code:
+                for register in used_registers(inst):
+                    uses[register] = uses.get(register, 0) + 1
+
+        removed = False
+        for block in self.cfg.blocks:
+            # Backwards, so that the operands of a removed instruction
+            # defined earlier in the block are removed too
+            code = block.code
+            for n in range(len(code) - 1, -1, -1):
+                inst = code[n]
+                target = defined_register(inst)
+                if target is None or inst[0] == 'CALL' or uses.get(target):
+                    continue
+                for register in used_registers(inst):
+                    uses[register] -= 1
+                del code[n]
+                removed = True
+        return removed
+
+    # Variables
+
+    def remove_dead_stores(self):
+        '''
+        Remove the stores to local variables that aren't live after them,
+        and to globals that are never loaded.  Returns True if any was
+        removed.
+        '''
+        _, live_out = live_variables(self.cfg, self.is_local)
+        removed = False
+        for block in self.cfg.blocks:
+            live = set(live_out[block])
+            code = block.code
+            for n in range(len(code) - 1, -1, -1):
+                op_code = code[n][0]
+                if op_code.startswith('LOAD'):
+                    live.add(code[n][1])
+                elif op_code.startswith('ALLOC'):
+                    live.discard(code[n][1])
+                elif op_code.startswith('STORE'):
+                    name = code[n][2]
+                    if self.is_local(name):
+                        if name not in live:
+                            del code[n]
+                            removed = True
+                        live.discard(name)
+                    elif name not in self.mixed and name not in self.read_globals:
+                        del code[n]
+                        removed = True
+        return removed
+
+    def remove_unused_allocs(self):
+        '''
+        Remove the ALLOC of the local variables that are neither loaded nor
+        stored.  Returns True if any was removed.
+        '''
+        used = set()
+        for block in self.cfg.blocks:
+            for inst in block.code:
+                if inst[0].startswith('LOAD'):
+                    used.add(inst[1])
+                elif inst[0].startswith('STORE'):
+                    used.add(inst[2])
+
+        removed = False
+        for block in self.cfg.blocks:
+            code = [ inst for inst in block.code
+                     if not (inst[0].startswith('ALLOC') and self.is_local(inst[1])
+                             and inst[1] not in used) ]
+            if len(code) != len(block.code):
+                block.code = code
+                removed = True
+        return removed
+
+def eliminate_dead_code(functions):
+    '''
+    Run dead code elimination on a list of IR Functions (a whole program).
+    Returns the number of removed instructions.
+    '''
+    read_globals = { inst[1] for func in functions for inst in func.code
+                     if inst[0].startswith('LOAD') }
+    return sum(DeadCodeElimination(func, read_globals).run() for func in functions)
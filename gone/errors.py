@@ -22,34 +22,45 @@ errors reported so far.  Different stages of the compiler might use
 this to decide whether or not to keep processing or not.
 
 Use clear_errors() to clear the total number of errors.
-'''
 
-import sys
+Other parts of the compiler can observe errors as they are reported by
+registering a subscriber function:
+
+       subscribe(func)       # func(lineno, message, filename) on each error
+       unsubscribe(func)
 
-_num_errors = 0
+All of these functions act on the current compilation context (see
+context.py), so each compilation has its own errors and subscribers.
+'''
+
+from .context import current_context
 
 def error(lineno, message, filename=None):
     '''
     Report a compiler error to all subscribers
     '''
-    global _num_errors
-    if not filename:
-        errmsg = "{}: {}".format(lineno, message)
-    else:
-        errmsg = "{}:{}: {}".format(filename,lineno,message)
+    current_context().error(lineno, message, filename)
 
-    print(errmsg, file=sys.stderr)
-    _num_errors += 1
+def subscribe(func):
+    '''
+    Call func(lineno, message, filename) for every error reported
+    '''
+    current_context().subscribe(func)
+
+def unsubscribe(func):
+    '''
+    Stop calling a function registered with subscribe()
+    '''
+    current_context().unsubscribe(func)
 
 def errors_reported():
     '''
     Return number of errors reported
     '''
-    return _num_errors
+    return current_context().errors_reported()
 
 def clear_errors():
     '''
     Clear the total number of errors reported.
     '''
-    global _num_errors
-    _num_errors = 0
+    current_context().clear_errors()
@@ -0,0 +1,290 @@
+'''
+Incremental front end
+=====================
+Editors and watch-based builds parse and check the same file over and
+over, with small edits in between.  IncrementalFrontend keeps the
+results of the previous run and only redoes the work for the parts of
+the program that changed.
+
+The source is split at top-level function boundaries into chunks: each
+'func' declaration is one chunk, and the global statements between two
+functions form another.  Splitting only looks at braces, comments,
+character literals and the 'func' keyword, so it is much cheaper than
+lexing the file.
+
+A chunk is reparsed only if its text changed.  A chunk is rechecked only
+if it was reparsed or if the declarations it can see changed.  To know
+that, each chunk records what it exported to the checker's symbol tables
+(global names and function signatures), and a running hash of those
+exports identifies the environment every chunk is checked in.  Editing
+the body of a function leaves its exports alone, so no other chunk is
+rechecked.
+
+Diagnostics of reused chunks are reported again, so every run prints the
+same errors as a full check.  As in a regular compile, a program with
+syntax errors is not checked.  Since every chunk is parsed on its own,
+the parser recovers from a syntax error at the next function boundary.
+Moving a chunk to other lines only shifts the line numbers of its nodes.
+The exception is a chunk whose check reported errors: checker messages
+may mention the line of another declaration, so such a chunk is
+rechecked whenever any code before it moves.
+
+Usage:
+
+    frontend = IncrementalFrontend()
+    ast = frontend.update(source)       # Same result as parse + check
+    ...
+    ast = frontend.update(new_source)   # Only changed functions redone
+'''
+
+import re
+
+from .errors import error, subscribe, unsubscribe
+from .tokenizer import GoneLexer
+from .parser import GoneParser
+from .checker import CheckProgramVisitor
+from .ast import flatten
+
+# Things that matter to find function boundaries.  Comments and character
+# literals use the lexer's own patterns, since they may contain braces.
+_split_re = re.compile('|'.join([
+    f'(?:{GoneLexer.BLOCK_COMMENT.pattern})',
+    f'(?:{GoneLexer.LINE_COMMENT.pattern})',
+    f'(?:{GoneLexer.CHAR})',
+    r'(?P<func>\bfunc\b)',
+    r'(?P<brace>[{}])',
+]), re.ASCII)
+
+def split_chunks(source):
+    '''
+    Split source at top-level function boundaries.  Returns a list of
+    (start, end, is_func) tuples with the source offsets of each chunk.
+    '''
+    chunks = []
+    start = 0               # Start of the current chunk
+    in_func = False
+    depth = 0
+    for m in _split_re.finditer(source):
+        kind = m.lastgroup
+        if kind == 'func':
+            if depth == 0:
+                if m.start() > start:
+                    chunks.append((start, m.start(), in_func))
+                start = m.start()
+                in_func = True
+        elif kind == 'brace':
+            if m.group() == '{':
+                depth += 1
+            elif depth > 0:
+                depth -= 1
+                if depth == 0 and in_func:
+                    chunks.append((start, m.end(), True))
+                    start = m.end()
+                    in_func = False
+
+    if start < len(source):
+        chunks.append((start, len(source), in_func))
+    return chunks
+
+def shift_lines(nodes, delta):
+    '''
+    Add delta to the line numbers of all the nodes in a tree
+    '''
+    for _, node in flatten(nodes):
+        lineno = getattr(node, 'lineno', None)
+        if isinstance(lineno, int):
+            node.lineno = lineno + delta
+
+class _Chunk(object):
+    '''
+    Cached results for one chunk of source
+    '''
+    def __init__(self, text, lineno, program, parse_errors):
+        self.text = text
+        self.lineno = lineno                # First line of the chunk
+        self.program = program              # List of statements
+        self.parse_errors = parse_errors    # [(lineno, message)]
+
+        # Results of the last check
+        self.check_env = None               # Environment it was checked in
+        self.check_lines = None             # Line layout it was checked in
+        self.check_errors = None            # [(lineno, message)]
+        self.symbols = None                 # Exported global symbols
+        self.functions = None               # Exported functions
+        self.exports = None                 # Hashable summary of the above
+
+    def move_to(self, lineno):
+        delta = lineno - self.lineno
+        if delta:
+            shift_lines(self.program, delta)
+            self.parse_errors = _shift_errors(self.parse_errors, delta)
+            if self.check_errors is not None:
+                self.check_errors = _shift_errors(self.check_errors, delta)
+            self.lineno = lineno
+
+def _shift_errors(errors, delta):
+    return [ (lineno + delta if isinstance(lineno, int) else lineno, message)
+             for lineno, message in errors ]
+
+def _type_name(node):
+    ty = getattr(node, 'type', None)
+    return ty.name if ty else None
+
+class IncrementalFrontend(object):
+    '''
+    Parse and check successive versions of a program, reusing the results
+    of unchanged top-level chunks.  frontend selects the parser, as in
+    parse().  After each update(), stats holds the number of chunks and how
+    many of them were parsed, reused and checked.
+    '''
+    def __init__(self, frontend='lalr'):
+        if frontend not in ('lalr', 'rd'):
+            raise ValueError(f'Unknown parser front end {frontend!r}')
+        self.frontend = frontend
+        self.chunks = { }           # Chunk text -> _Chunk
+        self.stats = { }
+
+    def _parse_chunk(self, text, lineno):
+        if self.frontend == 'rd':
+            from .rdparser import RDParser
+            from .scanner import scan
+            return RDParser().parse(scan(text, lineno))
+        else:
+            return GoneParser().parse(GoneLexer().tokenize(text, lineno=lineno))
+
+    def _record_errors(self, func, *args):
+        '''
+        Run func(*args) and return its result with the errors it reported
+        '''
+        errors = []
+        def record(lineno, message, filename):
+            errors.append((lineno, message))
+
+        subscribe(record)
+        try:
+            result = func(*args)
+        finally:
+            unsubscribe(record)
+        return result, errors
+
+    def update(self, source):
+        '''
+        Parse and check a new version of the program.  Returns the AST (the
+        list of top level statements).  Errors are reported as usual.
+        '''
+        stats = dict.fromkeys(['chunks', 'parsed', 'checked'], 0)
+        chunks = { }
+        used = []
+        lineno = 1
+        offset = 0
+        parse_failed = False
+
+        for start, end, is_func in split_chunks(source):
+            lineno += source.count('\n', offset, start)
+            offset = start
+            text = source[start:end]
+            stats['chunks'] += 1
+
+            chunk = self.chunks.get(text)
+            if chunk is None or text in chunks:
+                # New or changed text (or a duplicate of a chunk already used
+                # in this version, whose nodes can't be shared)
+                ast, errors = self._record_errors(self._parse_chunk, text, lineno)
+                chunk = _Chunk(text, lineno, ast or [], errors)
+                stats['parsed'] += 1
+            else:
+                chunk.move_to(lineno)
+                for err_lineno, message in chunk.parse_errors:
+                    error(err_lineno, message)
+            chunks[text] = chunk
+            used.append(chunk)
+            parse_failed = parse_failed or bool(chunk.parse_errors)
+
+        self.chunks = chunks
+        program = []
+        for chunk in used:
+            program.extend(chunk.program)
+
+        # Like a regular compile, a program with syntax errors isn't checked
+        if not parse_failed:
+            self._check(used, stats)
+
+        stats['reused'] = stats['chunks'] - stats['parsed']
+        self.stats = stats
+        return program
+
+    def _check(self, chunks, stats):
+        '''
+        Check the chunks in order, reusing the previous check of each chunk
+        if it was done in the same environment
+        '''
+        checker = CheckProgramVisitor()
+        env = ()
+        lines = ()
+        for chunk in chunks:
+            lines = hash((lines, chunk.lineno))
+            if (chunk.check_env != env or
+                (chunk.check_errors and chunk.check_lines != lines)):
+                self._check_chunk(checker, chunk)
+                chunk.check_env = env
+                chunk.check_lines = lines
+                stats['checked'] += 1
+            else:
+                for err_lineno, message in chunk.check_errors:
+                    error(err_lineno, message)
+                checker.symbols.update(chunk.symbols)
+                checker.functions.update(chunk.functions)
+            env = hash((env, chunk.exports))
+
+    def _check_chunk(self, checker, chunk):
+        '''
+        Check a chunk and save what it added to the checker symbol tables
+        '''
+        symbols = dict(checker.symbols)
+        functions = dict(checker.functions)
+        _, chunk.check_errors = self._record_errors(checker.visit, chunk.program)
+
+        chunk.symbols = { name: node for name, node in checker.symbols.items()
+                          if symbols.get(name) is not node }
+        chunk.functions = { name: node for name, node in checker.functions.items()
+                            if functions.get(name) is not node }
+        chunk.exports = (
+            tuple((name, type(node).__name__, _type_name(node))
+                  for name, node in chunk.symbols.items()),
+            tuple((name, tuple(_type_name(p) for p in func.params),
+                   _type_name(func.datatype))
+                  for name, func in chunk.functions.items()),
+        )
+
+def main():
+    '''
+    Main program.  Checks a file every time it changes, reporting how many
+    chunks were reused.
+    '''
+    import os
+    import sys
+    import time
+    from .errors import errors_reported, clear_errors
+
+    if len(sys.argv) != 2:
+        sys.stderr.write('Usage: python3 -m gone.incremental filename\n')
+        raise SystemExit(1)
+
+    frontend = IncrementalFrontend()
+    mtime = None
+    while True:
+        current = os.stat(sys.argv[1]).st_mtime
+        if current != mtime:
+            mtime = current
+            clear_errors()
+            start = time.perf_counter()
+            frontend.update(open(sys.argv[1]).read())
+            elapsed = time.perf_counter() - start
+            stats = frontend.stats
+            print(f'{errors_reported()} errors, {stats["chunks"]} chunks, '
+                  f'{stats["parsed"]} parsed, {stats["checked"]} checked '
+                  f'({elapsed * 1000:.1f} ms)', file=sys.stderr)
+        time.sleep(0.2)
+
+if __name__ == '__main__':
+    main()
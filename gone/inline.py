@@ -0,0 +1,348 @@
+'''
+Inlining
+========
+An optimization pass that replaces calls of small functions by a copy
+of their code.  A call
+
+    ('CALL', 'f', 'R4', 'R5', 'R6')
+
+becomes the code of f, where the parameters and local variables of f
+are variables of the caller with new names, and every register and
+label is renamed:
+
+    ('STOREI', 'R4', 'f.a.1')           ; The arguments
+    ('STOREI', 'R5', 'f.b.1')
+    ...                                 ; The code of f, with
+    ('STOREI', 'R31', 'f.result.1')     ; RET R31 replaced by
+    ('BRANCH', 'L12')                   ; a store and a branch
+    ...
+    ('LABEL', 'L12')                    ; The continuation
+    ('LOADI', 'f.result.1', 'R6')
+
+The code that followed the call now starts at the continuation label,
+so the PHIs (see mem2reg.py) of the successors of the block take their
+value from the continuation instead.  The labels of the PHIs of the
+callee are renamed like the others.
+
+The ALLOCs of the new variables are moved to the start of the caller,
+so that inlining a call in a loop doesn't allocate on every iteration.
+Each ALLOC of a local of f is replaced by a store of 0.  mem2reg.py then
+turns these variables into registers.
+
+The cost model looks at the size of the callee (its number of
+instructions, without the labels), the number of places it is called
+from, and the loop depth of the call:
+
+    - Functions of at most INLINE_ALWAYS_SIZE instructions are inlined
+      everywhere.
+    - Functions called from at most INLINE_CALL_SITES places are inlined
+      if their size is at most INLINE_SIZE, times 1 + the loop depth of
+      the call (calls in loops are the ones worth removing).
+    - No function grows past MAX_FUNCTION_SIZE instructions.
+
+Functions that are part of a recursive cycle (including the ones calling
+themselves) are never inlined.  The functions are processed callees
+first, so that a function is inlined with the calls it contains already
+inlined.
+'''
+
+from .cfg import ControlFlowGraph, OPERAND_KINDS, is_phi, make_phi, phi_incoming
+from .compactir import operand_kinds
+from .constprop import variable_scopes
+from .ircode import Function
+
+INLINE_ALWAYS_SIZE = 12
+INLINE_SIZE = 60
+INLINE_CALL_SITES = 2
+MAX_FUNCTION_SIZE = 1000
+
+# Zero of each type, for the locals allocated by the inlined code
+_ZEROS = { 'I': 0, 'F': 0.0, 'B': 0 }
+
+def function_size(func):
+    return sum(1 for inst in func.code if inst[0] != 'LABEL')
+
+def call_graph(functions):
+    '''
+    Return a dictionary mapping the name of every function to the list of
+    the names of the functions it calls (once each)
+    '''
+    graph = { func.name: [] for func in functions }
+    for func in functions:
+        callees = graph[func.name]
+        for inst in func.code:
+            if inst[0] == 'CALL' and inst[1] in graph and inst[1] not in callees:
+                callees.append(inst[1])
+    return graph
+
+def strongly_connected_components(graph):
+    '''
+    Return the strongly connected components of a graph (Tarjan's
+    algorithm), callees before callers
+    '''
+    index = { }
+    lowlink = { }
+    on_stack = set()
+    stack = []
+    components = []
+    for root in graph:
+        if root in index:
+            continue
+        work = [ (root, iter(graph[root])) ]
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, succs = work[-1]
+            for succ in succs:
+                if succ not in index:
+                    index[succ] = lowlink[succ] = len(index)
+                    stack.append(succ)
+                    on_stack.add(succ)
+                    work.append((succ, iter(graph[succ])))
+                    break
+                elif succ in on_stack:
+                    lowlink[node] = min(lowlink[node], index[succ])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
+
+def recursive_functions(graph, components):
+    '''
+    Return the names of the functions that are part of a recursive cycle
+    '''
+    recursive = set()
+    for component in components:
+        if len(component) > 1 or component[0] in graph[component[0]]:
+            recursive.update(component)
+    return recursive
+
+class Inliner(object):
+    '''
+    Inlining of the calls of a whole program
+    '''
+    def __init__(self, functions):
+        self.functions = { func.name: func for func in functions }
+        self.graph = call_graph(functions)
+        self.components = strongly_connected_components(self.graph)
+        self.recursive = recursive_functions(self.graph, self.components)
+        self.call_sites = { name: 0 for name in self.functions }
+        for func in functions:
+            for inst in func.code:
+                if inst[0] == 'CALL' and inst[1] in self.call_sites:
+                    self.call_sites[inst[1]] += 1
+        self.inlined = 0
+
+    def can_inline(self, callee):
+        '''
+        Tell whether a function can be inlined at all
+        '''
+        if callee.name in self.recursive or callee.return_type is None:
+            return False
+        local_names, mixed = variable_scopes(callee)
+        return not mixed
+
+    def should_inline(self, callee, depth, caller_size):
+        '''
+        The cost model: tell whether to inline a call of callee at the given
+        loop depth, in a caller of the given size
+        '''
+        size = function_size(callee)
+        if caller_size + size > MAX_FUNCTION_SIZE:
+            return False
+        if size <= INLINE_ALWAYS_SIZE:
+            return True
+        return (self.call_sites[callee.name] <= INLINE_CALL_SITES
+                and size <= INLINE_SIZE * (1 + depth))
+
+    def run(self):
+        '''
+        Inline the calls.  Returns the number of inlined calls.
+        '''
+        for component in self.components:
+            for name in component:
+                self.inline_calls(self.functions[name])
+        return self.inlined
+
+    def loop_depths(self, func):
+        '''
+        Return a list giving the loop depth of every instruction of a
+        function
+        '''
+        cfg = ControlFlowGraph(func)
+        block_depths = { }
+        for loop in cfg.loops():
+            for block in loop.blocks:
+                block_depths[block] = max(block_depths.get(block, 0), loop.depth)
+        depths = []
+        for block in cfg.blocks:
+            depth = block_depths.get(block, 0)
+            if block.label:
+                depths.append(depth)
+            depths.extend([ depth ] * len(block.code))
+        return depths
+
+    def inline_calls(self, caller):
+        '''
+        Inline the calls of caller that the cost model accepts
+        '''
+        if not any(inst[0] == 'CALL' for inst in caller.code):
+            return
+        depths = self.loop_depths(caller)
+        size = function_size(caller)
+        renamer = Renamer(caller)
+        code = []
+        allocs = []
+        label = None            # Label of the block of the caller being copied
+        split = { }             # Label of a split block -> label of its last part
+        for inst, depth in zip(caller.code, depths):
+            if inst[0] == 'LABEL':
+                label = inst[1]
+            callee = self.functions.get(inst[1]) if inst[0] == 'CALL' else None
+            if (callee is None or callee is caller or not self.can_inline(callee)
+                or not self.should_inline(callee, depth, size)):
+                code.append(inst)
+                continue
+            body, new_allocs = renamer.inline(inst, callee)
+            code.extend(body)
+            allocs.extend(new_allocs)
+            if label is not None:
+                split[label] = body[-2][1]
+            size += function_size(callee)
+            self.inlined += 1
+        if split:
+            # The successors of a split block are now entered from the
+            # continuation of its last inlined call
+            code = [ make_phi(inst[0], [ (register, split.get(label, label))
+                                         for register, label in phi_incoming(inst) ], inst[-1])
+                     if is_phi(inst) else inst for inst in code ]
+        if allocs:
+            caller.code = allocs + code
+
+class Renamer(object):
+    '''
+    Makes copies of the code of callees to inline in a caller, with
+    registers, labels and variables that the caller doesn't use
+    '''
+    def __init__(self, caller):
+        registers = [ 0 ]
+        labels = [ 0 ]
+        self.names = set()
+        for inst in caller.code:
+            kinds = operand_kinds(OPERAND_KINDS[inst[0]], len(inst) - 1)
+            for kind, operand in zip(kinds, inst[1:]):
+                if kind in 'rl' and operand[1:].isdigit():
+                    (registers if kind == 'r' else labels).append(int(operand[1:]))
+                elif kind == 'n':
+                    self.names.add(operand)
+        self.names.update(name for name, _ in caller.parameters)
+        self.last_register = max(registers)
+        self.last_label = max(labels)
+        self.count = 0
+
+    def new_register(self):
+        self.last_register += 1
+        return f'R{self.last_register}'
+
+    def new_label(self):
+        self.last_label += 1
+        return f'L{self.last_label}'
+
+    def new_name(self, callee, name):
+        while True:
+            new = f'{callee.name}.{name}.{self.count}'
+            if new not in self.names:
+                self.names.add(new)
+                return new
+            self.count += 1
+
+    def inline(self, call, callee):
+        '''
+        Return the code replacing a CALL of callee, and the ALLOCs to put
+        at the start of the caller
+        '''
+        self.count += 1
+        local_names, _ = variable_scopes(callee)
+        names = { name: self.new_name(callee, name) for name in sorted(local_names) }
+        registers = { }
+        labels = { }
+
+        def register(old):
+            new = registers.get(old)
+            if new is None:
+                new = registers[old] = self.new_register()
+            return new
+
+        def label(old):
+            new = labels.get(old)
+            if new is None:
+                new = labels[old] = self.new_label()
+            return new
+
+        # Without the code that can't be reached, which may follow a RET
+        copy = Function(callee.name, callee.parameters, callee.return_type)
+        copy.code = list(callee.code)
+        cfg = ControlFlowGraph(copy)
+        cfg.remove_unreachable()
+        callee_code = cfg.linearize()
+
+        result = self.new_name(callee, 'result')
+        continuation = self.new_label()
+        allocs = [ (f'ALLOC{callee.return_type}', result) ]
+        code = []
+        for (name, ptype), arg in zip(callee.parameters, call[2:-1]):
+            allocs.append((f'ALLOC{ptype}', names[name]))
+            code.append((f'STORE{ptype}', arg, names[name]))
+        if callee_code and callee_code[0][0] == 'LABEL':
+            code.append(('BRANCH', label(callee_code[0][1])))
+
+        for inst in callee_code:
+            op_code = inst[0]
+            if op_code == 'RET':
+                code.append((f'STORE{callee.return_type}', register(inst[1]), result))
+                code.append(('BRANCH', continuation))
+                continue
+            if op_code.startswith('ALLOC'):
+                allocs.append((op_code, names[inst[1]]))
+                suffix = op_code[-1]
+                zero = self.new_register()
+                code.append((f'MOV{suffix}', _ZEROS[suffix], zero))
+                code.append((f'STORE{suffix}', zero, names[inst[1]]))
+                continue
+            kinds = operand_kinds(OPERAND_KINDS[op_code], len(inst) - 1)
+            renamed = [ op_code ]
+            for kind, operand in zip(kinds, inst[1:]):
+                if kind == 'r':
+                    operand = register(operand)
+                elif kind == 'l':
+                    operand = label(operand)
+                elif kind == 'n' and op_code != 'CALL':
+                    operand = names.get(operand, operand)
+                renamed.append(operand)
+            code.append(tuple(renamed))
+
+        if not code or code[-1][0] not in ('BRANCH', 'CBRANCH'):
+            # The end of the function returns an undefined value
+            code.append(('BRANCH', continuation))
+        code.append(('LABEL', continuation))
+        code.append((f'LOAD{callee.return_type}', result, call[-1]))
+        return code, allocs
+
+def inline_functions(functions):
+    '''
+    Inline the calls of small functions in a list of IR Functions (a whole
+    program).  Returns the number of inlined calls.
+    '''
+    return Inliner(functions).run()
@@ -13,7 +13,23 @@ To run a program use::
 
 '''
 import sys
-        
+import operator
+
+from .ircode import Function
+
+# Comparison operators of the CMP instructions
+_COMPARISONS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+# Marks the end of a function (see run_RET)
+_RETURN = object()
+
 class Interpreter(object):
     '''
     Runs an interpreter on the SSA intermediate code generated for
@@ -34,6 +50,12 @@ class Interpreter(object):
              self.run_MOVI(2, 'R2')
              self.run_ADDI('R1','R2','R3')
              self.run_PRINTI('R3')
+
+    Branches jump to the instruction after their LABEL.  Each call of a
+    function gets its own registers and local variables.  The PHI
+    instructions at the start of a block (see mem2reg.py) are run
+    together, since they all pick their value from the block that was
+    executed before.
     '''
     def __init__(self):
         # Variable storage
@@ -42,10 +64,86 @@ class Interpreter(object):
         # Registers
         self.registers = { }
 
+        # Local variables and parameters of the running function
+        self.locals = { }
+
+        # Functions of the program, by name
+        self.functions = { }
+
+        # Labels of the running block and of the one executed before it
+        self.label = None
+        self.previous_label = None
+
+        # Label to jump to after the current instruction, or _RETURN
+        self.jump = None
+        self.return_value = 0
+
+        # Code prepared for running (see prepare), by function name
+        self.prepared = { }
+
     def execute(self, code):
-        for inst, *args in code:
+        '''
+        Run a program (the list of Functions made by GenerateCode) or a list
+        of instructions
+        '''
+        if code and isinstance(code[0], Function):
+            self.functions = { func.name: func for func in code }
+            for name in ('__gone_init', '__gone_main'):
+                if name in self.functions:
+                    self.call(self.functions[name], [])
+        else:
+            self.run_code(*self.prepare(code))
+
+    @staticmethod
+    def prepare(code):
+        '''
+        Return the code with the PHIs of each block grouped into a single
+        ('PHI', phis) instruction, and the positions of the labels
+        '''
+        prepared = []
+        for inst in code:
+            if inst[0].startswith('PHI'):
+                if prepared and prepared[-1][0] == 'PHI':
+                    prepared[-1][1].append(inst)
+                else:
+                    prepared.append(('PHI', [ inst ]))
+            else:
+                prepared.append(inst)
+        labels = { inst[1]: n for n, inst in enumerate(prepared) if inst[0] == 'LABEL' }
+        return prepared, labels
+
+    def run_code(self, code, labels):
+        pc = 0
+        end = len(code)
+        while pc < end:
+            inst, *args = code[pc]
+            pc += 1
             getattr(self, f'run_{inst}')(*args)
-        
+            if self.jump is not None:
+                if self.jump is _RETURN:
+                    break
+                pc = labels[self.jump]
+                self.jump = None
+        self.jump = None
+
+    def call(self, func, args):
+        '''
+        Call a Function with a list of arguments and return its result
+        '''
+        prepared = self.prepared.get(func.name)
+        if prepared is None:
+            prepared = self.prepared[func.name] = self.prepare(func.code)
+        saved = (self.registers, self.locals, self.label, self.previous_label)
+        self.registers = { }
+        self.locals = { name: value for (name, _), value in zip(func.parameters, args) }
+        self.label = self.previous_label = None
+        self.return_value = 0
+        try:
+            self.run_code(*prepared)
+            return self.return_value
+        finally:
+            self.registers, self.locals, self.label, self.previous_label = saved
+
     # Interpreter opcodes
     def run_MOVI(self, value, target):
         self.registers[target] = value
@@ -65,11 +163,34 @@ class Interpreter(object):
     run_MULF = run_MULI
 
     def run_DIVI(self, left, right, target):
-        self.registers[target] = self.registers[left] // self.registers[right]
+        # Integer division truncates towards zero, like LLVM's sdiv
+        left, right = self.registers[left], self.registers[right]
+        quotient = abs(left) // abs(right)
+        self.registers[target] = quotient if (left < 0) == (right < 0) else -quotient
 
     def run_DIVF(self, left, right, target):
         self.registers[target] = self.registers[left] / self.registers[right]
 
+    def run_CMPI(self, op, left, right, target):
+        self.registers[target] = int(_COMPARISONS[op](self.registers[left], self.registers[right]))
+    run_CMPF = run_CMPI
+    run_CMPB = run_CMPI
+
+    def run_AND(self, left, right, target):
+        self.registers[target] = self.registers[left] & self.registers[right]
+
+    def run_OR(self, left, right, target):
+        self.registers[target] = self.registers[left] | self.registers[right]
+
+    def run_XOR(self, left, right, target):
+        self.registers[target] = self.registers[left] ^ self.registers[right]
+
+    def run_SHLI(self, left, right, target):
+        self.registers[target] = self.registers[left] << self.registers[right]
+
+    def run_SHRI(self, left, right, target):
+        self.registers[target] = self.registers[left] >> self.registers[right]
+
     def run_PRINTI(self, value):
         print(self.registers[value])
     run_PRINTF = run_PRINTI
@@ -86,16 +207,60 @@ class Interpreter(object):
 
     run_VARB = run_VARI
 
+    def run_ALLOCI(self, name):
+        self.locals[name] = 0
+
+    def run_ALLOCF(self, name):
+        self.locals[name] = 0.0
+
+    run_ALLOCB = run_ALLOCI
+
     def run_LOADI(self, name, target):
-        self.registers[target] = self.vars[name]
+        if name in self.locals:
+            self.registers[target] = self.locals[name]
+        else:
+            self.registers[target] = self.vars[name]
     run_LOADF = run_LOADI
     run_LOADB = run_LOADI
 
     def run_STOREI(self, target, name):
-        self.vars[name] = self.registers[target]
+        if name in self.locals:
+            self.locals[name] = self.registers[target]
+        else:
+            self.vars[name] = self.registers[target]
     run_STOREF = run_STOREI
     run_STOREB = run_STOREI
 
+    # Control flow
+    def run_LABEL(self, label):
+        self.previous_label = self.label
+        self.label = label
+
+    def run_BRANCH(self, label):
+        self.jump = label
+
+    def run_CBRANCH(self, test, true_label, false_label):
+        self.jump = true_label if self.registers[test] else false_label
+
+    def run_PHI(self, phis):
+        # Every PHI reads its value before any is set
+        values = []
+        for inst in phis:
+            for register, label in zip(inst[1:-1:2], inst[2:-1:2]):
+                if label == self.previous_label:
+                    values.append((inst[-1], self.registers[register]))
+                    break
+        for target, value in values:
+            self.registers[target] = value
+
+    def run_CALL(self, name, *registers):
+        args = [ self.registers[register] for register in registers[:-1] ]
+        self.registers[registers[-1]] = self.call(self.functions[name], args)
+
+    def run_RET(self, value):
+        self.return_value = self.registers[value]
+        self.jump = _RETURN
+
 # ----------------------------------------------------------------------
 #                       DO NOT MODIFY ANYTHING BELOW       
 # ----------------------------------------------------------------------
@@ -62,6 +62,8 @@ Here is an instruction set specification for our IRCode:
     OR     r1, r2, target      :  target = r1 | r2
     XOR    r1, r2, target      :  target = r1 ^ r2
     ITOF   r1, target          ;  target = float(r1)
+    SHLI   r1, r2, target      ;  target = r1 << r2
+    SHRI   r1, r2, target      ;  target = r1 >> r2 (arithmetic)
 
     MOVF   value, target       ;  Load a literal float
     VARF   name                ;  Declare a float variable
@@ -121,6 +123,8 @@ sample output. Work through each file to complete the project.
 
 from collections import ChainMap
 from . import ast
+from .typesys import TYPES
+from .context import current_context, use_context
 
 IR_TYPE_MAPPING = {
     'int': 'I',
@@ -147,16 +151,28 @@ OP_CODES = ChainMap(
         'cbranch': 'CBRANCH', # Conditional branch
         'branch': 'BRANCH', # Unconditional branch,
         'call': 'CALL',
-        'ret': 'RET'
+        'ret': 'RET',
+        'phi': 'PHI'
     },
     dict.fromkeys(['<', '>', '<=', '>=', '==', '!='], "CMP")
 )
 
-def get_op_code(operation, type_name=None):
-    op_code = OP_CODES[operation]
-    suffix = "" if not type_name else IR_TYPE_MAPPING[type_name]
+# Opcode of every operation for every type (or None, for untyped
+# operations such as labels), keyed by the type objects of typesys so
+# that the checked types of the nodes can be used directly.
+OP_CODE_TABLE = {
+    (operation, ty): f"{op_code}{IR_TYPE_MAPPING[ty.name] if ty else ''}"
+    for operation, op_code in OP_CODES.items()
+    for ty in TYPES + (None,)
+}
+
+_OP_CODES_BY_NAME = {
+    (operation, ty.name if ty else None): op_code
+    for (operation, ty), op_code in OP_CODE_TABLE.items()
+}
 
-    return f"{op_code}{suffix}"
+def get_op_code(operation, type_name=None):
+    return _OP_CODES_BY_NAME[operation, type_name or None]
 
 
 class Function():
@@ -183,8 +199,11 @@ class Function():
 class GenerateCode(ast.NodeVisitor):
     '''
     Node visitor class that creates 3-address encoded instruction sequences.
+    context is the compilation context (by default, the current one).
     '''
-    def __init__(self):
+    def __init__(self, context=None):
+        self.context = context if context is not None else current_context()
+
         # counter for registers
         self.register_count = 0
 
@@ -252,11 +271,15 @@ class GenerateCode(ast.NodeVisitor):
         node.register = target
 
     def visit_BinOp(self, node):
-        self.visit(node.left)
-        self.visit(node.right)
+        if node.op in ('&&', '||'):
+            yield from self.short_circuit(node)
+            return
+
+        yield node.left
+        yield node.right
         operator = node.op
 
-        op_code = get_op_code(operator, node.left.type.name)
+        op_code = OP_CODE_TABLE[operator, node.left.type]
 
         target = self.new_register()
         if op_code.startswith('CMP'):
@@ -267,13 +290,63 @@ class GenerateCode(ast.NodeVisitor):
         self.code.append(inst)
         node.register = target
 
+    def short_circuit(self, node):
+        '''
+        Generate a && b and a || b so that b is only evaluated when a
+        doesn't decide the result:
+
+                <a>                         (into Ra)
+                CBRANCH Ra, right, skip     (skip, right for ||)
+            right:
+                <b>                         (into Rb)
+                BRANCH right_end
+            right_end:
+                BRANCH merge
+            skip:
+                BRANCH merge
+            merge:
+                PHI Ra, skip, Rb, right_end, target
+
+        When b is skipped, the result is Ra.  b may be made of several
+        blocks, so right_end gives the PHI a label for the end of b.
+        '''
+        yield node.left
+
+        right_label = self.new_label()
+        right_end_label = self.new_label()
+        skip_label = self.new_label()
+        merge_label = self.new_label()
+        lbl_op_code = get_op_code('label')
+        branch_op_code = get_op_code('branch')
+
+        if node.op == '&&':
+            labels = (right_label, skip_label)
+        else:
+            labels = (skip_label, right_label)
+        self.code.append((get_op_code('cbranch'), node.left.register) + labels)
+
+        self.code.append((lbl_op_code, right_label))
+        yield node.right
+        self.code.append((branch_op_code, right_end_label))
+        self.code.append((lbl_op_code, right_end_label))
+        self.code.append((branch_op_code, merge_label))
+
+        self.code.append((lbl_op_code, skip_label))
+        self.code.append((branch_op_code, merge_label))
+
+        self.code.append((lbl_op_code, merge_label))
+        target = self.new_register()
+        self.code.append((OP_CODE_TABLE['phi', node.type], node.left.register, skip_label,
+                          node.right.register, right_end_label, target))
+        node.register = target
+
     def visit_UnaryOp(self, node):
-        self.visit(node.right)
+        yield node.right
         operator = node.op
 
         if operator == "-":
-            sub_op_code = get_op_code(operator, node.type.name)
-            mov_op_code = get_op_code('mov', node.type.name)
+            sub_op_code = OP_CODE_TABLE[operator, node.type]
+            mov_op_code = OP_CODE_TABLE['mov', node.type]
 
             # To account for the fact that the machine code does not support
             # unary operations, we must load a 0 into a new register first
@@ -287,7 +360,7 @@ class GenerateCode(ast.NodeVisitor):
             node.register = target
         elif operator == "!":
             # This is the boolean NOT operator
-            mov_op_code = get_op_code('mov', node.type.name)
+            mov_op_code = OP_CODE_TABLE['mov', node.type]
             one_target = self.new_register()
             one_inst = (mov_op_code, 1, one_target)
             self.code.append(one_inst)
@@ -303,54 +376,54 @@ class GenerateCode(ast.NodeVisitor):
     # CHALLENGE:  Figure out some more sane way to refactor the above code
 
     def visit_PrintStatement(self, node):
-        self.visit(node.value)
-        op_code = get_op_code('print', node.value.type.name)
+        yield node.value
+        op_code = OP_CODE_TABLE['print', node.value.type]
         inst = (op_code, node.value.register)
         self.code.append(inst)
 
     def visit_ReadLocation(self, node):
-        op_code = get_op_code('load', node.location.type.name)
+        op_code = OP_CODE_TABLE['load', node.location.type]
         register = self.new_register()
         inst = (op_code, node.location.name, register)
         self.code.append(inst)
         node.register = register
 
     def visit_WriteLocation(self, node):
-        self.visit(node.value)
-        op_code = get_op_code('store', node.location.type.name)
+        yield node.value
+        op_code = OP_CODE_TABLE['store', node.location.type]
         inst = (op_code, node.value.register, node.location.name)
         self.code.append(inst)
 
     def visit_ConstDeclaration(self, node):
-        self.visit(node.value)
+        yield node.value
 
         # First we must declare the variable
-        op_code = get_op_code('var', node.type.name)
+        op_code = OP_CODE_TABLE['var', node.type]
         inst = (op_code, node.name)
         self.code.append(inst)
 
-        op_code = get_op_code('store', node.type.name)
+        op_code = OP_CODE_TABLE['store', node.type]
         inst = (op_code, node.value.register, node.name)
         self.code.append(inst)
 
     def visit_VarDeclaration(self, node):
-        self.visit(node.datatype)
+        yield node.datatype
 
         # The variable declaration depends on the scope
-        op_code = get_op_code('var' if self.global_scope else 'alloc', node.type.name)
+        op_code = OP_CODE_TABLE['var' if self.global_scope else 'alloc', node.type]
         def_inst = (op_code, node.name)
 
         if node.value:
-            self.visit(node.value)
+            yield node.value
             self.code.append(def_inst)
-            op_code = get_op_code('store', node.type.name)
+            op_code = OP_CODE_TABLE['store', node.type]
             inst = (op_code, node.value.register, node.name)
             self.code.append(inst)
         else:
             self.code.append(def_inst)
 
     def visit_IfStatement(self, node):
-        self.visit(node.condition)
+        yield node.condition
 
         # Generate labels for both branches
         f_label = self.new_label()
@@ -364,14 +437,14 @@ class GenerateCode(ast.NodeVisitor):
 
         # Now, the code for the true branch
         self.code.append((lbl_op_code, t_label))
-        self.visit(node.true_block)
+        yield node.true_block
         # And we must go to the merge label
         branch_op_code = get_op_code('branch')
         self.code.append((branch_op_code, merge_label))
 
         # Generate label for false block
         self.code.append((lbl_op_code, f_label))
-        self.visit(node.false_block)
+        yield node.false_block
         self.code.append((branch_op_code, merge_label))
 
         # Now we insert the merge label
@@ -391,13 +464,13 @@ class GenerateCode(ast.NodeVisitor):
         self.code.append((branch_op_code, top_label))
         # Now begins the block with the CBRANCH
         self.code.append((lbl_op_code, top_label))
-        self.visit(node.condition) # Generate the CMP instruction
+        yield node.condition # Generate the CMP instruction
         cbranch_op_code = get_op_code('cbranch')
         self.code.append((cbranch_op_code, node.condition.register, start_label, merge_label))
 
         # Now, the code for the true branch
         self.code.append((lbl_op_code, start_label))
-        self.visit(node.body)
+        yield node.body
         # And we must go to the merge label
 
         self.code.append((branch_op_code, top_label))
@@ -422,14 +495,14 @@ class GenerateCode(ast.NodeVisitor):
 
         # Now, generate the new function code
         self.global_scope = False # Turn off global scope
-        self.visit(node.body)
+        yield node.body
         self.global_scope = True # Turn back on global scope
 
         # And, finally, switch back to the original function we were at
         self.code = old_code
 
     def visit_FuncCall(self, node):
-        self.visit(node.arguments)
+        yield node.arguments
         target = self.new_register()
         op_code = get_op_code('call')
         registers = [arg.register for arg in node.arguments]
@@ -437,7 +510,7 @@ class GenerateCode(ast.NodeVisitor):
         node.register = target
 
     def visit_ReturnStatement(self, node):
-        self.visit(node.value)
+        yield node.value
         op_code = get_op_code('ret')
         self.code.append((op_code, node.value.register))
         node.register = node.value.register
@@ -448,24 +521,43 @@ class GenerateCode(ast.NodeVisitor):
 # Note: Some changes will be required in later projects.
 # ----------------------------------------------------------------------
 
-def compile_ircode(source):
+def compile_ircode(source, context=None):
     '''
-    Generate intermediate code from source.
+    Generate intermediate code from source.  The compilation runs in
+    context (by default, the current context).  If the context has an
+    'optimize' option, the code is optimized (see optimize.py).  If it
+    has a 'cache' option, the code is loaded from the cache when it's
+    there.
     '''
     from .parser import parse
     from .checker import check_program
-    from .errors import errors_reported
-
-    ast = parse(source)
-    check_program(ast)
-
-    # If no errors occurred, generate code
-    if not errors_reported():
-        gen = GenerateCode()
-        gen.visit(ast)
-        return gen.functions
-    else:
-        return []
+
+    with use_context(context) as context:
+        cache = context.get_option('cache')
+        if cache is not None:
+            key = cache.key(source, context.options)
+            functions = cache.load_object(key, 'ir', context)
+            if functions is not None:
+                return functions
+
+        ast = parse(source)
+        check_program(ast)
+
+        # If no errors occurred, generate code
+        if not context.errors_reported():
+            with context.timer('ircode'):
+                gen = GenerateCode(context)
+                gen.visit(ast)
+            context.count('ir_instructions', sum(len(func.code) for func in gen.functions))
+            passes = context.get_option('optimize')
+            if passes:
+                from .optimize import optimize
+                optimize(gen.functions, passes, context)
+            if cache is not None:
+                cache.store_object(key, 'ir', gen.functions, context)
+            return gen.functions
+        else:
+            return []
 
 def main():
     import sys
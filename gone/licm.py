@@ -0,0 +1,144 @@
+'''
+Loop-invariant code motion
+==========================
+An optimization pass that moves the instructions computing the same
+value on every iteration of a loop out of it.  In
+
+    while y >= ymin {
+        x = xmin;
+        while x < xmax {
+            ...
+            x = x + dx;
+        }
+        y = y - dy;
+    }
+
+the loads of xmin and xmax (globals that the loops don't store to), and
+every computation on them or on constants, are only done once.
+
+The loops are the natural loops of the control flow graph (see
+ControlFlowGraph.loops).  An instruction of a loop is invariant if its
+registers are all defined outside the loop or by invariant instructions,
+and:
+
+    - It is a pure computation (a MOV of a constant, arithmetic,
+      comparisons, logical operations and conversions).  Divisions are
+      left in place: the loop may not run at all, and a division by
+      zero would then happen where the program had none.
+    - Or it is a LOAD of a variable that no instruction of the loop
+      stores to or allocates.  A global must also not be changed by a
+      call, so globals are only loaded once if the loop calls nothing.
+
+The invariant instructions go, in order, at the end of the preheader of
+the loop: the block that comes just before its header, and goes nowhere
+else.  If the predecessors of the header outside the loop don't include
+such a block, an empty one is added between them and the header (with
+PHIs that merge their incoming values, if there are several).  Loops are
+processed innermost first, so that an instruction can move out of
+several loops.
+
+Moving an instruction is only safe if its register is defined once, so
+the pass leaves the functions where this doesn't hold unchanged (see
+valnum.py).  Like constprop.py, names used for both a global and a local
+of a function are left alone.
+'''
+
+from .cfg import (ControlFlowGraph, defined_register, is_phi, single_definitions,
+                  used_registers)
+from .constprop import variable_scopes
+
+# Opcodes that define a register but must stay where they are
+_NOT_MOVABLE = { 'CALL', 'DIVI', 'DIVF' }
+
+class LoopInvariantCodeMotion(object):
+    '''
+    Loop-invariant code motion for one function
+    '''
+    def __init__(self, func):
+        self.func = func
+        self.local_names, self.mixed = variable_scopes(func)
+        self.cfg = ControlFlowGraph(func)
+        self.moved = 0
+
+    def is_global(self, name):
+        return name not in self.local_names
+
+    def run(self):
+        '''
+        Move the invariant code out of the loops.  Returns the number of
+        moved instructions.
+        '''
+        if not single_definitions(self.func.code):
+            return 0
+        cfg = self.cfg
+        cfg.remove_unreachable()
+        # Innermost first
+        for loop in reversed(cfg.loops()):
+            invariant = self.invariant_code(loop)
+            if not invariant:
+                continue
+            preheader = cfg.preheader(loop)
+            if preheader is None:
+                continue
+            for block in loop.blocks:
+                block.code = [ inst for inst in block.code if id(inst) not in invariant ]
+            position = len(preheader.code) - (preheader.terminator is not None)
+            preheader.code[position:position] = list(invariant.values())
+            self.moved += len(invariant)
+        if self.moved:
+            self.func.code = cfg.linearize()
+        return self.moved
+
+    def invariant_code(self, loop):
+        '''
+        Return the invariant instructions of a loop, in the order they can
+        be executed in, as a dictionary { id(instruction): instruction }
+        '''
+        blocks = [ block for block in self.cfg.blocks if block in loop.blocks ]
+        defined = set()
+        stored = set()
+        calls = False
+        for block in blocks:
+            for inst in block.code:
+                op_code = inst[0]
+                target = defined_register(inst)
+                if target is not None:
+                    defined.add(target)
+                if op_code.startswith('STORE'):
+                    stored.add(inst[2])
+                elif op_code.startswith('ALLOC'):
+                    stored.add(inst[1])
+                elif op_code == 'CALL':
+                    calls = True
+
+        def is_movable(inst):
+            op_code = inst[0]
+            if op_code.startswith('LOAD'):
+                name = inst[1]
+                return (name not in stored and name not in self.mixed
+                        and not (calls and self.is_global(name)))
+            return (defined_register(inst) is not None and not is_phi(inst)
+                    and not op_code.startswith('ALLOC') and op_code not in _NOT_MOVABLE)
+
+        # Repeated until nothing changes: an instruction may use the
+        # register of an invariant one that comes later in the code
+        invariant = { }
+        progress = True
+        while progress:
+            progress = False
+            for block in blocks:
+                for inst in block.code:
+                    if id(inst) in invariant or not is_movable(inst):
+                        continue
+                    if all(register not in defined for register in used_registers(inst)):
+                        invariant[id(inst)] = inst
+                        defined.discard(inst[-1])
+                        progress = True
+        return invariant
+
+def move_invariant_code(functions):
+    '''
+    Run loop-invariant code motion on a list of IR Functions.  Returns the
+    number of moved instructions.
+    '''
+    return sum(LoopInvariantCodeMotion(func).run() for func in functions)
@@ -16,6 +16,9 @@ Further instructions are contained in the comments below.
 from collections import ChainMap
 from functools import partialmethod
 
+from .context import current_context, use_context
+from .tailcall import tail_calls
+
 # LLVM imports. Don't change this.
 
 from llvmlite.ir import (
@@ -71,7 +74,10 @@ LLVM_TYPE_MAPPING = {
 #    storage.
 
 class GenerateLLVM(object):
-    def __init__(self):
+    def __init__(self, context=None):
+        # Compilation context (by default, the current one)
+        self.context = context if context is not None else current_context()
+
         # Perform the basic LLVM initialization.  You need the following parts:
         #
         #    1.  A top-level Module object
@@ -144,10 +150,28 @@ class GenerateLLVM(object):
         # the intermediate code.
         self.temps = { }
 
-        # Setup the function parameters
+        # Labels are local to the function
+        self.blocks = { }
+
+        # PHI instructions and their incoming values, which are only all
+        # known at the end of the function
+        self.phis = [ ]
+
+        # Registers holding the result of a tail call (see tailcall.py),
+        # which is returned directly
+        self.tail_results = { ir_function.code[n][-1] for n in tail_calls(ir_function.code) }
+
+        # Setup the function parameters.  The parameters that the code
+        # never stores to (after mem2reg.py, all of them) are used
+        # directly.  The others are copied to the stack, like locals.
+        stored = { args[-1] for opcode, *args in ir_function.code if opcode.startswith('STORE') }
+        self.arguments = { }
         for n, (pname, ptype) in enumerate(ir_function.parameters):
-            self.vars[pname] = self.builder.alloca(LLVM_TYPE_MAPPING[ptype], name=pname)
-            self.builder.store(self.function.args[n], self.vars[pname])
+            if pname in stored:
+                self.vars[pname] = self.builder.alloca(LLVM_TYPE_MAPPING[ptype], name=pname)
+                self.builder.store(self.function.args[n], self.vars[pname])
+            else:
+                self.arguments[pname] = self.function.args[n]
 
         # Allocate the return value and return_block
         if ir_function.return_type:
@@ -161,6 +185,10 @@ class GenerateLLVM(object):
             else:
                 print('Warning: No emit_'+opcode+'() method')
 
+        for phi, incoming in self.phis:
+            for register, label in incoming:
+                phi.add_incoming(self.temps[register], self.get_block(label))
+
         if not self.block.is_terminated:
             self.builder.branch(self.return_block)
 
@@ -212,7 +240,10 @@ class GenerateLLVM(object):
     # value from a global variable and store in a temporary. Store
     # goes in the opposite direction.
     def emit_LOADI(self, name, target):
-        self.temps[target] = self.builder.load(self.vars[name], name=target)
+        if name in self.arguments:
+            self.temps[target] = self.arguments[name]
+        else:
+            self.temps[target] = self.builder.load(self.vars[name], name=target)
 
     emit_LOADF = emit_LOADI
     emit_LOADB = emit_LOADI
@@ -282,7 +313,17 @@ class GenerateLLVM(object):
     def emit_XOR(self, left, right, target):
         self.temps[target] = self.builder.xor(self.temps[left], self.temps[right], target)
 
+    # Shifts (see strength.py)
+    def emit_SHLI(self, left, right, target):
+        self.temps[target] = self.builder.shl(self.temps[left], self.temps[right], target)
+
+    def emit_SHRI(self, left, right, target):
+        self.temps[target] = self.builder.ashr(self.temps[left], self.temps[right], target)
+
     def emit_LABEL(self, lbl_name):
+        # A block that isn't terminated falls through into the label
+        if not self.block.is_terminated:
+            self.builder.branch(self.get_block(lbl_name))
         self.block = self.get_block(lbl_name)
         self.builder.position_at_end(self.block)
 
@@ -293,39 +334,82 @@ class GenerateLLVM(object):
     def emit_CBRANCH(self, test_target, true_label, false_label):
         true_block = self.get_block(true_label)
         false_block = self.get_block(false_label)
+        if true_block is false_block:
+            self.builder.branch(true_block)
+            return
         testvar = self.temps[test_target]
         self.builder.cbranch(self.builder.trunc(testvar, IntType(1)), true_block, false_block)
 
     def emit_RET(self, register):
+        if register in self.tail_results:
+            self.builder.ret(self.temps[register])
+            return
         self.builder.store(self.temps[register], self.vars['return'])
         self.builder.branch(self.return_block)
 
+    # Values of SSA variables (see mem2reg.py).  The operands are pairs of
+    # a register and the label of the block it comes from.  The registers
+    # of the back edges of loops aren't defined yet, so the incoming
+    # values are added at the end of generate_code().
+    def emit_PHI(self, *operands, phi_type):
+        target = operands[-1]
+        phi = self.builder.phi(phi_type, name=target)
+        self.phis.append((phi, list(zip(operands[:-1:2], operands[1:-1:2]))))
+        self.temps[target] = phi
+
+    emit_PHII = partialmethod(emit_PHI, phi_type=int_type)
+    emit_PHIF = partialmethod(emit_PHI, phi_type=float_type)
+    emit_PHIB = partialmethod(emit_PHI, phi_type=byte_type)
+
     def emit_CALL(self, func_name, *registers):
         # print(self.globals)
         args = [self.temps[r] for r in registers[:-1]]
         target = registers[-1]
-        self.temps[target] = self.builder.call(self.globals[func_name], args)
+        function = self.globals[func_name]
+        tail = False
+        if target in self.tail_results:
+            # musttail needs the same prototype in the caller and the callee
+            tail = 'musttail' if function.function_type == self.function.function_type else 'tail'
+        self.temps[target] = self.builder.call(function, args, tail=tail)
 
 
 #######################################################################
 #                      TESTING/MAIN PROGRAM
 #######################################################################
 
-def compile_llvm(source):
+def compile_llvm(source, context=None):
+    '''
+    Generate LLVM code from source.  The compilation runs in context
+    (by default, the current context).  If the context has a 'cache'
+    option, the code is loaded from the cache when it's there.
+    '''
     from .ircode import compile_ircode
 
-    # Make the low-level code generator
-    generator = GenerateLLVM()
-
-    # Compile intermediate code
-    ir_functions = compile_ircode(source)
-    for ir_func in ir_functions:
-        # Generates LLVM low level code for a given IR-code Function
-        generator.generate_code(ir_func)
-
-    # Generate low-level code
-    # generator.generate_code(code)
-    return str(generator.module)
+    with use_context(context) as context:
+        cache = context.get_option('cache')
+        if cache is not None:
+            key = cache.key(source, context.options)
+            data = cache.load(key, 'll', context)
+            if data is not None:
+                return data.decode('utf-8')
+
+        # Make the low-level code generator
+        generator = GenerateLLVM(context)
+
+        # Compile intermediate code
+        ir_functions = compile_ircode(source)
+        with context.timer('llvm'):
+            for ir_func in ir_functions:
+                # Generates LLVM low level code for a given IR-code Function
+                generator.generate_code(ir_func)
+
+            # Generate low-level code
+            # generator.generate_code(code)
+            llvm_code = str(generator.module)
+
+        if cache is not None and not context.errors_reported():
+            cache.store(key, 'll', llvm_code.encode('utf-8'), context)
+        return llvm_code
 
 def main():
     import sys
@@ -0,0 +1,220 @@
+'''
+Promotion of variables to registers
+===================================
+GenerateCode keeps every local variable and parameter in memory: the
+variable is allocated with ALLOC, and each use or assignment is a LOAD
+or a STORE.  This pass turns the locals of a function into registers,
+in SSA form.  Where different values of a variable reach a block, a PHI
+instruction at the start of the block selects the one coming from the
+predecessor that was executed:
+
+    ('PHII', 'R4', 'L1', 'R9', 'L3', 'R10')
+
+means R10 = R4 if the block was entered from the block L1, or R9 if
+from L3.  The PHIs come first in their block.
+
+The construction is the usual one (Cytron et al.): PHIs are placed on
+the iterated dominance frontier of the blocks that store to a variable,
+restricted to the blocks where the variable is live (pruned SSA), then
+the dominator tree is walked to replace every LOAD by the register
+holding the current value of the variable.  The STOREs and ALLOCs of the
+promoted variables disappear.
+
+A local can always be promoted, since the language has no way to take
+its address.  Left alone are the names that a function uses for both a
+global and a local (see constprop.py), and the ones allocated with
+different types.  A variable read before any store (a declaration
+without a value) is 0, like the variables of the interpreter.  A
+parameter is read once, at the start of the function, by a LOAD that the
+code generators turn into the argument itself.
+
+The entry block gets a label when it is the predecessor of a block with
+PHIs, so that the code may then start with a LABEL.
+'''
+
+from .cfg import ControlFlowGraph, is_phi, make_phi, rename_registers, used_registers
+from .constprop import variable_scopes
+from .dce import live_variables
+
+# Zero of each type, for the variables read before any store
+_ZEROS = { 'I': 0, 'F': 0.0, 'B': 0 }
+
+class PromoteVariables(object):
+    '''
+    Promotion of the local variables of one function
+    '''
+    def __init__(self, func):
+        self.func = func
+        self.local_names, self.mixed = variable_scopes(func)
+        self.cfg = ControlFlowGraph(func)
+        self.numbers = { }              # Register of a removed LOAD -> register
+                                        # holding the value
+        self.zeros = { }                # Type -> register holding 0
+        self.changes = 0
+
+    def variable_types(self):
+        '''
+        Return a dictionary mapping the variables that can be promoted to
+        their type suffix
+        '''
+        types = { name: ptype for name, ptype in self.func.parameters }
+        conflicts = set(self.mixed)
+        for block in self.cfg.blocks:
+            for inst in block.code:
+                if inst[0].startswith('ALLOC'):
+                    name, suffix = inst[1], inst[0][-1]
+                    if types.setdefault(name, suffix) != suffix:
+                        conflicts.add(name)
+        return { name: suffix for name, suffix in types.items() if name not in conflicts }
+
+    def run(self):
+        '''
+        Promote the variables.  Returns the number of changed or removed
+        instructions.
+        '''
+        cfg = self.cfg
+        self.changes = cfg.remove_unreachable()
+        self.types = self.variable_types()
+        if not self.types:
+            if self.changes:
+                self.func.code = cfg.linearize()
+            return self.changes
+
+        self.place_phis()
+        self.rename()
+        self.func.code = cfg.linearize()
+        return self.changes
+
+    def place_phis(self):
+        '''
+        Decide which blocks need a PHI for which variables.  self.phis maps
+        every block to a dictionary { variable: (target, incoming) }.
+        '''
+        cfg = self.cfg
+        live_in, _ = live_variables(cfg, lambda name: name in self.types)
+        frontiers = cfg.dominance_frontiers()
+
+        definitions = { name: { cfg.entry } for name in self.types }
+        for block in cfg.blocks:
+            for inst in block.code:
+                if inst[0].startswith('STORE') and inst[2] in self.types:
+                    definitions[inst[2]].add(block)
+                elif inst[0].startswith('ALLOC') and inst[1] in self.types:
+                    definitions[inst[1]].add(block)
+
+        self.phis = { block: { } for block in cfg.blocks }
+        for name, blocks in definitions.items():
+            work = list(blocks)
+            placed = set()
+            while work:
+                block = work.pop()
+                for frontier in frontiers[block]:
+                    if frontier not in placed and name in live_in[frontier]:
+                        placed.add(frontier)
+                        self.phis[frontier][name] = (cfg.new_register(), [])
+                        if frontier not in blocks:
+                            work.append(frontier)
+
+    def zero(self, suffix):
+        '''
+        Return the register holding 0 of a type (set at the start of the
+        entry block, see rename())
+        '''
+        register = self.zeros.get(suffix)
+        if register is None:
+            register = self.zeros[suffix] = self.cfg.new_register()
+        return register
+
+    def rename(self):
+        '''
+        Walk the dominator tree, replacing the LOADs of the variables by the
+        registers holding their value
+        '''
+        cfg = self.cfg
+        children = cfg.dominator_tree()
+        values = { name: [] for name in self.types }
+
+        # Parameters are read once, at the start
+        entry_loads = []
+        for name, ptype in self.func.parameters:
+            if name in self.types:
+                register = cfg.new_register()
+                entry_loads.append((f'LOAD{ptype}', name, register))
+                values[name].append(register)
+
+        # Blocks entered, then left (None)
+        stack = [ cfg.entry ]
+        pushed = []
+        while stack:
+            block = stack.pop()
+            if block is None:
+                for name in pushed.pop():
+                    values[name].pop()
+                continue
+            names = []
+            self.rename_block(block, values, names)
+            pushed.append(names)
+            stack.append(None)
+            stack.extend(reversed(children[block]))
+
+        cfg.entry.code[0:0] = [ (f'MOV{suffix}', _ZEROS[suffix], register)
+                                for suffix, register in self.zeros.items() ] + entry_loads
+        for block in cfg.blocks:
+            # The PHIs already in the code (see GenerateCode.short_circuit)
+            # may read the LOADs of blocks renamed after theirs
+            block.code = [ rename_registers(inst, self.numbers) if is_phi(inst) else inst
+                           for inst in block.code ]
+            phis = [ make_phi(f'PHI{self.types[name]}', incoming, target)
+                     for name, (target, incoming) in self.phis[block].items() ]
+            if phis:
+                block.code[0:0] = phis
+                self.changes += len(phis)
+
+    def rename_block(self, block, values, names):
+        '''
+        Rename the variables of a block.  names gets the names of the
+        variables whose value was pushed.
+        '''
+        def current(name):
+            # None stands for the 0 of a new allocation
+            register = values[name][-1] if values[name] else None
+            return register if register is not None else self.zero(self.types[name])
+
+        for name, (target, _) in self.phis[block].items():
+            values[name].append(target)
+            names.append(name)
+
+        code = []
+        for inst in block.code:
+            if self.numbers and used_registers(inst):
+                inst = rename_registers(inst, self.numbers)
+            op_code = inst[0]
+            if op_code.startswith('LOAD') and inst[1] in self.types:
+                self.numbers[inst[2]] = current(inst[1])
+            elif op_code.startswith('STORE') and inst[2] in self.types:
+                values[inst[2]].append(inst[1])
+                names.append(inst[2])
+            elif op_code.startswith('ALLOC') and inst[1] in self.types:
+                values[inst[1]].append(None)
+                names.append(inst[1])
+            else:
+                code.append(inst)
+                continue
+            self.changes += 1
+        block.code = code
+
+        for succ in block.succs:
+            phis = self.phis[succ]
+            if phis:
+                if block.label is None:
+                    block.label = self.cfg.new_label()
+                    self.cfg.labels[block.label] = block
+                for name, (_, incoming) in phis.items():
+                    incoming.append((current(name), block.label))
+
+def promote_variables(functions):
+    '''
+    Promote the local variables of a list of IR Functions to registers.
+    Returns the number of changed or removed instructions.
+    '''
+    return sum(PromoteVariables(func).run() for func in functions)
@@ -0,0 +1,83 @@
+'''
+Optimizer
+=========
+Runs optimization passes over the intermediate code of a program (the
+list of Functions made by ircode.GenerateCode).  Every pass takes the
+list of functions, changes their code in place and returns the number
+of instructions it changed or removed.
+
+The passes are run in the order of PASSES.  To optimize a compilation,
+set the 'optimize' option of its context to True (all the passes), or
+to a list of pass names:
+
+    context = CompilationContext(options={ 'optimize': True })
+    functions = compile_ircode(source, context)
+
+The number of changes of each pass is added to the statistics of the
+context (opt_<name>), and the time spent to the 'optimize' statistic.
+To show the optimized intermediate code of a program, run:
+
+    bash % python3 -m gone.optimize someprogram.g [pass ...]
+'''
+
+from .constprop import propagate_constants
+from .context import use_context
+from .dce import eliminate_dead_code
+from .inline import inline_functions
+from .licm import move_invariant_code
+from .mem2reg import promote_variables
+from .strength import reduce_strength
+from .tailcall import eliminate_tail_calls
+from .valnum import number_values
+
+PASSES = {
+    'tailcall': eliminate_tail_calls,
+    'inline': inline_functions,
+    'mem2reg': promote_variables,
+    'constprop': propagate_constants,
+    'licm': move_invariant_code,
+    'strength': reduce_strength,
+    'valnum': number_values,
+    'dce': eliminate_dead_code,
+}
+
+def optimize(functions, passes=None, context=None):
+    '''
+    Run the given passes (by default, all of them) on a list of IR
+    Functions, in place.  Returns the functions.
+    '''
+    if passes is None or passes is True:
+        passes = list(PASSES)
+    for name in passes:
+        if name not in PASSES:
+            raise ValueError(f'Unknown optimization pass {name!r}')
+
+    with use_context(context) as context, context.timer('optimize'):
+        for name in passes:
+            context.count(f'opt_{name}', PASSES[name](functions))
+    return functions
+
+def main():
+    import sys
+    from .context import CompilationContext
+    from .ircode import compile_ircode
+
+    if len(sys.argv) < 2:
+        sys.stderr.write("Usage: python3 -m gone.optimize filename [pass ...]\n")
+        raise SystemExit(1)
+
+    source = open(sys.argv[1]).read()
+    context = CompilationContext(options={ 'optimize': sys.argv[2:] or True })
+    code = compile_ircode(source, context)
+
+    for f in code:
+        print(f'{"::"*5} {f} {"::"*5}')
+        for instruction in f.code:
+            print(instruction)
+        print("*"*30)
+    for name, value in context.stats.items():
+        if name.startswith('opt_') or name == 'ir_instructions':
+            print(f'{name:<16} {value}')
+
+if __name__ == '__main__':
+    main()
@@ -93,11 +93,13 @@ To do the project, follow the instructions contained below.
 '''
 
 # ----------------------------------------------------------------------
-# parsers are defined using SLY.  You inherit from the Parser class
+# parsers are defined using SLY.  GoneParser derives from
+# CachedTablesParser, a subclass of SLY's Parser, so that its LALR tables
+# are cached on disk instead of rebuilt on each import.  See parsetab.py
 #
 # See http://sly.readthedocs.io/en/latest/
 # ----------------------------------------------------------------------
-from sly import Parser
+from .parsetab import CachedTablesParser
 
 # ----------------------------------------------------------------------
 # The following import loads a function error(lineno,msg) that should be
@@ -105,6 +107,7 @@ from sly import Parser
 # other features of the compiler will rely on this function.  See the
 # file errors.py for more documentation about the error handling mechanism.
 from .errors import error
+from .context import use_context
 
 # ----------------------------------------------------------------------
 # Import the lexer class.  It's token list is needed to validate and
@@ -116,7 +119,7 @@ from .tokenizer import GoneLexer
 # Read instructions in ast.py
 from .ast import *
 
-class GoneParser(Parser):
+class GoneParser(CachedTablesParser):
     # Same token set as defined in the lexer
     tokens = GoneLexer.tokens
 
@@ -396,14 +399,44 @@ class GoneParser(Parser):
 #                     DO NOT MODIFY ANYTHING BELOW HERE
 # ----------------------------------------------------------------------
 
-def parse(source):
+def parse(source, frontend=None, context=None):
     '''
     Parse source code into an AST. Return the top of the AST tree.
+
+    frontend selects the parser: 'lalr' for GoneParser, or 'rd' for the
+    hand-written recursive descent parser in rdparser.py.  Both build
+    the same AST.  By default it is the 'frontend' option of the
+    compilation context, or 'lalr'.
+
+    Errors are reported to context (by default, the current context).
+    '''
+    with use_context(context) as context, context.timer('parse'):
+        if frontend is None:
+            frontend = context.get_option('frontend', 'lalr')
+
+        if frontend == 'rd':
+            from . import rdparser
+            return rdparser.parse(source)
+        elif frontend != 'lalr':
+            raise ValueError(f'Unknown parser front end {frontend!r}')
+
+        lexer = GoneLexer()
+        parser = GoneParser()
+        ast = parser.parse(lexer.tokenize(source))
+        return ast
+
+def parse_file(filename, context=None):
     '''
-    lexer = GoneLexer()
-    parser = GoneParser()
-    ast = parser.parse(lexer.tokenize(source))
-    return ast
+    Parse the contents of a file into an AST.  The file is memory-mapped
+    and lexed as a stream through a compact TokenBuffer, instead of being
+    read into a string.  Use this for very large sources.
+    '''
+    from .scanner import TokenBuffer
+
+    with use_context(context) as context, context.timer('parse'):
+        with TokenBuffer.from_file(filename, chunk_size=4096) as tokens:
+            parser = GoneParser()
+            return parser.parse(tokens.tokens())
 
 def main():
     '''
@@ -416,7 +449,7 @@ def main():
         raise SystemExit(1)
 
     # Parse and create the AST
-    ast = parse(open(sys.argv[1]).read())
+    ast = parse_file(sys.argv[1])
 
     # Output the resulting parse tree structure
     for depth, node in flatten(ast):
@@ -0,0 +1,130 @@
+'''
+Parse table cache
+=================
+SLY builds the LALR(1) tables of a parser when the parser class is
+created.  For GoneParser that happens every time gone.parser is
+imported, so every run of the compiler pays for it.
+
+CachedTablesParser is a drop-in replacement for sly.Parser that saves
+the generated tables to disk and loads them on later imports.  The
+cache file is keyed by a hash of the grammar (productions, precedence
+and SLY version), so any change to the grammar simply produces a new
+cache file.  The grammar itself is still built from the decorated
+methods, since the production functions are needed to parse.
+
+Tables are stored next to the compiled bytecode, in gone/__pycache__.
+Set the GONE_PARSETAB_DIR environment variable to use another directory.
+If the directory is not writable the tables are just built as usual.
+'''
+
+import os
+import hashlib
+import marshal
+
+import sly
+from sly import Parser
+from sly.yacc import YaccError
+
+# Bump this if the layout of the cache file changes
+_FORMAT_VERSION = 1
+
+CACHE_DIR = os.environ.get('GONE_PARSETAB_DIR',
+                           os.path.join(os.path.dirname(__file__), '__pycache__'))
+
+class CachedTables(object):
+    '''
+    The subset of sly.yacc.LRTable used by Parser.parse()
+    '''
+    def __init__(self, lr_action, lr_goto, defaulted_states):
+        self.lr_action = lr_action
+        self.lr_goto = lr_goto
+        self.defaulted_states = defaulted_states
+
+def grammar_signature(grammar):
+    '''
+    Return a hash identifying the LALR tables generated for grammar
+    '''
+    h = hashlib.sha256()
+    h.update(f'{_FORMAT_VERSION}:{getattr(sly, "__version__", "")}\n'.encode())
+    h.update(f'start {grammar.Start}\n'.encode())
+    for term, prec in sorted(grammar.Precedence.items()):
+        h.update(f'prec {term} {prec}\n'.encode())
+    for prod in grammar.Productions:
+        h.update(f'{prod} {prod.prec}\n'.encode())
+    return h.hexdigest()
+
+def _cache_path(parser_cls, signature):
+    return os.path.join(CACHE_DIR, f'{parser_cls.__name__}.parsetab-{signature[:16]}')
+
+def load_tables(path):
+    '''
+    Load cached tables.  Returns (tables, num_sr, num_rr) or None.
+    '''
+    try:
+        with open(path, 'rb') as f:
+            action, goto, defaulted, num_sr, num_rr = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    return CachedTables(action, goto, defaulted), num_sr, num_rr
+
+def save_tables(path, lrtable):
+    '''
+    Save the tables of lrtable.  Failures are silently ignored.
+    '''
+    data = (lrtable.lr_action, lrtable.lr_goto, lrtable.defaulted_states,
+            len(lrtable.sr_conflicts), len(lrtable.rr_conflicts))
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, 'wb') as f:
+            marshal.dump(data, f)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+
+class CachedTablesParser(Parser):
+    '''
+    sly.Parser whose LALR tables are cached on disk.  Subclasses are
+    written exactly like regular SLY parsers.
+    '''
+    @classmethod
+    def _build(cls, definitions):
+        rules = cls._Parser__collect_rules(definitions)
+        if not rules:
+            # This is the abstract base class itself
+            return
+
+        if not cls._Parser__validate_specification():
+            raise YaccError('Invalid parser specification')
+
+        cls._Parser__build_grammar(rules)
+
+        path = _cache_path(cls, grammar_signature(cls._grammar))
+        cached = load_tables(path)
+        if cached:
+            cls._lrtable, num_sr, num_rr = cached
+            cls._report_conflicts(num_sr, num_rr)
+        else:
+            if not cls._Parser__build_lrtables():
+                raise YaccError('Can\'t build parsing tables')
+            save_tables(path, cls._lrtable)
+
+    @classmethod
+    def _report_conflicts(cls, num_sr, num_rr):
+        '''
+        Issue the same conflict warnings as when the tables are built
+        '''
+        if num_sr != getattr(cls, 'expected_shift_reduce', None):
+            if num_sr == 1:
+                cls.log.warning('1 shift/reduce conflict')
+            elif num_sr > 1:
+                cls.log.warning('%d shift/reduce conflicts', num_sr)
+
+        if num_rr != getattr(cls, 'expected_reduce_reduce', None):
+            if num_rr == 1:
+                cls.log.warning('1 reduce/reduce conflict')
+            elif num_rr > 1:
+                cls.log.warning('%d reduce/reduce conflicts', num_rr)
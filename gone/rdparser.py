@@ -0,0 +1,322 @@
+'''
+Recursive descent parser
+========================
+A hand-written alternative to the SLY generated GoneParser.  It builds
+exactly the same AST (same nodes, same fields and same line numbers)
+for the grammar documented in parser.py, but does it with plain method
+calls instead of driving generic LALR tables with a Python callback for
+every reduction.
+
+Statements are parsed by recursive descent.  Expressions are parsed
+with a Pratt (precedence climbing) loop driven by GoneParser.precedence,
+so both parsers always share the same precedence table.  Operator
+conflicts are resolved exactly the way the LALR table generator does:
+
+    - A pending rule takes the precedence of its operator (for unary
+      '!', the UNARY pseudo token).  Tokens and rules that are not in
+      the precedence table get level 0, right associative.
+
+    - When another binary operator follows a complete operand, it is
+      shifted (binds to the operand) if its level is higher than the
+      pending rule, or if the levels are equal and the rule is right
+      associative.  Equal levels on a nonassoc rule are a syntax error.
+      Otherwise the pending rule is reduced first.
+
+Tokens come from the single-regex scanner (see scanner.py).
+
+Error handling is simpler than in the LALR parser: the first syntax
+error is reported (with the same message) and parsing stops, returning
+None.  To parse with this front end use:
+
+    parse(source, frontend='rd')
+'''
+
+from .errors import error
+from .scanner import scan
+from .parser import GoneParser
+from . import ast
+
+# Precedence of tokens not listed in the precedence table
+_NO_PRECEDENCE = ('right', 0)
+
+class _SyntaxError(Exception):
+    pass
+
+class RDParser(object):
+    '''
+    Recursive descent parser for Gone.  Use parse(tokens), where tokens
+    is a sequence of (type, value, lineno, index) tuples such as the one
+    generated by scanner.scan().
+
+    Nodes are created by calling the classes of the same name in nodes,
+    which defaults to the ast module.  Passing another node factory (such
+    as arena.ArenaBuilder) makes the parser build another representation
+    of the tree.
+    '''
+    # Operators of the expression rules
+    binary_operators = { 'PLUS', 'MINUS', 'TIMES', 'DIVIDE', 'LT', 'LE', 'GT',
+                         'GE', 'EQ', 'NE', 'AND', 'OR' }
+    unary_operators = { 'PLUS': 'PLUS', 'MINUS': 'MINUS', 'NOT': 'UNARY' }
+
+    def __init__(self, nodes=ast):
+        self.nodes = nodes
+
+        precedence = { }
+        for level, (assoc, *terms) in enumerate(GoneParser.precedence, start=1):
+            for term in terms:
+                precedence[term] = (assoc, level)
+
+        # Precedence of each binary operator token.  It is also the
+        # precedence of the rule 'expression OP expression'
+        self.binary_precedence = { op: precedence.get(op, _NO_PRECEDENCE)
+                                   for op in self.binary_operators }
+
+        # Precedence of the unary rules, the key is the operator token
+        self.unary_precedence = { op: precedence.get(prec, _NO_PRECEDENCE)
+                                  for op, prec in self.unary_operators.items() }
+
+        self.statement_parsers = {
+            'PRINT': self.print_statement,
+            'CONST': self.const_declaration,
+            'VAR': self.var_declaration,
+            'ID': self.assign_statement,
+            'IF': self.if_statement,
+            'WHILE': self.while_statement,
+            'FUNC': self.func_declaration,
+            'RETURN': self.ret_statement,
+        }
+
+    def parse(self, tokens):
+        '''
+        Parse the token sequence.  Returns the list of top level statements,
+        or None if there is a syntax error.
+        '''
+        self.tokens = list(tokens)
+        lineno = self.tokens[-1][2] if self.tokens else 1
+        self.tokens.append(('$end', None, lineno, None))
+        self.pos = 0
+        try:
+            program = self.block()
+            if self.tokens[self.pos][0] != '$end':
+                self.syntax_error()
+            return program
+        except _SyntaxError:
+            return None
+        finally:
+            del self.tokens
+
+    # ----------------------------------------------------------------------
+    # Helpers
+
+    def syntax_error(self):
+        tok = self.tokens[self.pos]
+        if tok[0] == '$end':
+            error('EOF', 'Syntax error. No more input.')
+        else:
+            error(tok[2], "Syntax error in input at token '%s'" % tok[1])
+        raise _SyntaxError()
+
+    def expect(self, toktype):
+        '''
+        Consume a token of the given type and return it
+        '''
+        tok = self.tokens[self.pos]
+        if tok[0] != toktype:
+            self.syntax_error()
+        self.pos += 1
+        return tok
+
+    # ----------------------------------------------------------------------
+    # Statements
+
+    def block(self):
+        '''
+        block : statements | empty
+        '''
+        statements = []
+        parsers = self.statement_parsers
+        tokens = self.tokens
+        while True:
+            parser = parsers.get(tokens[self.pos][0])
+            if parser is None:
+                return statements
+            statements.append(parser())
+
+    def braced_block(self):
+        '''
+        LBRACE block RBRACE
+        '''
+        self.expect('LBRACE')
+        block = self.block()
+        self.expect('RBRACE')
+        return block
+
+    def print_statement(self):
+        lineno = self.expect('PRINT')[2]
+        value = self.expression()
+        self.expect('SEMI')
+        return self.nodes.PrintStatement(value, lineno=lineno)
+
+    def const_declaration(self):
+        lineno = self.expect('CONST')[2]
+        name = self.expect('ID')[1]
+        self.expect('ASSIGN')
+        value = self.expression()
+        self.expect('SEMI')
+        return self.nodes.ConstDeclaration(name, value, lineno=lineno)
+
+    def var_declaration(self):
+        lineno = self.expect('VAR')[2]
+        name = self.expect('ID')[1]
+        datatype = self.datatype()
+        value = None
+        if self.tokens[self.pos][0] == 'ASSIGN':
+            self.pos += 1
+            value = self.expression()
+        self.expect('SEMI')
+        return self.nodes.VarDeclaration(name, datatype, value, lineno=lineno)
+
+    def assign_statement(self):
+        _, name, lineno, _ = self.expect('ID')
+        location = self.nodes.SimpleLocation(name, lineno=lineno)
+        self.expect('ASSIGN')
+        value = self.expression()
+        self.expect('SEMI')
+        return self.nodes.WriteLocation(location, value, lineno=lineno)
+
+    def if_statement(self):
+        lineno = self.expect('IF')[2]
+        condition = self.expression()
+        true_block = self.braced_block()
+        false_block = []
+        if self.tokens[self.pos][0] == 'ELSE':
+            self.pos += 1
+            false_block = self.braced_block()
+        return self.nodes.IfStatement(condition, true_block, false_block, lineno=lineno)
+
+    def while_statement(self):
+        lineno = self.expect('WHILE')[2]
+        condition = self.expression()
+        body = self.braced_block()
+        return self.nodes.WhileStatement(condition, body, lineno=lineno)
+
+    def func_declaration(self):
+        lineno = self.expect('FUNC')[2]
+        name = self.expect('ID')[1]
+        self.expect('LPAREN')
+        params = self.comma_list(self.func_param)
+        self.expect('RPAREN')
+        datatype = self.datatype()
+        body = self.braced_block()
+        return self.nodes.FuncDeclaration(name, params, datatype, body, lineno=lineno)
+
+    def func_param(self):
+        _, name, lineno, _ = self.expect('ID')
+        return self.nodes.FuncParameter(name, self.datatype(), lineno=lineno)
+
+    def ret_statement(self):
+        lineno = self.expect('RETURN')[2]
+        value = self.expression()
+        self.expect('SEMI')
+        return self.nodes.ReturnStatement(value, lineno=lineno)
+
+    def datatype(self):
+        _, name, lineno, _ = self.expect('ID')
+        return self.nodes.SimpleType(name, lineno=lineno)
+
+    def comma_list(self, item):
+        '''
+        Items separated by commas, up to a closing parenthesis.  Like the
+        left recursive grammar rules (which start from an empty list), a
+        leading comma is accepted.
+        '''
+        items = []
+        tokens = self.tokens
+        if tokens[self.pos][0] != 'RPAREN':
+            if tokens[self.pos][0] != 'COMA':
+                items.append(item())
+            while tokens[self.pos][0] == 'COMA':
+                self.pos += 1
+                items.append(item())
+        return items
+
+    # ----------------------------------------------------------------------
+    # Expressions
+
+    def expression(self):
+        return self.operand(None)[0]
+
+    def operand(self, rule):
+        '''
+        Parse an expression that is the right operand of a pending rule
+        with the given (assoc, level) precedence, or a whole expression if
+        rule is None.  Returns the node and the line number of its first
+        token (the line the LALR parser assigns to an enclosing BinOp).
+        '''
+        left, lineno = self.prefix()
+        tokens = self.tokens
+        BinOp = self.nodes.BinOp
+        binary_precedence = self.binary_precedence
+        while True:
+            tok = tokens[self.pos]
+            prec = binary_precedence.get(tok[0])
+            if prec is None:
+                return left, lineno
+
+            if rule is not None:
+                rassoc, rlevel = rule
+                slevel = prec[1]
+                if slevel < rlevel or (slevel == rlevel and rassoc != 'right'):
+                    if slevel == rlevel and rassoc == 'nonassoc':
+                        self.syntax_error()
+                    # Reduce: the operator belongs to an enclosing rule
+                    return left, lineno
+
+            self.pos += 1
+            right, _ = self.operand(prec)
+            left = BinOp(tok[1], left, right, lineno=lineno)
+
+    def prefix(self):
+        tok = self.tokens[self.pos]
+        toktype, value, lineno, _ = tok
+        self.pos += 1
+
+        if toktype == 'ID':
+            if self.tokens[self.pos][0] == 'LPAREN':
+                self.pos += 1
+                arguments = self.comma_list(self.expression)
+                self.expect('RPAREN')
+                return self.nodes.FuncCall(value, arguments, lineno=lineno), lineno
+
+            location = self.nodes.SimpleLocation(value, lineno=lineno)
+            return self.nodes.ReadLocation(location, lineno=lineno), lineno
+
+        elif toktype == 'INTEGER':
+            return self.nodes.IntegerLiteral(int(value), lineno=lineno), lineno
+
+        elif toktype == 'FLOAT':
+            return self.nodes.FloatLiteral(float(value), lineno=lineno), lineno
+
+        elif toktype == 'CHAR':
+            return self.nodes.CharLiteral(eval(value), lineno=lineno), lineno
+
+        elif toktype == 'BOOL':
+            return self.nodes.BoolLiteral(value, lineno=lineno), lineno
+
+        elif toktype == 'LPAREN':
+            node = self.expression()
+            self.expect('RPAREN')
+            return node, lineno
+
+        elif toktype in self.unary_precedence:
+            right, _ = self.operand(self.unary_precedence[toktype])
+            return self.nodes.UnaryOp(value, right, lineno=lineno), lineno
+
+        self.pos -= 1
+        self.syntax_error()
+
+def parse(source):
+    '''
+    Parse source code into an AST with the recursive descent parser
+    '''
+    return RDParser().parse(scan(source))
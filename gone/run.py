@@ -6,7 +6,13 @@
 # Gone runtime support library (gonert.c) be compiled into a shared
 # object and placed in the same directory as this file.
 #
-# Note:  This project will require minor modification in Project 8
+# The runtime is loaded and LLVM initialized only once per process (see
+# initialize()), so a long-running process such as the compile server in
+# server.py can run many programs.
+#
+# Set the GONE_CACHE_DIR environment variable to keep compiled programs
+# in a compilation cache (see cache.py).  Running an unchanged program
+# again then loads its LLVM bitcode instead of compiling it.
 
 import os
 import os.path
@@ -15,38 +21,66 @@ import llvmlite.binding as llvm
 
 _path = os.path.dirname(__file__)
 
-def run(llvm_ir):
-    # Load the runtime
-    if os.name != 'nt':
-        ctypes._dlopen(os.path.join(_path, 'gonert.so'), ctypes.RTLD_GLOBAL)
-    else:
-        ctypes._dlopen(os.path.join(_path, 'gonert.dll'), ctypes.RTLD_GLOBAL)
+# Target of the host, set by initialize()
+_target = None
+
+def initialize():
+    '''
+    Load the runtime library and initialize LLVM.  This is done once per
+    process; later calls return the same target.
+    '''
+    global _target
+    if _target is None:
+        # Load the runtime
+        if os.name != 'nt':
+            ctypes._dlopen(os.path.join(_path, 'gonert.so'), ctypes.RTLD_GLOBAL)
+        else:
+            ctypes._dlopen(os.path.join(_path, 'gonert.dll'), ctypes.RTLD_GLOBAL)
 
-    # Initialize LLVM
-    llvm.initialize()
-    llvm.initialize_native_target()
-    llvm.initialize_native_asmprinter()
+        # Initialize LLVM.  Recent versions of llvmlite do the first step
+        # by themselves and refuse to do it again.
+        try:
+            llvm.initialize()
+        except RuntimeError:
+            pass
+        llvm.initialize_native_target()
+        llvm.initialize_native_asmprinter()
 
-    target = llvm.Target.from_default_triple()
-    target_machine = target.create_target_machine()
-    mod = llvm.parse_assembly(llvm_ir)
-    mod.verify()
+        _target = llvm.Target.from_default_triple()
+    return _target
 
-    engine = llvm.create_mcjit_compiler(mod, target_machine)
+def run(llvm_ir, cache=None, key=None):
+    '''
+    Run a program given as LLVM code, or as LLVM bitcode (bytes), and
+    return the result of its main() function.  If a cache is given, the
+    bitcode of the program is stored in it under key.
+    '''
+    target = initialize()
+    if isinstance(llvm_ir, bytes):
+        mod = llvm.parse_bitcode(llvm_ir)
+    else:
+        mod = llvm.parse_assembly(llvm_ir)
+        mod.verify()
+        if cache is not None:
+            cache.store(key, 'bc', mod.as_bitcode())
 
-    # Execute the main() function
-    #
-    # !!! Note: Requires modification in Project 8 (see below)
-    main_ptr = engine.get_function_address('main')
-    main_func = ctypes.CFUNCTYPE(None)(main_ptr)
-    main_func()
+    # The engine owns its target machine and frees it with itself, so
+    # every engine gets a new one
+    engine = llvm.create_mcjit_compiler(mod, target.create_target_machine())
+    engine.finalize_object()
 
-    # Project 8:  Modify the above code to execute the Gone __init()
-    # function that initializes global variables.  Then add code below
-    # that executes the Gone main() function.
+    # Execute the __init() function that initializes global variables,
+    # then the Gone main() function (see ircode.py)
+    init_func = ctypes.CFUNCTYPE(ctypes.c_int)(engine.get_function_address('__gone_init'))
+    init_func()
+    main_ptr = engine.get_function_address('__gone_main')
+    if not main_ptr:
+        return 0
+    main_func = ctypes.CFUNCTYPE(ctypes.c_int)(main_ptr)
+    return main_func()
 
 def main():
-    from .errors import errors_reported
+    from .context import CompilationContext
     from .llvmgen import compile_llvm
     import sys
 
@@ -55,9 +89,23 @@ def main():
         raise SystemExit(1)
 
     source = open(sys.argv[1]).read()
-    llvm_code = compile_llvm(source)
-    if not errors_reported():
-        run(llvm_code)
+
+    # If GONE_CACHE_DIR is set, programs run before are loaded as bitcode
+    # from the compilation cache
+    cache = key = None
+    if os.environ.get('GONE_CACHE_DIR'):
+        from .cache import CompilationCache
+        cache = CompilationCache()
+        key = cache.key(source)
+        bitcode = cache.load(key, 'bc')
+        if bitcode is not None:
+            run(bitcode)
+            return
+
+    context = CompilationContext(options={ 'cache': cache } if cache else None)
+    llvm_code = compile_llvm(source, context)
+    if not context.errors_reported():
+        run(llvm_code, cache, key)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,406 @@
+'''
+Fast scanner
+============
+An alternative backend for the Gone lexer.  It produces exactly the same
+token stream as GoneLexer.tokenize() but avoids SLY's per-rule dispatch:
+all of the token rules are joined into a single compiled regular
+expression, and the matched group is turned into a token type through
+precomputed tables (one for fixed symbols, one for keywords).
+
+The rules themselves are not repeated here.  They are read from the
+GoneLexer class, so tokenizer.py remains the only place where the
+lexical structure of the language is defined.
+
+Three entry points are provided:
+
+    scan(text)      Generates plain (type, value, lineno, index) tuples.
+                    This is the cheapest form and is meant for front ends
+                    written on top of this module.
+
+    tokenize(text)  Generates sly.lex.Token objects, so it can be fed
+                    directly to GoneParser.parse().
+
+    TokenBuffer.from_file(filename)
+                    Memory-maps a source file and lexes it into a compact
+                    struct-of-arrays buffer (see TokenBuffer below).  This
+                    is meant for very large programs: the source is never
+                    read into a string and no object is kept per token.
+
+To compare the output with the SLY lexer run:
+
+    bash % python3 -m gone.scanner filename.g
+'''
+
+import re
+import mmap
+from array import array
+
+from sly.lex import Token
+
+from .errors import error
+from .tokenizer import GoneLexer, KEYWORDS
+
+# Rules that never produce a token.  The ones listed in _LINE_RULES may
+# span several lines, so the line counter must be advanced past them.
+_SKIPPED_RULES = { 'BLOCK_COMMENT', 'LINE_COMMENT', 'NEWLINE' }
+_LINE_RULES = { 'BLOCK_COMMENT', 'NEWLINE' }
+
+# Rules for tokens starting with a letter or an underscore.  No other rule
+# can match such text, so these are moved to the front of the master regex
+# (keeping their relative order).  Identifiers are by far the most common
+# tokens, so this saves trying every other alternative first.
+_WORD_RULES = ( 'BOOL', 'ID' )
+
+# Actions associated with each alternative of the master regex
+_SKIP = 0
+_SKIP_LINES = 1
+_KEYWORD = 2
+
+def _uncapture(pattern):
+    '''
+    Turn all the capturing groups of a regex into non-capturing ones.  The
+    lexer rules only use groups for alternation, and capturing them has a
+    measurable cost on every match.
+    '''
+    out = []
+    i = 0
+    in_class = False
+    while i < len(pattern):
+        c = pattern[i]
+        if c == '\\':
+            out.append(pattern[i:i+2])
+            i += 2
+            continue
+        if in_class:
+            in_class = c != ']'
+        elif c == '[':
+            in_class = True
+        elif c == '(' and pattern[i+1:i+2] != '?':
+            c = '(?:'
+        out.append(c)
+        i += 1
+    return ''.join(out)
+
+def _build_master_re():
+    '''
+    Build the master regex from the GoneLexer rules.  Apart from _WORD_RULES,
+    rules are kept in definition order (first match wins, as in SLY).
+    Ignored characters are consumed as a prefix of every match.  Returns
+    the compiled regex and a table indexed by match.lastindex.  Each entry
+    of the table is either one of the action codes above or the name of
+    the token.
+    '''
+    rules = [ (name, rule if isinstance(rule, str) else rule.pattern)
+              for name, rule in GoneLexer._rules ]
+    words = [ rule for rule in rules if rule[0] in _WORD_RULES ]
+    others = [ rule for rule in rules if rule[0] not in _WORD_RULES ]
+    for name, pattern in others:
+        assert not re.match(pattern, 'a_z'), f'{name} matches a word'
+
+    parts = []
+    actions = [ None ]
+    for name, pattern in words + others:
+        if name in _LINE_RULES:
+            action = _SKIP_LINES
+        elif name in _SKIPPED_RULES:
+            action = _SKIP
+        elif name == 'ID':
+            action = _KEYWORD
+        else:
+            action = name
+
+        parts.append(f'({_uncapture(pattern)})')
+        actions.append(action)
+
+    ignore = f'[{re.escape(GoneLexer.ignore)}]*'
+    return f'{ignore}(?:{"|".join(parts)})', actions
+
+_master_pattern, _actions = _build_master_re()
+_master_re = re.compile(_master_pattern)
+
+# Same regex, for scanning bytes (memory-mapped files)
+_master_bytes_re = re.compile(_master_pattern.encode('ascii'))
+
+def scan(text, lineno=1):
+    '''
+    Generate (type, value, lineno, index) tuples for all the tokens in text
+    '''
+    actions = _actions
+    keywords = KEYWORDS
+    ignore = GoneLexer.ignore
+    index = 0
+    for m in _master_re.finditer(text):
+        # Characters skipped by finditer did not match any rule
+        if m.start() != index:
+            for index in range(index, m.start()):
+                if text[index] not in ignore:
+                    error(lineno, "Illegal character %r" % text[index])
+
+        group = m.lastindex
+        start = m.start(group)
+        index = m.end()
+        action = actions[group]
+        if action.__class__ is str:
+            yield (action, m.group(group), lineno, start)
+        elif action == _KEYWORD:
+            value = m.group(group)
+            yield (keywords.get(value, 'ID'), value, lineno, start)
+        elif action == _SKIP_LINES:
+            lineno += text.count('\n', start, index)
+
+    for index in range(index, len(text)):
+        if text[index] not in ignore:
+            error(lineno, "Illegal character %r" % text[index])
+
+def tokenize(text, lineno=1):
+    '''
+    Generate SLY tokens for text.  Drop-in replacement of GoneLexer.tokenize()
+    '''
+    for tok_type, value, lineno, index in scan(text, lineno):
+        tok = Token()
+        tok.type = tok_type
+        tok.value = value
+        tok.lineno = lineno
+        tok.index = index
+        tok.end = index + len(value)
+        yield tok
+
+# ----------------------------------------------------------------------
+# Compact token storage
+#
+# Token types are stored as small integer codes.  TOKEN_TYPES maps a
+# code back to the token name.
+TOKEN_TYPES = sorted(GoneLexer.tokens)
+TOKEN_CODES = { name: code for code, name in enumerate(TOKEN_TYPES) }
+
+class TokenBuffer(object):
+    '''
+    Struct-of-arrays storage for the tokens of a source.  Token n is
+    described by four parallel arrays:
+
+        types[n]    Token type code (see TOKEN_TYPES)
+        starts[n]   Offset of the token in the source
+        lengths[n]  Length of the token
+        linenos[n]  Line number of the token
+
+    Token values are not stored.  They are sliced out of the source (a
+    bytes-like object, usually a mmap) and decoded only when asked for.
+    Sources are UTF-8: one that is all ASCII is lexed as bytes, where
+    offsets are the same as in the decoded text.  Any other source is
+    decoded to a string first, so that offsets count characters as in
+    GoneLexer, and a non-ASCII character literal is a single character.
+
+    If chunk_size is given, the source is lexed as a stream: the arrays
+    hold at most chunk_size tokens and are refilled as tokens() advances.
+    Such a buffer can only be iterated once.
+    '''
+    def __init__(self, data, chunk_size=None):
+        self.data = data
+        self.chunk_size = chunk_size
+        self.types = array('B')
+        self.starts = array('Q')
+        self.lengths = array('L')
+        self.linenos = array('L')
+        self._mmap = None
+        if _non_ascii_re.search(data):
+            data = self.data = str(data, 'utf-8')
+            self._tables = _text_tables
+        else:
+            self._tables = _bytes_tables
+
+        # Lexing state, so that filling can be resumed
+        self._matches = self._tables[0].finditer(data)
+        self._lineno = 1
+        self._index = 0
+        self._fill(chunk_size)
+
+    @classmethod
+    def from_file(cls, filename, chunk_size=None):
+        '''
+        Create the buffer for a file, lexing it straight from a memory map
+        '''
+        with open(filename, 'rb') as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files can't be mapped
+                return cls(b'', chunk_size)
+
+        buf = cls(data, chunk_size)
+        buf._mmap = data
+        return buf
+
+    def _fill(self, limit=None):
+        '''
+        Append up to limit tokens (all of them if limit is None) to the arrays
+        '''
+        if self._matches is None:
+            return
+
+        data = self.data
+        actions = _actions
+        _, ignore, keyword_codes, newline = self._tables
+        add_type = self.types.append
+        add_start = self.starts.append
+        add_length = self.lengths.append
+        add_lineno = self.linenos.append
+
+        lineno = self._lineno
+        index = self._index
+        count = 0
+        for m in self._matches:
+            if m.start() != index:
+                for index in range(index, m.start()):
+                    if data[index] not in ignore:
+                        error(lineno, "Illegal character %r" % _char(data, index))
+
+            group = m.lastindex
+            start = m.start(group)
+            index = m.end()
+            action = actions[group]
+            if action.__class__ is str:
+                code = _group_codes[group]
+            elif action == _KEYWORD:
+                code = keyword_codes.get(m.group(group), _id_code)
+            else:
+                if action == _SKIP_LINES:
+                    lineno += m.group(group).count(newline)
+                continue
+
+            add_type(code)
+            add_start(start)
+            add_length(index - start)
+            add_lineno(lineno)
+            count += 1
+            if count == limit:
+                break
+        else:
+            # The whole source was consumed
+            for index in range(index, len(data)):
+                if data[index] not in ignore:
+                    error(lineno, "Illegal character %r" % _char(data, index))
+            self._matches = None
+
+        self._lineno = lineno
+        self._index = index
+
+    def close(self):
+        '''
+        Release the memory map (if any).  Values can't be decoded afterwards.
+        '''
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.types)
+
+    def type(self, n):
+        return TOKEN_TYPES[self.types[n]]
+
+    def value(self, n):
+        start = self.starts[n]
+        return _decode(self.data[start:start + self.lengths[n]])
+
+    def tokens(self):
+        '''
+        Generate the tokens in a form suitable for GoneParser.parse().  The
+        token objects are created one at a time, and their values are only
+        decoded if the parser reads them.
+        '''
+        types = TOKEN_TYPES
+        data = self.data
+        while True:
+            for code, start, length, lineno in zip(self.types, self.starts,
+                                                   self.lengths, self.linenos):
+                tok = BufferToken(data)
+                tok.type = types[code]
+                tok.lineno = lineno
+                tok.index = start
+                tok.end = start + length
+                yield tok
+
+            if self._matches is None:
+                return
+
+            # Streaming: recycle the arrays for the next chunk
+            for arr in (self.types, self.starts, self.lengths, self.linenos):
+                del arr[:]
+            self._fill(self.chunk_size)
+
+class BufferToken(object):
+    '''
+    A token backed by a source buffer.  Same attributes as sly.lex.Token,
+    but the value is sliced and decoded lazily.
+    '''
+    __slots__ = ('type', 'lineno', 'index', 'end', '_data')
+
+    def __init__(self, data):
+        self._data = data
+
+    @property
+    def value(self):
+        return _decode(self._data[self.index:self.end])
+
+    def __repr__(self):
+        return f'Token(type={self.type!r}, value={self.value!r}, lineno={self.lineno}, index={self.index}, end={self.end})'
+
+# Tables used to turn master regex matches into token type codes
+_group_codes = [ TOKEN_CODES.get(action) if action.__class__ is str else None
+                 for action in _actions ]
+_keyword_codes = { name: TOKEN_CODES[tok] for name, tok in KEYWORDS.items() }
+_id_code = TOKEN_CODES['ID']
+
+# Regex, ignored characters, keyword codes and newline used to lex an
+# ASCII source as bytes, or any other source as text
+_bytes_tables = (_master_bytes_re, GoneLexer.ignore.encode('ascii'),
+                 { name.encode('ascii'): code for name, code in _keyword_codes.items() },
+                 b'\n')
+_text_tables = (_master_re, GoneLexer.ignore, _keyword_codes, '\n')
+
+_non_ascii_re = re.compile(rb'[^\x00-\x7f]')
+
+def _decode(value):
+    '''
+    Return a token value sliced out of a source as a string
+    '''
+    return value if value.__class__ is str else value.decode('ascii')
+
+def _char(data, index):
+    '''
+    Return the character at index in a source
+    '''
+    return data[index] if data.__class__ is str else chr(data[index])
+
+def main():
+    '''
+    Main program. Checks that the scanner agrees with GoneLexer.
+    '''
+    import sys
+
+    if len(sys.argv) != 2:
+        sys.stderr.write("Usage: python3 -m gone.scanner filename\n")
+        raise SystemExit(1)
+
+    text = open(sys.argv[1]).read()
+    expected = [(t.type, t.value, t.lineno, t.index)
+                for t in GoneLexer().tokenize(text)]
+    got = list(scan(text))
+    for tok in got:
+        print(tok)
+
+    with TokenBuffer.from_file(sys.argv[1]) as buf:
+        buffered = [(t.type, t.value, t.lineno, t.index) for t in buf.tokens()]
+
+    if got != expected or buffered != expected:
+        sys.stderr.write("Token stream differs from GoneLexer\n")
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+'''
+Compile server
+==============
+Most of the time of a short "python3 -m gone.run" goes to starting
+Python, importing SLY and llvmlite, loading the parser tables and
+initializing LLVM, not to compiling the program.  The compile server
+does all that once and then serves compile and run requests sent by
+the thin client in client.py over a Unix domain socket:
+
+    bash % python3 -m gone.server &
+    bash % python3 -m gone.client run examples/mandel.g
+
+The server forks a child process for every request.  The child starts
+with everything already loaded, makes the client's stdout and stderr
+(passed over the socket) its own, compiles the program in a fresh
+CompilationContext and, for run requests, runs it in the JIT.  A
+program that crashes or loops forever only takes its own child down,
+and no state left by one program (JIT engines, runtime buffers, ...)
+is seen by the next one.
+
+Commands:
+
+    run       Compile and run the program
+    compile   Print the LLVM code of the program
+    check     Only check the program
+    ping      Do nothing (tells whether a server is running)
+    stop      Stop the server
+
+The socket is only accessible to the user running the server.  Use
+--socket or the GONE_SOCKET environment variable to choose its path.
+'''
+
+import ctypes
+import os
+import signal
+import socketserver
+import sys
+import time
+
+from .client import COMMANDS, socket_path, send_message, receive_message
+from .context import CompilationContext
+
+def serve_request(message):
+    '''
+    Carry out a request in this process, and return the reply
+    '''
+    from .checker import check_program
+    from .llvmgen import compile_llvm
+    from .parser import parse
+    from .run import run
+
+    command = message.get('command')
+    if command not in COMMANDS:
+        return { 'status': 0 if command in ('ping', 'stop') else 2 }
+
+    start = time.perf_counter()
+    context = CompilationContext(filename=message.get('filename'),
+                                 options=message.get('options'), stream=sys.stderr)
+    source = message.get('source', '')
+    if command == 'check':
+        check_program(parse(source, context=context), context)
+    else:
+        llvm_code = compile_llvm(source, context)
+        if not context.errors_reported():
+            if command == 'compile':
+                sys.stdout.write(llvm_code)
+            else:
+                sys.stdout.flush()
+                with context.timer('run'):
+                    run(llvm_code)
+
+    context.stats['total'] = time.perf_counter() - start
+    return { 'status': 1 if context.errors_reported() else 0,
+             'errors': context.errors_reported(),
+             'stats': context.stats }
+
+# The C library, to flush the output of the runtime (printf) before a
+# child exits with os._exit()
+_libc = ctypes.CDLL(None)
+
+class RequestHandler(socketserver.BaseRequestHandler):
+    '''
+    Handles one request, in a child process of the server
+    '''
+    def handle(self):
+        message, fds = receive_message(self.request, maxfds=2)
+        if message is None:
+            return
+
+        # The client's stdout and stderr become ours, so that the output of
+        # the program and the error messages go straight to the client
+        for fd, target in zip(fds, (1, 2)):
+            os.dup2(fd, target)
+            os.close(fd)
+
+        try:
+            reply = serve_request(message)
+        except Exception as e:
+            print(f'gone server: {type(e).__name__}: {e}', file=sys.stderr)
+            reply = { 'status': 2 }
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        _libc.fflush(None)
+        send_message(self.request, reply)
+
+        if message.get('command') == 'stop':
+            os.kill(os.getppid(), signal.SIGTERM)
+
+class CompileServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    # Don't wait for the children when stopping: they might be running
+    # programs that never end
+    block_on_close = False
+
+_WARM_UP = 'var x int = 1;\nfunc main() int { print x + 1; return 0; }\n'
+
+def preload():
+    '''
+    Load and warm up everything a compilation needs, so that the children
+    start with it
+    '''
+    from .llvmgen import compile_llvm
+    from .run import initialize
+
+    initialize()
+    for frontend in ('lalr', 'rd'):
+        context = CompilationContext(options={ 'frontend': frontend }, echo=False)
+        compile_llvm(_WARM_UP, context)
+        if context.errors_reported():
+            raise RuntimeError('The warm-up program has errors')
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python3 -m gone.server',
+                                     description='Serve Gone compile and run requests.')
+    parser.add_argument('--socket', help='socket path (default: $GONE_SOCKET, or '
+                        'gone-$UID.sock in $XDG_RUNTIME_DIR or /tmp)')
+    args = parser.parse_args()
+
+    path = args.socket or socket_path()
+    if os.path.exists(path):
+        from .client import request
+        try:
+            request({ 'command': 'ping' }, path)
+        except OSError:
+            os.unlink(path)             # Left behind by a server that died
+        else:
+            sys.stderr.write(f'A server is already running on {path}\n')
+            raise SystemExit(1)
+
+    preload()
+
+    # Stop cleanly on SIGTERM (sent by the stop command) and SIGINT
+    def stop(signum, frame):
+        raise SystemExit(0)
+    signal.signal(signal.SIGTERM, stop)
+
+    old_umask = os.umask(0o077)
+    try:
+        server = CompileServer(path, RequestHandler)
+    finally:
+        os.umask(old_umask)
+
+    print(f'Gone server listening on {path}', file=sys.stderr)
+    try:
+        with server:
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        os.unlink(path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,359 @@
+'''
+Strength reduction
+==================
+An optimization pass that replaces integer multiplications and
+divisions by cheaper operations.  It works on the SSA form made by
+mem2reg.py, where the loops of GenerateCode.visit_WhileStatement are
+the natural loops of the control flow graph (see ControlFlowGraph.loops).
+
+A basic induction variable of a loop is a PHII of its header whose value
+changes by the same amount on every iteration:
+
+    ('PHII', 'R3', 'L1', 'R9', 'L4', 'R5')     ; i
+    ...
+    ('ADDI', 'R5', 'R6', 'R9')                  ; i = i + step
+
+where R3 comes from the preheader, R9 from the only latch of the loop,
+and step (R6) is defined outside the loop.  SUBI counts down the same
+way.  With the induction variables of each loop, innermost first:
+
+    - Counters that start from the same value and move by the same step
+      are the same value, and the later ones are replaced by the first
+      (when its update comes first in the code and dominates theirs).
+    - A multiplication i * k, where k is defined outside the loop,
+      becomes a new induction variable j, set to init * k in the
+      preheader, and moved by step * k (computed in the preheader too)
+      right after the update of i.
+
+Then, in the whole function:
+
+    - A multiplication by a constant power of two 2**n becomes a shift
+      left by n (SHLI), which is the same on wrapping 32 bit integers.
+    - A division by 2**n becomes a shift right (SHRI) when the dividend
+      is known not to be negative: LLVM's division truncates towards
+      zero, and the arithmetic shift rounds down.
+
+Floats are left alone, as their rounding would change.  Like valnum.py,
+the pass relies on every register being defined once, and leaves the
+other functions unchanged.  The code it adds comes before the uses of
+its registers in the code, as the LLVM code generator needs.
+'''
+
+from .cfg import (ControlFlowGraph, defined_register, is_phi, make_phi, phi_incoming,
+                  rename_registers, single_definitions, used_registers)
+from .constprop import fold_arithmetic
+
+def power_of_two(value):
+    '''
+    Return n if value is 2**n (n > 0), or None
+    '''
+    if type(value) is int and value > 1 and value & (value - 1) == 0:
+        return value.bit_length() - 1
+    return None
+
+class InductionVariable(object):
+    '''
+    A basic induction variable: the PHII defining register, its initial
+    value, and its update op_code (ADDI or SUBI) by step, which defines
+    next in block
+    '''
+    def __init__(self, register, init, op_code, step, next, block):
+        self.register = register
+        self.init = init
+        self.op_code = op_code
+        self.step = step
+        self.next = next
+        self.block = block
+
+class StrengthReduction(object):
+    '''
+    Strength reduction for one function
+    '''
+    def __init__(self, func):
+        self.func = func
+        self.cfg = ControlFlowGraph(func)
+        self.defs = { }
+        self.changes = 0
+
+    def run(self):
+        '''
+        Reduce the multiplications and divisions.  Returns the number of
+        changed or removed instructions.
+        '''
+        if not single_definitions(self.func.code):
+            return 0
+        cfg = self.cfg
+        cfg.remove_unreachable()
+        for loop in reversed(cfg.loops()):
+            self.reduce_loop(loop)
+        self.shifts()
+        if self.changes:
+            self.func.code = cfg.linearize()
+        return self.changes
+
+    def definitions(self):
+        '''
+        Return a dictionary mapping every register to its instruction
+        '''
+        return { defined_register(inst): inst for block in self.cfg.blocks
+                 for inst in block.code if defined_register(inst) is not None }
+
+    def constant(self, register):
+        '''
+        Return the constant a register holds, or None
+        '''
+        inst = self.defs.get(register)
+        if inst is not None and inst[0].startswith('MOV'):
+            return inst[1]
+        return None
+
+    def rename(self, mapping):
+        '''
+        Replace the registers read by the code as given by mapping
+        '''
+        for block in self.cfg.blocks:
+            block.code = [ rename_registers(inst, mapping) if used_registers(inst) else inst
+                           for inst in block.code ]
+
+    # Loops
+
+    def induction_variables(self, loop, preheader, defined):
+        '''
+        Return the basic induction variables of a loop, in the order of the
+        PHIs of its header
+        '''
+        latch = loop.latches[0]
+        blocks = { }
+        for block in loop.blocks:
+            for inst in block.code:
+                target = defined_register(inst)
+                if target is not None:
+                    blocks[target] = block
+
+        variables = []
+        for inst in loop.header.code:
+            if not is_phi(inst):
+                break
+            incoming = dict((label, register) for register, label in phi_incoming(inst))
+            if inst[0] != 'PHII' or set(incoming) != { preheader.label, latch.label }:
+                continue
+            register = inst[-1]
+            next = incoming[latch.label]
+            update = self.defs.get(next)
+            if update is None or update[0] not in ('ADDI', 'SUBI'):
+                continue
+            left, right = update[1], update[2]
+            if left == register and right not in defined:
+                step = right
+            elif update[0] == 'ADDI' and right == register and left not in defined:
+                step = left
+            else:
+                continue
+            variables.append(InductionVariable(register, incoming[preheader.label],
+                                               update[0], step, next, blocks[next]))
+        return variables
+
+    def reduce_loop(self, loop):
+        '''
+        Merge the redundant counters of a loop and reduce its
+        multiplications
+        '''
+        cfg = self.cfg
+        header = loop.header
+        if len(loop.latches) != 1 or loop.latches[0].label is None:
+            return
+        if not any(inst[0] == 'PHII' for inst in header.code):
+            return
+        preheader = cfg.preheader(loop)
+        if preheader is None or preheader.label is None:
+            return
+        self.defs = self.definitions()
+        defined = { defined_register(inst) for block in loop.blocks for inst in block.code }
+        variables = self.merge_counters(self.induction_variables(loop, preheader, defined))
+        if variables:
+            self.reduce_multiplications(loop, preheader, defined, variables)
+
+    def merge_counters(self, variables):
+        '''
+        Replace the counters equal to one updated earlier.  Returns the
+        remaining induction variables.
+        '''
+        def key(register):
+            value = self.constant(register)
+            return ('register', register) if value is None else ('constant', value)
+
+        def update_position(variable):
+            block = variable.block
+            code = [ defined_register(inst) for inst in block.code ]
+            return (cfg.blocks.index(block), code.index(variable.next))
+
+        cfg = self.cfg
+        kept = { }
+        remaining = []
+        mapping = { }
+        removed = set()
+        for variable in sorted(variables, key=update_position):
+            signature = (key(variable.init), variable.op_code, key(variable.step))
+            first = kept.get(signature)
+            if first is not None and self.comes_before(first, variable):
+                mapping[variable.register] = first.register
+                mapping[variable.next] = first.next
+                removed.update((variable.register, variable.next))
+                continue
+            kept.setdefault(signature, variable)
+            remaining.append(variable)
+
+        if mapping:
+            for block in cfg.blocks:
+                block.code = [ inst for inst in block.code
+                               if defined_register(inst) not in removed ]
+            self.rename(mapping)
+            self.changes += len(removed)
+            self.defs = self.definitions()
+        return remaining
+
+    def comes_before(self, first, second):
+        '''
+        Tell whether the update of an induction variable comes before the
+        update of another on every path, and in the code
+        '''
+        if first.block is second.block:
+            code = [ defined_register(inst) for inst in first.block.code ]
+            return code.index(first.next) < code.index(second.next)
+        blocks = self.cfg.blocks
+        return (self.cfg.dominates(first.block, second.block)
+                and blocks.index(first.block) < blocks.index(second.block))
+
+    def reduce_multiplications(self, loop, preheader, defined, variables):
+        '''
+        Replace the multiplications of an induction variable (or of its
+        updated value) by a value defined outside the loop with new
+        induction variables
+        '''
+        operands = { }
+        for variable in variables:
+            operands[variable.register] = (variable, True)
+            operands[variable.next] = (variable, False)
+
+        # The multiplications are removed first, since the new variables
+        # are updated in the blocks of the old ones
+        sites = []
+        for block in self.cfg.blocks:
+            if block not in loop.blocks:
+                continue
+            code = []
+            for inst in block.code:
+                if inst[0] == 'MULI':
+                    left, right = inst[1], inst[2]
+                    if left in operands and right not in defined:
+                        sites.append((inst, left, right))
+                        continue
+                    elif right in operands and left not in defined:
+                        sites.append((inst, right, left))
+                        continue
+                code.append(inst)
+            block.code = code
+
+        derived = { }
+        mapping = { }
+        position = len(preheader.code) - (preheader.terminator is not None)
+        for inst, operand, factor in sites:
+            variable, current = operands[operand]
+            key = (variable.register, factor)
+            if key not in derived:
+                derived[key] = self.derive(loop, variable, factor, preheader, position)
+                position += 2
+            register, next = derived[key]
+            mapping[inst[3]] = register if current else next
+            self.changes += 1
+        if mapping:
+            self.rename(mapping)
+
+    def derive(self, loop, variable, factor, preheader, position):
+        '''
+        Add the induction variable holding variable * factor.  Returns its
+        register and the register of its updated value.
+        '''
+        cfg = self.cfg
+        start = cfg.new_register()
+        setup = [ ('MULI', variable.init, factor, start) ]
+        step = cfg.new_register()
+        step_value = self.constant(variable.step)
+        factor_value = self.constant(factor)
+        if step_value is not None and factor_value is not None:
+            setup.append(('MOVI', fold_arithmetic('MUL', 'I', step_value, factor_value), step))
+        else:
+            setup.append(('MULI', variable.step, factor, step))
+        preheader.code[position:position] = setup
+        for inst in setup:
+            self.defs[inst[-1]] = inst
+
+        register = cfg.new_register()
+        next = cfg.new_register()
+        header = loop.header
+        phis = sum(1 for inst in header.code if is_phi(inst))
+        latch = loop.latches[0]
+        header.code.insert(phis, make_phi('PHII', [ (start, preheader.label),
+                                                    (next, latch.label) ], register))
+        code = variable.block.code
+        n = [ defined_register(inst) for inst in code ].index(variable.next)
+        code.insert(n + 1, (variable.op_code, register, step, next))
+        return register, next
+
+    # Whole function
+
+    def non_negative(self, register, depth=8):
+        '''
+        Tell whether a register is known to hold a value >= 0
+        '''
+        inst = self.defs.get(register)
+        if inst is None or depth == 0:
+            return False
+        op_code = inst[0]
+        if op_code == 'MOVI':
+            return inst[1] >= 0
+        elif op_code == 'BTOI':
+            return True
+        elif op_code in ('DIVI', 'SHRI'):
+            divisor = self.constant(inst[2])
+            return (divisor is not None and divisor > 0
+                    and self.non_negative(inst[1], depth - 1))
+        return False
+
+    def shifts(self):
+        '''
+        Turn the multiplications and divisions by powers of two into shifts
+        '''
+        cfg = self.cfg
+        self.defs = self.definitions()
+        for block in cfg.blocks:
+            code = []
+            for inst in block.code:
+                if inst[0] == 'MULI':
+                    left, right = inst[1], inst[2]
+                    if power_of_two(self.constant(right)) is None:
+                        left, right = right, left
+                    shift = power_of_two(self.constant(right))
+                    op_code = 'SHLI'
+                elif inst[0] == 'DIVI' and self.non_negative(inst[1]):
+                    left, right = inst[1], inst[2]
+                    shift = power_of_two(self.constant(right))
+                    op_code = 'SHRI'
+                else:
+                    shift = None
+                if shift is None:
+                    code.append(inst)
+                    continue
+                count = cfg.new_register()
+                code.append(('MOVI', shift, count))
+                code.append((op_code, left, count, inst[3]))
+                self.defs[inst[3]] = code[-1]
+                self.changes += 1
+            block.code = code
+
+def reduce_strength(functions):
+    '''
+    Run strength reduction on a list of IR Functions.  Returns the number
+    of changed or removed instructions.
+    '''
+    return sum(StrengthReduction(func).run() for func in functions)
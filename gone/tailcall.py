@@ -0,0 +1,117 @@
+'''
+Tail call elimination
+=====================
+A call is a tail call when the function returns its result right away:
+
+    ('CALL', 'f', 'R7', 'R8')
+    ('RET', 'R8')
+
+This pass turns the tail calls of a function to itself into loops.  The
+arguments are stored to the parameters, and the call and the return are
+replaced by a branch back to the start of the function:
+
+    ('STOREI', 'R7', 'n')
+    ('BRANCH', 'L4')
+
+where L4 is the label of the former entry block.  A new entry block
+comes before it, with the ALLOCs of the function, so that the loop
+doesn't allocate its variables on every iteration.  Each ALLOC in the
+loop is replaced by a store of 0, like in inline.py.  The parameters
+are read by LOADs (in the entry block after mem2reg.py), which now run
+on every iteration.  A recursion like
+
+    func gcd(a int, b int) int {
+        if b == 0 {
+            return a;
+        }
+        return gcd(b, a - b*(a/b));
+    }
+
+then runs in constant stack space.  The pass runs before inlining, so
+that a function that is no longer recursive can be inlined.
+
+The other tail calls are left to the LLVM code generator, which marks
+them 'musttail' when the caller and the callee have the same parameter
+types, and 'tail' otherwise (see GenerateLLVM.emit_CALL).
+
+Functions where a name is used for both a global and a local (see
+constprop.py), or allocated with different types, are left unchanged.
+'''
+
+from .cfg import BasicBlock, ControlFlowGraph
+from .constprop import variable_scopes
+
+# Zero of each type, for the locals allocated in the loop
+_ZEROS = { 'I': 0, 'F': 0.0, 'B': 0 }
+
+def tail_calls(code):
+    '''
+    Return the positions of the tail calls in a list of instructions
+    '''
+    return [ n for n in range(len(code) - 1)
+             if code[n][0] == 'CALL' and code[n + 1] == ('RET', code[n][-1]) ]
+
+class TailCallElimination(object):
+    '''
+    Tail recursion elimination for one function
+    '''
+    def __init__(self, func):
+        self.func = func
+        self.local_names, self.mixed = variable_scopes(func)
+
+    def run(self):
+        '''
+        Turn the self-recursive tail calls into branches.  Returns the
+        number of removed calls.
+        '''
+        func = self.func
+        if not any(func.code[n][1] == func.name for n in tail_calls(func.code)):
+            return 0
+        if any(name in self.mixed for name, _ in func.parameters):
+            return 0
+
+        cfg = ControlFlowGraph(func)
+        cfg.remove_unreachable()
+        recursive = [ block for block in cfg.blocks
+                      if tail_calls(block.code[-2:]) and block.code[-2][1] == func.name ]
+        if not recursive:
+            return 0
+        allocs = { }
+        for block in cfg.blocks:
+            for inst in block.code:
+                if inst[0].startswith('ALLOC'):
+                    if allocs.setdefault(inst[1], inst) != inst:
+                        return 0
+
+        header = cfg.entry
+        if header.label is None:
+            header.label = cfg.new_label()
+        for block in cfg.blocks:
+            code = []
+            for inst in block.code:
+                if inst[0].startswith('ALLOC'):
+                    suffix = inst[0][-1]
+                    zero = cfg.new_register()
+                    code.append((f'MOV{suffix}', _ZEROS[suffix], zero))
+                    code.append((f'STORE{suffix}', zero, inst[1]))
+                else:
+                    code.append(inst)
+            if block in recursive:
+                call = code[-2]
+                code[-2:] = [ (f'STORE{ptype}', arg, name)
+                              for (name, ptype), arg in zip(func.parameters, call[2:-1]) ]
+                code.append(('BRANCH', header.label))
+            block.code = code
+
+        entry = BasicBlock(None, list(allocs.values()) + [ ('BRANCH', header.label) ])
+        cfg.blocks.insert(0, entry)
+        cfg.update()
+        func.code = cfg.linearize()
+        return len(recursive)
+
+def eliminate_tail_calls(functions):
+    '''
+    Turn the self-recursive tail calls of a list of IR Functions into
+    loops.  Returns the number of removed calls.
+    '''
+    return sum(TailCallElimination(func).run() for func in functions)
@@ -93,6 +93,23 @@ from .errors import error
 # The SLY package. https://github.com/dabeaz/sly
 from sly import Lexer
 
+# -----------------------------------------------------------------------
+# Reserved words, mapped to their token names.  Built once here instead of
+# on every identifier matched by the lexer.
+KEYWORDS = {
+    name: name.upper() for name in (
+        'const',
+        'else',
+        'extern',
+        'func',
+        'if',
+        'print',
+        'return',
+        'while',
+        'var'
+    )
+}
+
 # -----------------------------------------------------------------------
 # Lexers are defined by a class that inherits from sly.Lexer.  Follow
 # the instructions contained in the class below.
@@ -251,19 +268,7 @@ class GoneLexer(Lexer):
 
     @_(r'[a-zA-Z_][a-zA-Z0-9_]*')
     def ID(self, t):
-        keywords = {
-            'const',
-            'else',
-            'extern',
-            'func',
-            'if',
-            'print',
-            'return',
-            'while',
-            'var'
-        }
-        if t.value in keywords:
-            t.type = t.value.upper()
+        t.type = KEYWORDS.get(t.value, 'ID')
         return t
 
     # ----------------------------------------------------------------------
@@ -43,11 +43,7 @@ class Type():
 
     @classmethod
     def get_by_name(cls, type_name):
-        for type_cls in cls.__subclasses__():
-            if type_cls.name == type_name:
-                return type_cls
-
-        return None
+        return TYPES_BY_NAME.get(type_name)
 
 class FloatType(Type):
     name = "float"
@@ -117,3 +113,32 @@ class BoolType(Type):
             return BoolType
 
         return None
+
+# ----------------------------------------------------------------------
+# Lookup tables
+#
+# The methods above are the rules of the type system, but the compiler
+# doesn't call them for every operation.  Their result for every
+# combination of types and operators is computed once, here, so that
+# typing an operation is a single dictionary lookup.  Types are classes,
+# so every type is one interned object that hashes and compares by
+# identity and can be used directly in the table keys.
+#
+#     BINOP_TYPES[left, op, right]     Result type of a binary operation
+#     UNARYOP_TYPES[op, operand]       Result type of a unary operation
+#
+# Invalid operations are not in the tables.
+
+TYPES = tuple(Type.__subclasses__())
+TYPES_BY_NAME = { ty.name: ty for ty in TYPES }
+
+BIN_OPS = tuple(dict.fromkeys(ARITHM_BIN_OPS + REL_BIN_OPS + BOOL_BIN_OPS))
+UNARY_OPS = tuple(dict.fromkeys(ARITHM_UNARY_OPS + BOOL_UNARY_OPS))
+
+BINOP_TYPES = { (left, op, right): left.binop_type(op, right)
+                for left in TYPES for op in BIN_OPS for right in TYPES
+                if left.binop_type(op, right) }
+
+UNARYOP_TYPES = { (op, operand): operand.unaryop_type(op)
+                  for op in UNARY_OPS for operand in TYPES
+                  if operand.unaryop_type(op) }
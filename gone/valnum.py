@@ -0,0 +1,217 @@
+'''
+Value numbering
+===============
+An optimization pass that finds the instructions computing a value the
+function already has in a register, and removes them.  The register
+they defined is replaced by the earlier one in the rest of the code:
+
+    ('MULF', 'R5', 'R5', 'R7')          ('MULF', 'R5', 'R5', 'R7')
+    ...                         ->      ...
+    ('MULF', 'R5', 'R5', 'R9')
+    ('ADDF', 'R9', 'R8', 'R10')         ('ADDF', 'R7', 'R8', 'R10')
+
+Two kinds of values are numbered:
+
+    - Pure computations (MOV of a constant, arithmetic, comparisons,
+      logical operations and conversions) are identified by their
+      opcode and operands, once the operands are themselves replaced by
+      their value numbers.  The operands of commutative operations are
+      put in order, so that a*b and b*a are the same value.
+    - Loads of variables.  A LOAD gives the value last stored in the
+      variable, or last loaded from it, unless a STORE, the ALLOC of a
+      new local, or a CALL (for globals) came in between.
+
+The pass walks the dominator tree of each function (see cfg.py): the
+values computed in a block are available in every block it dominates.
+Pure values stay available.  Variables only keep their value in a block
+if no block on a path from its immediate dominator to it (loops
+included) stores to them, allocates them again, or calls a function
+when they are global.
+
+PHI instructions (see mem2reg.py) are not numbered: two of them with the
+same operands in different blocks can hold different values.  Like
+constprop.py, variables are tracked by name, and the names used for
+both a global and a local of a function are left alone.  The pass
+relies on every register being defined once, which holds for the code
+of GenerateCode; functions where it doesn't are left unchanged.  The
+LLVM code generator needs the definition of a register to come before
+its uses in the code, so a value is only reused in blocks that follow
+the block that computed it.
+'''
+
+from collections import ChainMap
+
+from .cfg import (ControlFlowGraph, defined_register, is_phi, rename_registers,
+                  single_definitions, used_registers)
+from .constprop import variable_scopes
+
+# Families of the pure operations whose operands can be swapped
+_COMMUTATIVE = { 'ADD', 'MUL', 'AND', 'OR', 'XOR' }
+
+def _family(op_code):
+    if op_code in ('AND', 'OR', 'XOR', 'ANDI', 'ORI'):
+        return op_code
+    return op_code[:-1]
+
+def expression_key(inst):
+    '''
+    Return the key identifying the value computed by a pure instruction
+    (whose register operands are already value numbers)
+    '''
+    op_code = inst[0]
+    family = _family(op_code)
+    if family == 'MOV':
+        value = inst[1]
+        # 1, 1.0 and True are different constants, and so are 0.0 and -0.0
+        return (op_code, type(value), value.hex() if type(value) is float else value)
+    operands = inst[1:-1]
+    if family in _COMMUTATIVE or (family == 'CMP' and inst[1] in ('==', '!=')):
+        start = 1 if family == 'CMP' else 0
+        operands = operands[:start] + tuple(sorted(operands[start:]))
+    return (op_code,) + operands
+
+class ValueNumbering(object):
+    '''
+    Value numbering for one function
+    '''
+    def __init__(self, func):
+        self.func = func
+        self.local_names, self.mixed = variable_scopes(func)
+        self.cfg = ControlFlowGraph(func)
+        self.numbers = { }              # Removed register -> register holding
+                                        # its value
+        self.removed = 0
+
+    def is_global(self, name):
+        return name not in self.local_names
+
+    def run(self):
+        '''
+        Number the values of the function and remove the redundant
+        instructions.  Returns the number of removed instructions.
+        '''
+        if not single_definitions(self.func.code):
+            return 0
+        cfg = self.cfg
+        idom = cfg.idom()
+        children = cfg.dominator_tree()
+        self.position = { block: n for n, block in enumerate(cfg.blocks) }
+        self.effects = { block: self.block_effects(block) for block in idom }
+
+        expressions = { }
+        memory = { }
+        stack = [ cfg.entry ]
+        while stack:
+            block = stack.pop()
+            parent = idom[block]
+            if parent is None:
+                expressions[block] = ChainMap()
+                memory[block] = { }
+            else:
+                expressions[block] = expressions[parent].new_child()
+                memory[block] = self.memory_on_entry(block, parent, memory[parent])
+            self.number_block(block, expressions[block], memory[block])
+            stack.extend(children[block])
+
+        if self.removed:
+            # The PHIs read registers of blocks numbered after theirs
+            for block in cfg.blocks:
+                block.code = [ rename_registers(inst, self.numbers) if is_phi(inst) else inst
+                               for inst in block.code ]
+            self.func.code = cfg.linearize()
+        return self.removed
+
+    def block_effects(self, block):
+        '''
+        Return the names of the variables a block stores to or allocates,
+        and whether it calls a function
+        '''
+        names = set()
+        calls = False
+        for inst in block.code:
+            op_code = inst[0]
+            if op_code.startswith('STORE'):
+                names.add(inst[2])
+            elif op_code.startswith('ALLOC'):
+                names.add(inst[1])
+            elif op_code == 'CALL':
+                calls = True
+        return names, calls
+
+    def memory_on_entry(self, block, parent, parent_memory):
+        '''
+        Return the variables whose value is known on entry to a block,
+        from the ones known at the end of its immediate dominator
+        '''
+        if block.preds == [ parent ]:
+            return dict(parent_memory)
+        # The blocks that can run between the end of the dominator and the
+        # entry of the block
+        between = set()
+        stack = [ pred for pred in block.preds if pred is not parent ]
+        while stack:
+            pred = stack.pop()
+            if pred not in between and pred is not parent and pred in self.effects:
+                between.add(pred)
+                stack.extend(pred.preds)
+        killed = set()
+        calls = False
+        for pred in between:
+            names, pred_calls = self.effects[pred]
+            killed |= names
+            calls |= pred_calls
+        return { name: value for name, value in parent_memory.items()
+                 if name not in killed and not (calls and self.is_global(name)) }
+
+    def available(self, entry, block):
+        '''
+        Return the register of an available value (register, block), if it
+        can be used in block
+        '''
+        if entry is not None and self.position[entry[1]] <= self.position[block]:
+            return entry[0]
+        return None
+
+    def number_block(self, block, expressions, memory):
+        code = []
+        for inst in block.code:
+            if self.numbers and used_registers(inst):
+                inst = rename_registers(inst, self.numbers)
+            op_code = inst[0]
+            target = defined_register(inst)
+
+            if op_code.startswith('LOAD'):
+                name = inst[1]
+                if name not in self.mixed:
+                    value = self.available(memory.get(name), block)
+                    if value is not None:
+                        self.numbers[target] = value
+                        self.removed += 1
+                        continue
+                    memory[name] = (target, block)
+            elif op_code.startswith('STORE'):
+                if inst[2] not in self.mixed:
+                    memory[inst[2]] = (inst[1], block)
+            elif op_code.startswith('ALLOC'):
+                memory.pop(inst[1], None)
+            elif op_code == 'CALL':
+                for name in list(memory):
+                    if self.is_global(name):
+                        del memory[name]
+            elif target is not None and not is_phi(inst):
+                key = expression_key(inst)
+                value = self.available(expressions.get(key), block)
+                if value is not None:
+                    self.numbers[target] = value
+                    self.removed += 1
+                    continue
+                expressions[key] = (target, block)
+            code.append(inst)
+        block.code = code
+
+def number_values(functions):
+    '''
+    Run value numbering on a list of IR Functions.  Returns the number of
+    removed instructions.
+    '''
+    return sum(ValueNumbering(func).run() for func in functions)
@@ -0,0 +1,51 @@
+'''
+Tests of the compact IR encoding (gone/compactir.py)
+'''
+
+import glob
+import os
+import unittest
+
+from gone.compactir import CompactFunction, compact, expand
+from gone.context import CompilationContext
+from gone.ircode import Function, compile_ircode
+from gone.optimize import PASSES
+
+EXAMPLES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), '..', 'examples', '*.g')))
+
+class RoundTripTests(unittest.TestCase):
+    def check_round_trip(self, functions):
+        for func, decoded in zip(functions, expand(compact(functions))):
+            self.assertEqual((decoded.name, decoded.parameters, decoded.return_type),
+                             (func.name, func.parameters, func.return_type))
+            self.assertEqual(decoded.code, func.code)
+            # Constants keep their type, so 1, 1.0 and True don't merge
+            self.assertEqual([ type(operand) for inst in decoded.code for operand in inst ],
+                             [ type(operand) for inst in func.code for operand in inst ])
+
+    def test_examples(self):
+        self.assertTrue(EXAMPLES)
+        for filename in EXAMPLES:
+            with open(filename) as f:
+                source = f.read()
+            for passes in ([], list(PASSES)):
+                with self.subTest(filename=filename, passes=passes):
+                    context = CompilationContext(options={ 'optimize': passes }, echo=False)
+                    self.check_round_trip(compile_ircode(source, context))
+
+    def test_constants(self):
+        func = Function('f', [], 'float')
+        func.code = [ ('MOVI', 1, 'R1'), ('MOVF', 1.0, 'R2'), ('MOVF', -0.0, 'R3'),
+                      ('MOVF', 0.0, 'R4'), ('MOVB', 1, 'R5'), ('RET', 'R3') ]
+        encoded = CompactFunction.from_function(func)
+        self.assertEqual(encoded.constants, [ 1, 1.0, -0.0, 0.0 ])
+        self.assertEqual(str(encoded.to_function().code), str(func.code))
+
+    def test_bad_operand(self):
+        func = Function('f', [], 'int')
+        func.code = [ ('MOVI', 1, 'x') ]
+        with self.assertRaises(ValueError):
+            CompactFunction.from_function(func)
+
+if __name__ == '__main__':
+    unittest.main()
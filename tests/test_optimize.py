@@ -0,0 +1,159 @@
+'''
+Tests of the optimization passes (gone/optimize.py)
+'''
+
+import contextlib
+import io
+import unittest
+
+from gone.cfg import ControlFlowGraph, is_phi, phi_incoming
+from gone.context import CompilationContext
+from gone.dce import eliminate_dead_code
+from gone.interp import Interpreter
+from gone.ircode import Function, compile_ircode
+from gone.optimize import PASSES
+
+# A call in the block that branches back to the loop header, whose PHIs
+# name that block once mem2reg has run
+CALL_IN_LOOP = '''
+func inc(x int) int {
+    var y int = x;
+    if x > 3 {
+        y = y + 2;
+    }
+    return y + 1;
+}
+
+func main() int {
+    var i int = 0;
+    var s int = 0;
+    while i < 10 {
+        s = s + 10;
+        i = inc(i);
+    }
+    print s;
+    return 0;
+}
+'''
+
+# An inlined if whose condition is constant, where the value of one
+# variable at the join is constant and the other is not, followed by a
+# loop
+INLINED_IF_BEFORE_LOOP = '''
+func fact(n int) int {
+    if n < 2 {
+        return 1;
+    }
+    return n * fact(n - 1);
+}
+
+func pick(x int, n int) int {
+    var y int = 1;
+    var z int = n;
+    if x > 0 {
+        y = 1;
+        z = n + 1;
+    }
+    return y + z;
+}
+
+func main() int {
+    var k int = pick(5, fact(3));
+    var j int = 0;
+    while j < 3 {
+        k = k + j;
+        j = j + 1;
+    }
+    print k;
+    return 0;
+}
+'''
+
+def check_phis(test, code):
+    '''
+    Check that the PHIs of every block come first and name exactly its
+    predecessors
+    '''
+    for func in code:
+        for block in ControlFlowGraph(func).blocks:
+            preds = { pred.label for pred in block.preds }
+            phis = [ is_phi(inst) for inst in block.code ]
+            test.assertEqual(phis, sorted(phis, reverse=True), f'{func.name}: {block.code}')
+            for inst in block.code:
+                if is_phi(inst):
+                    test.assertEqual({ label for _, label in phi_incoming(inst) }, preds,
+                                     f'{func.name}: {inst}')
+
+def run_program(test, source, passes):
+    context = CompilationContext(options={ 'optimize': passes }, echo=False)
+    code = compile_ircode(source, context)
+    check_phis(test, code)
+    return run_code(code)
+
+def run_code(code):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        Interpreter().execute(code)
+    return output.getvalue()
+
+class InlineTests(unittest.TestCase):
+    def test_inline_after_mem2reg(self):
+        self.assertEqual(run_program(self, CALL_IN_LOOP, []), '60\n')
+        self.assertEqual(run_program(self, CALL_IN_LOOP, [ 'mem2reg', 'inline' ]), '60\n')
+
+    def test_passes_twice(self):
+        self.assertEqual(run_program(self, CALL_IN_LOOP, list(PASSES) * 2), '60\n')
+
+class ConstantPropagationTests(unittest.TestCase):
+    def test_constant_phi_before_other_phis(self):
+        self.assertEqual(run_program(self, INLINED_IF_BEFORE_LOOP, []), '11\n')
+        passes = [ 'inline', 'mem2reg', 'constprop', 'dce' ]
+        self.assertEqual(run_program(self, INLINED_IF_BEFORE_LOOP, passes), '11\n')
+
+    def test_removes_blocks_of_folded_branches(self):
+        context = CompilationContext(options={ 'optimize': [ 'inline', 'mem2reg', 'constprop' ] },
+                                     echo=False)
+        for func in compile_ircode(INLINED_IF_BEFORE_LOOP, context):
+            cfg = ControlFlowGraph(func)
+            self.assertEqual(set(cfg.blocks), set(cfg.reachable()), func.name)
+
+    def test_negative_division(self):
+        # Division truncates towards zero, whether it is folded or not
+        source = '''
+        var a int = 0 - 9;
+        var b int = 4;
+        print a / b;
+        print b / (0 - 3);
+        print a / (0 - b);
+        print (0 - 8) / b;
+        '''
+        expected = '-2\n-1\n2\n-2\n'
+        for passes in ([], [ 'mem2reg' ], [ 'mem2reg', 'constprop' ]):
+            with self.subTest(passes=passes):
+                self.assertEqual(run_program(self, source, passes), expected)
+
+class DeadCodeTests(unittest.TestCase):
+    def test_merge_keeps_label_named_by_later_phi(self):
+        # L1 can't be merged into the unlabeled entry, since the PHI of
+        # L2, which doesn't come first in its block, names it
+        main = Function('__gone_main', [], 'int')
+        main.code = [
+            ('MOVI', 1, 'R1'),
+            ('BRANCH', 'L1'),
+            ('LABEL', 'L1'),
+            ('CBRANCH', 'R1', 'L2', 'L3'),
+            ('LABEL', 'L3'),
+            ('MOVI', 5, 'R5'),
+            ('BRANCH', 'L2'),
+            ('LABEL', 'L2'),
+            ('MOVI', 0, 'R7'),
+            ('PHII', 'R1', 'L1', 'R5', 'L3', 'R6'),
+            ('PRINTI', 'R6'),
+            ('RET', 'R7'),
+        ]
+        eliminate_dead_code([ main ])
+        self.assertIn(('LABEL', 'L1'), main.code)
+        self.assertEqual(run_code([ main ]), '1\n')
+
+if __name__ == '__main__':
+    unittest.main()
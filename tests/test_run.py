@@ -0,0 +1,20 @@
+'''
+Tests of the LLVM JIT runner (gone/run.py)
+'''
+
+import importlib.util
+import unittest
+
+@unittest.skipIf(importlib.util.find_spec('llvmlite') is None, 'llvmlite is not installed')
+class RunTests(unittest.TestCase):
+    def test_run_twice(self):
+        # Every run has its own execution engine, in the same process
+        from gone.llvmgen import compile_llvm
+        from gone.run import run
+
+        code = compile_llvm('func main() int { return 7; }')
+        self.assertEqual(run(code), 7)
+        self.assertEqual(run(code), 7)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+'''
+Tests of the memory-mapped TokenBuffer (gone/scanner.py)
+'''
+
+import os
+import tempfile
+import unittest
+
+from gone.scanner import TokenBuffer, scan
+
+SOURCE = "/* café */\nvar c char = 'é';\nprint c;\n"
+
+class TokenBufferTests(unittest.TestCase):
+    def buffered(self, source, **options):
+        with tempfile.NamedTemporaryFile('w', suffix='.g', encoding='utf-8', delete=False) as f:
+            f.write(source)
+        self.addCleanup(os.remove, f.name)
+        with TokenBuffer.from_file(f.name, **options) as buf:
+            return [ (tok.type, tok.value, tok.lineno, tok.index) for tok in buf.tokens() ]
+
+    def test_utf8_source(self):
+        # Values are characters, and offsets count characters as in scan()
+        expected = list(scan(SOURCE))
+        self.assertIn(('CHAR', "'é'", 2, 24), expected)
+        self.assertEqual(self.buffered(SOURCE), expected)
+        self.assertEqual(self.buffered(SOURCE, chunk_size=2), expected)
+
+if __name__ == '__main__':
+    unittest.main()